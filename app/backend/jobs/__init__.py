@@ -0,0 +1,20 @@
+from .queue import (
+    InMemoryJobQueue,
+    Job,
+    JobQueueConfig,
+    QueueFull,
+    RedisJobQueue,
+    create_job_queue
+)
+from .worker import JobWorker, sandbox_handler
+
+__all__ = [
+    'InMemoryJobQueue',
+    'Job',
+    'JobQueueConfig',
+    'QueueFull',
+    'RedisJobQueue',
+    'create_job_queue',
+    'JobWorker',
+    'sandbox_handler'
+]
@@ -0,0 +1,98 @@
+"""独立的执行 worker 进程：从 Redis 任务队列拉取任务并在本机沙箱中执行。
+
+在 app/ 目录下运行，可在多台主机上各启动一个：
+
+    REDIS_URL=redis://redis:6379/0 python -m backend.jobs
+"""
+import asyncio
+import os
+
+import docker
+
+from ..sandbox import (
+    AdmissionConfig,
+    BackendPolicyConfig,
+    ContainerPoolConfig,
+    ImageBuilder,
+    ImageBuilderConfig,
+    ProcessSandbox,
+    ProcessSandboxConfig,
+    ResourceConfig,
+    SandboxExecutor,
+    SandboxLimits,
+    SandboxPoolManager,
+    SandboxRouter
+)
+from .queue import JobQueueConfig, create_job_queue
+from .worker import JobWorker, sandbox_handler
+
+
+async def main():
+    queue = create_job_queue(JobQueueConfig.from_env())
+    if not queue.shared:
+        raise SystemExit("REDIS_URL must be set (and the redis package installed) to run a standalone worker")
+
+    limits = SandboxLimits.from_env()
+    try:
+        docker_client = docker.from_env()
+    except docker.errors.DockerException as e:
+        print(f"Warning: Could not connect to Docker daemon: {e}")
+        docker_client = None
+    pools = (
+        SandboxPoolManager(
+            docker_client,
+            ContainerPoolConfig.from_env(),
+            limits,
+            images=ImageBuilder(docker_client, ImageBuilderConfig.from_env())
+        )
+        if docker_client is not None else None
+    )
+    process_config = ProcessSandboxConfig.from_env()
+    process_sandbox = ProcessSandbox(process_config, limits) if process_config.enabled else None
+    if process_sandbox is not None:
+        try:
+            await asyncio.to_thread(process_sandbox.start)
+        except Exception as e:
+            print(f"Warning: Could not start the process sandbox: {e}")
+            process_sandbox = None
+    router = SandboxRouter([pools, process_sandbox], BackendPolicyConfig.from_env())
+    if not router.available:
+        raise SystemExit("No sandbox backend is available: Docker is unreachable and the process sandbox is not enabled")
+
+    executor = SandboxExecutor(AdmissionConfig.from_env(), ResourceConfig.from_env())
+    if pools is not None:
+        languages = [language.strip() for language in os.getenv("SANDBOX_WARM_LANGUAGES", "python").split(",") if language.strip()]
+        await asyncio.to_thread(pools.warm_up, languages)
+        # 常用依赖组合在开始拉取任务前构建好，避免第一批任务等待安装
+        await asyncio.to_thread(pools.prebuild_images, languages)
+
+    await queue.start()
+    worker = JobWorker(queue, sandbox_handler(executor, router), concurrency=executor.config.max_concurrency)
+    print(f"Job worker {worker.worker_id} started with {worker.concurrency} slots")
+
+    async def health_loop():
+        while pools is not None:
+            await asyncio.sleep(pools.config.health_check_interval)
+            try:
+                await asyncio.to_thread(pools.health_check)
+            except Exception as e:
+                print(f"Warning: sandbox pool health check failed: {e}")
+
+    health_task = asyncio.create_task(health_loop())
+    try:
+        await worker.run()
+    finally:
+        health_task.cancel()
+        await queue.aclose()
+        await asyncio.to_thread(executor.close)
+        if pools is not None:
+            await asyncio.to_thread(pools.close)
+        if process_sandbox is not None:
+            await asyncio.to_thread(process_sandbox.close)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,365 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, Optional, Union
+
+from ..utils.env import apply_env_overrides
+
+try:
+    import redis.asyncio as aioredis
+    from redis.exceptions import WatchError
+except ImportError:  # 未安装 redis 时只能使用进程内队列
+    aioredis = None
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+FINISHED_STATUSES = (JOB_COMPLETED, JOB_FAILED)
+
+
+@dataclass
+class JobQueueConfig:
+    """执行任务队列配置"""
+    redis_url: Optional[str] = None
+    key_prefix: str = "creation:"
+    # 结束的任务及其结果保留多久（秒）
+    result_ttl: int = 3600
+    max_queue_depth: int = 1000
+    # 运行中的任务由 worker 定期续约（间隔为 lease_seconds 的三分之一），
+    # 超过 lease_seconds 没有续约时认为 worker 已崩溃并重新入队
+    lease_seconds: float = 60.0
+    max_attempts: int = 2
+    # Redis 队列长轮询时查询任务状态的间隔（秒）
+    poll_interval: float = 0.2
+
+    @classmethod
+    def from_env(cls, prefix: str = "JOB_") -> "JobQueueConfig":
+        config = apply_env_overrides(cls(), prefix)
+        config.redis_url = config.redis_url or os.getenv("REDIS_URL")
+        return config
+
+
+@dataclass
+class Job:
+    """一次排队执行：payload 为执行参数，result 为 worker 写回的执行结果"""
+    id: str
+    payload: Dict[str, Any]
+    status: str = JOB_QUEUED
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    # worker 最近一次续约的时间，等待准入、构建镜像和执行期间都会续约
+    heartbeat_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    worker: Optional[str] = None
+    attempts: int = 0
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def lease_expired(self, lease_seconds: float, now: float) -> bool:
+        if self.status != JOB_RUNNING or self.started_at is None:
+            return False
+        return now - (self.heartbeat_at or self.started_at) > lease_seconds
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, raw: Union[str, bytes]) -> "Job":
+        return cls(**json.loads(raw))
+
+
+class QueueFull(Exception):
+    """排队中的任务数已达上限"""
+
+
+class InMemoryJobQueue:
+    """进程内任务队列，只能由同一进程中的 worker 消费"""
+
+    shared = False
+
+    def __init__(self, config: JobQueueConfig):
+        self.config = config
+        self._pending: asyncio.Queue = asyncio.Queue()
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._done: Dict[str, asyncio.Event] = {}
+
+    async def start(self):
+        pass
+
+    async def aclose(self):
+        pass
+
+    def _prune(self):
+        # 任务按创建顺序保存，从最早的开始清理过期的已结束任务
+        cutoff = time.time() - self.config.result_ttl
+        for job_id, job in list(self._jobs.items()):
+            if job.created_at > cutoff:
+                break
+            if job.finished:
+                del self._jobs[job_id]
+                self._done.pop(job_id, None)
+
+    async def submit(self, payload: Dict[str, Any]) -> Job:
+        if self._pending.qsize() >= self.config.max_queue_depth:
+            raise QueueFull("执行任务队列已满")
+        self._prune()
+        job = Job(id=uuid.uuid4().hex, payload=payload)
+        self._jobs[job.id] = job
+        self._done[job.id] = asyncio.Event()
+        self._pending.put_nowait(job.id)
+        return job
+
+    async def claim(self, worker_id: str, timeout: float) -> Optional[Job]:
+        """取出下一个任务并标记为运行中，timeout 秒内没有任务时返回 None"""
+        try:
+            job_id = await asyncio.wait_for(self._pending.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        job.status = JOB_RUNNING
+        job.started_at = time.time()
+        job.worker = worker_id
+        job.attempts += 1
+        return job
+
+    async def heartbeat(self, job_id: str, worker_id: str):
+        job = self._jobs.get(job_id)
+        if job is not None and job.status == JOB_RUNNING and job.worker == worker_id:
+            job.heartbeat_at = time.time()
+
+    def _finish(self, job_id: str, worker_id: str, status: str, result: Optional[Dict[str, Any]], error: Optional[str]):
+        job = self._jobs.get(job_id)
+        if job is None or job.status != JOB_RUNNING or job.worker != worker_id:
+            return
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished_at = time.time()
+        self._done[job_id].set()
+
+    async def complete(self, job_id: str, worker_id: str, result: Dict[str, Any]):
+        self._finish(job_id, worker_id, JOB_COMPLETED, result, None)
+
+    async def fail(self, job_id: str, worker_id: str, error: str):
+        self._finish(job_id, worker_id, JOB_FAILED, None, error)
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Job]:
+        """等待任务结束，最多 timeout 秒，返回任务的最新状态"""
+        done = self._done.get(job_id)
+        if done is not None and timeout > 0:
+            try:
+                await asyncio.wait_for(done.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self._jobs.get(job_id)
+
+    async def depth(self) -> int:
+        return self._pending.qsize()
+
+    async def requeue_stale(self) -> int:
+        # 进程内 worker 与队列同生共死，不存在租约过期的任务
+        return 0
+
+
+class RedisJobQueue:
+    """基于 Redis 列表的任务队列，可被其他主机上的 worker 消费。
+
+    待执行的 id 在 queue 列表中，worker 用 BLMOVE 原子地移入 processing 列表，
+    结束后移除；worker 崩溃时 requeue_stale 会把租约过期的任务放回队列。
+    任务记录的每次修改都在 WATCH/MULTI 事务中先检查状态和所属 worker 再写入，
+    租约过期后才交回结果的 worker 不会覆盖重新执行的记录。
+    """
+
+    shared = True
+
+    def __init__(self, config: JobQueueConfig):
+        self.config = config
+        self._redis = None
+        self._queue_key = f"{config.key_prefix}jobs:queue"
+        self._processing_key = f"{config.key_prefix}jobs:processing"
+
+    async def start(self):
+        self._redis = aioredis.from_url(self.config.redis_url)
+
+    async def aclose(self):
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+    def _job_key(self, job_id: str) -> str:
+        return f"{self.config.key_prefix}jobs:{job_id}"
+
+    async def _save(self, job: Job):
+        await self._redis.set(self._job_key(job.id), job.to_json(), ex=self.config.result_ttl)
+
+    def _queue_save(self, pipe, job: Job):
+        pipe.set(self._job_key(job.id), job.to_json(), ex=self.config.result_ttl)
+
+    async def _transact(self, job_id: str, apply: Callable[[Optional[Job], Any], bool]) -> Optional[Job]:
+        """在 WATCH/MULTI 事务中读取并修改任务记录，返回修改后的任务。
+
+        apply(job, pipe) 检查读到的记录（不存在时为 None），把要写入的命令排入 pipe 并返回 True；
+        返回 False 时不写入任何内容。记录在读取后被其他客户端修改时重新读取并重试。
+        """
+        key = self._job_key(job_id)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(key)
+                    raw = await pipe.get(key)
+                    job = Job.from_json(raw) if raw is not None else None
+                    pipe.multi()
+                    if not apply(job, pipe):
+                        return None
+                    await pipe.execute()
+                    return job
+                except WatchError:
+                    continue
+
+    async def submit(self, payload: Dict[str, Any]) -> Job:
+        if await self._redis.llen(self._queue_key) >= self.config.max_queue_depth:
+            raise QueueFull("执行任务队列已满")
+        job = Job(id=uuid.uuid4().hex, payload=payload)
+        await self._save(job)
+        await self._redis.lpush(self._queue_key, job.id)
+        return job
+
+    async def claim(self, worker_id: str, timeout: float) -> Optional[Job]:
+        raw_id = await self._redis.blmove(self._queue_key, self._processing_key, timeout, "RIGHT", "LEFT")
+        if raw_id is None:
+            return None
+        job_id = raw_id.decode() if isinstance(raw_id, bytes) else raw_id
+        claimed = False
+
+        def start(job: Optional[Job], pipe) -> bool:
+            nonlocal claimed
+            if job is None or job.status != JOB_QUEUED:
+                # 任务记录已过期，或租约过期重新入队后原 worker 已经交回了结果
+                claimed = False
+                pipe.lrem(self._processing_key, 1, job_id)
+                return True
+            claimed = True
+            job.status = JOB_RUNNING
+            job.started_at = time.time()
+            job.heartbeat_at = None
+            job.worker = worker_id
+            job.attempts += 1
+            self._queue_save(pipe, job)
+            return True
+
+        job = await self._transact(job_id, start)
+        return job if claimed else None
+
+    async def heartbeat(self, job_id: str, worker_id: str):
+        """续约运行中的任务；任务已被重新入队或由其他 worker 领取时不做任何事"""
+
+        def renew(job: Optional[Job], pipe) -> bool:
+            if job is None or job.status != JOB_RUNNING or job.worker != worker_id:
+                return False
+            job.heartbeat_at = time.time()
+            self._queue_save(pipe, job)
+            return True
+
+        await self._transact(job_id, renew)
+
+    async def _finish(self, job_id: str, worker_id: str, status: str, result: Optional[Dict[str, Any]], error: Optional[str]):
+        """写回结果；任务已不属于 worker_id（租约过期后被重新入队或领取）时丢弃结果"""
+
+        def finish(job: Optional[Job], pipe) -> bool:
+            if job is None:
+                pipe.lrem(self._processing_key, 1, job_id)
+                return True
+            if job.status != JOB_RUNNING or job.worker != worker_id:
+                return False
+            job.status = status
+            job.result = result
+            job.error = error
+            job.finished_at = time.time()
+            self._queue_save(pipe, job)
+            pipe.lrem(self._processing_key, 1, job_id)
+            return True
+
+        await self._transact(job_id, finish)
+
+    async def complete(self, job_id: str, worker_id: str, result: Dict[str, Any]):
+        await self._finish(job_id, worker_id, JOB_COMPLETED, result, None)
+
+    async def fail(self, job_id: str, worker_id: str, error: str):
+        await self._finish(job_id, worker_id, JOB_FAILED, None, error)
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        raw = await self._redis.get(self._job_key(job_id))
+        return Job.from_json(raw) if raw is not None else None
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Job]:
+        deadline = time.monotonic() + timeout
+        while True:
+            job = await self.get(job_id)
+            if job is None or job.finished or time.monotonic() >= deadline:
+                return job
+            await asyncio.sleep(min(self.config.poll_interval, max(0.0, deadline - time.monotonic())))
+
+    async def depth(self) -> int:
+        return await self._redis.llen(self._queue_key)
+
+    async def requeue_stale(self) -> int:
+        """把租约过期的运行中任务放回队首，超过重试次数的标记为失败"""
+        requeued = 0
+        now = time.time()
+        for raw_id in await self._redis.lrange(self._processing_key, 0, -1):
+            job_id = raw_id.decode() if isinstance(raw_id, bytes) else raw_id
+            pushed = False
+
+            def reap(job: Optional[Job], pipe) -> bool:
+                # 同时运行的其他 worker 已处理过的任务状态不再是运行中，事务重试时会跳过
+                nonlocal pushed
+                pushed = False
+                if job is not None and not job.lease_expired(self.config.lease_seconds, now):
+                    return False
+                pipe.lrem(self._processing_key, 1, job_id)
+                if job is None:
+                    return True
+                if job.attempts >= self.config.max_attempts:
+                    job.status = JOB_FAILED
+                    job.error = f"worker {job.worker} 未在租约内完成任务"
+                    job.finished_at = now
+                else:
+                    job.status = JOB_QUEUED
+                    job.started_at = None
+                    job.heartbeat_at = None
+                    job.worker = None
+                    pipe.rpush(self._queue_key, job_id)
+                    pushed = True
+                self._queue_save(pipe, job)
+                return True
+
+            await self._transact(job_id, reap)
+            if pushed:
+                requeued += 1
+        return requeued
+
+
+JobQueue = Union[InMemoryJobQueue, RedisJobQueue]
+
+
+def create_job_queue(config: JobQueueConfig) -> JobQueue:
+    """配置了 Redis 时使用 Redis 队列，否则退化为进程内队列"""
+    if config.redis_url:
+        if aioredis is not None:
+            return RedisJobQueue(config)
+        print("Warning: redis package is not installed, falling back to in-process job queue")
+    return InMemoryJobQueue(config)
@@ -0,0 +1,146 @@
+import asyncio
+import socket
+import time
+import uuid
+from dataclasses import asdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from ..sandbox import SandboxExecutor, SandboxRouter, SandboxSaturated, parse_resources
+from ..utils.metrics import REGISTRY
+from .queue import JobQueue
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+JOB_QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    "job_queue_wait_seconds",
+    "Time execution jobs spend queued before a worker claims them"
+)
+JOB_RUN_SECONDS = REGISTRY.histogram(
+    "job_run_seconds",
+    "Execution job run time by outcome",
+    ("outcome",)
+)
+
+
+def sandbox_handler(executor: SandboxExecutor, router: SandboxRouter) -> JobHandler:
+    """在沙箱中执行任务，返回原始的 ExecResult 字段，由 API 负责组装响应；
+    后端按本机的策略选择，任务指定的后端本机不可用时任务失败"""
+
+    async def handle(payload: Dict[str, Any]) -> Dict[str, Any]:
+        backend = router.select(payload["language"], payload["code"], payload["timeout"], payload.get("backend"))
+        await backend.prepare(payload["language"], payload["code"])
+        while True:
+            try:
+                result = await executor.submit(
+                    backend.run,
+                    payload["language"],
+                    payload["code"],
+                    payload["timeout"],
+                    resources=parse_resources(payload.get("resources"))
+                )
+            except SandboxSaturated as e:
+                # 执行槽位被同步的 /execute 请求占满时稍后重试，任务本身不失败
+                await asyncio.sleep(e.retry_after)
+                continue
+            return asdict(result)
+
+    return handle
+
+
+class JobWorker:
+    """从任务队列中拉取任务并执行，concurrency 个循环并发消费"""
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        handler: JobHandler,
+        concurrency: int = 1,
+        worker_id: Optional[str] = None,
+        claim_timeout: float = 1.0,
+        reap_interval: float = 30.0
+    ):
+        self.queue = queue
+        self.handler = handler
+        self.concurrency = concurrency
+        self.worker_id = worker_id or f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+        self.claim_timeout = claim_timeout
+        self.reap_interval = reap_interval
+        self._tasks: List[asyncio.Task] = []
+
+    async def _consume(self, index: int):
+        worker_id = f"{self.worker_id}/{index}"
+        while True:
+            try:
+                job = await self.queue.claim(worker_id, self.claim_timeout)
+            except Exception as e:
+                print(f"Warning: job worker {worker_id} could not claim a job: {e}")
+                await asyncio.sleep(self.claim_timeout)
+                continue
+            if job is None:
+                continue
+            JOB_QUEUE_WAIT_SECONDS.observe(max(0.0, job.started_at - job.created_at))
+            started = time.monotonic()
+            heartbeat = asyncio.create_task(self._heartbeat(job.id, worker_id))
+            try:
+                result = await self.handler(job.payload)
+            except asyncio.CancelledError:
+                # 关闭时未完成的任务保留在 processing 中，租约过期后由其他 worker 重新执行
+                raise
+            except Exception as e:
+                error = e
+            else:
+                error = None
+            finally:
+                heartbeat.cancel()
+            try:
+                if error is not None:
+                    JOB_RUN_SECONDS.labels("failed").observe(time.monotonic() - started)
+                    await self.queue.fail(job.id, worker_id, str(error) or type(error).__name__)
+                else:
+                    JOB_RUN_SECONDS.labels("completed").observe(time.monotonic() - started)
+                    await self.queue.complete(job.id, worker_id, result)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # 结果写不回去（队列不可用或结果无法序列化）时任务留在 processing 中，
+                # 租约过期后重新执行；循环继续消费其他任务
+                print(f"Warning: job worker {worker_id} could not record the result of job {job.id}: {e}")
+
+    async def _heartbeat(self, job_id: str, worker_id: str):
+        """任务运行期间定期续约，排队等待准入或构建依赖镜像的任务不会被当作崩溃而重复执行"""
+        interval = self.queue.config.lease_seconds / 3
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.queue.heartbeat(job_id, worker_id)
+            except Exception as e:
+                print(f"Warning: could not renew the lease of job {job_id}: {e}")
+
+    async def _reap(self):
+        while True:
+            await asyncio.sleep(self.reap_interval)
+            try:
+                requeued = await self.queue.requeue_stale()
+            except Exception as e:
+                print(f"Warning: could not requeue stale jobs: {e}")
+                continue
+            if requeued:
+                print(f"Requeued {requeued} jobs from unresponsive workers")
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._consume(index)) for index in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._reap()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def run(self):
+        """运行直到被取消"""
+        self.start()
+        try:
+            await asyncio.gather(*self._tasks)
+        finally:
+            await self.stop()
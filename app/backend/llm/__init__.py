@@ -0,0 +1,15 @@
+from .budget import TokenBudget, TokenBudgetConfig
+from .clients import ClientPoolConfig, LLMClientRegistry
+from .extract import CodeExtractor
+from .router import ModelRouter, NoHealthyEndpoint, RouterConfig
+
+__all__ = [
+    'TokenBudget',
+    'TokenBudgetConfig',
+    'ClientPoolConfig',
+    'LLMClientRegistry',
+    'CodeExtractor',
+    'ModelRouter',
+    'NoHealthyEndpoint',
+    'RouterConfig'
+]
@@ -0,0 +1,73 @@
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Tuple
+
+from ..utils.env import apply_env_overrides
+from ..utils.metrics import Family
+
+
+@dataclass
+class TokenBudgetConfig:
+    """自适应 max_tokens 配置"""
+    enabled: bool = True
+    # 没有足够样本时使用 max_tokens，与原先固定的上限一致
+    min_tokens: int = 256
+    max_tokens: int = 2000
+    # 取最近 window 次输出长度的 percentile 分位数，乘以 headroom 作为上限
+    percentile: float = 0.95
+    headroom: float = 1.25
+    min_samples: int = 20
+    window: int = 200
+
+    @classmethod
+    def from_env(cls, prefix: str = "LLM_TOKEN_BUDGET_") -> "TokenBudgetConfig":
+        return apply_env_overrides(cls(), prefix)
+
+
+class TokenBudget:
+    """按模型和语言记录输出长度，为下一次生成选择 max_tokens。
+
+    推理模型的思考过程也计入输出长度，因此同一语言在不同模型上的上限可以相差很大。
+    被 max_tokens 截断的输出按两倍上限记录，上限过小时会在几次截断后回升。
+    """
+
+    def __init__(self, config: TokenBudgetConfig):
+        self.config = config
+        self._history: Dict[Tuple[str, str], Deque[int]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(model: str, language: str) -> Tuple[str, str]:
+        return model, language.strip().lower()
+
+    def limit(self, model: str, language: str) -> int:
+        config = self.config
+        if not config.enabled:
+            return config.max_tokens
+        with self._lock:
+            samples = sorted(self._history.get(self._key(model, language), ()))
+        if len(samples) < config.min_samples:
+            return config.max_tokens
+        index = min(len(samples) - 1, int(len(samples) * config.percentile))
+        limit = int(samples[index] * config.headroom)
+        return min(max(limit, config.min_tokens), config.max_tokens)
+
+    def observe(self, model: str, language: str, completion_tokens: int, truncated: bool = False):
+        """记录一次生成的输出 token 数；truncated 表示输出达到了 max_tokens"""
+        if completion_tokens <= 0:
+            return
+        if truncated:
+            completion_tokens = min(completion_tokens * 2, self.config.max_tokens)
+        key = self._key(model, language)
+        with self._lock:
+            history = self._history.get(key)
+            if history is None:
+                history = self._history[key] = deque(maxlen=self.config.window)
+            history.append(completion_tokens)
+
+    def collect(self) -> List[Family]:
+        with self._lock:
+            keys = list(self._history)
+        samples = [({"model": model, "language": language}, self.limit(model, language)) for model, language in keys]
+        return [("llm_max_tokens", "gauge", "Adaptive max_tokens for the next generation", samples)]
@@ -0,0 +1,109 @@
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import httpx
+from openai import AsyncOpenAI
+
+from ..utils.env import apply_env_overrides
+from ..utils.models import ModelConfig
+
+
+@dataclass
+class ClientPoolConfig:
+    """LLM 客户端连接池配置"""
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    connect_timeout: float = 5.0
+    read_timeout: float = 300.0
+    write_timeout: float = 10.0
+    pool_timeout: float = 10.0
+    max_retries: int = 2
+
+    @classmethod
+    def from_env(cls, prefix: str = "LLM_POOL_") -> "ClientPoolConfig":
+        """从环境变量读取配置，例如 LLM_POOL_MAX_CONNECTIONS=200"""
+        return apply_env_overrides(cls(), prefix)
+
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry
+        )
+
+    def timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(
+            connect=self.connect_timeout,
+            read=self.read_timeout,
+            write=self.write_timeout,
+            pool=self.pool_timeout
+        )
+
+
+def _normalize_url(base_url: str) -> str:
+    return base_url.rstrip("/") + "/"
+
+
+class LLMClientRegistry:
+    """按模型地址维护长连接的异步客户端，同一 base_url 共享一个连接池"""
+
+    def __init__(self, models: Dict[str, ModelConfig], pool_config: Optional[ClientPoolConfig] = None):
+        self.models = models
+        self.pool_config = pool_config or ClientPoolConfig()
+        self._http_clients: Dict[str, httpx.AsyncClient] = {}
+        self._clients: Dict[Tuple[str, str], AsyncOpenAI] = {}
+        self._started = False
+
+    @property
+    def started(self) -> bool:
+        return self._started
+
+    def _create(self, base_url: str, api_key: str) -> AsyncOpenAI:
+        if base_url not in self._http_clients:
+            self._http_clients[base_url] = httpx.AsyncClient(
+                limits=self.pool_config.limits(),
+                timeout=self.pool_config.timeout()
+            )
+        client = AsyncOpenAI(
+            base_url=base_url,
+            api_key=api_key,
+            max_retries=self.pool_config.max_retries,
+            timeout=self.pool_config.timeout(),
+            http_client=self._http_clients[base_url]
+        )
+        self._clients[(base_url, api_key)] = client
+        return client
+
+    async def start(self):
+        """为每个 base_url（包括所有副本）创建连接池和客户端"""
+        if self._started:
+            return
+        for config in self.models.values():
+            for base_url in config.endpoints:
+                key = (_normalize_url(base_url), config.api_key)
+                if key not in self._clients:
+                    self._create(*key)
+        self._started = True
+
+    def for_endpoint(self, base_url: str, api_key: str) -> AsyncOpenAI:
+        """获取指定 base_url 的客户端"""
+        if not self._started:
+            raise RuntimeError("LLM 客户端尚未初始化")
+        key = (_normalize_url(base_url), api_key)
+        return self._clients.get(key) or self._create(*key)
+
+    def get(self, model_id: str) -> AsyncOpenAI:
+        """获取指定模型主地址的客户端"""
+        config = self.models.get(model_id)
+        if config is None:
+            raise KeyError(f"模型 {model_id} 不存在")
+        return self.for_endpoint(config.base_url, config.api_key)
+
+    async def aclose(self):
+        """关闭所有连接池"""
+        for http_client in self._http_clients.values():
+            await http_client.aclose()
+        self._http_clients.clear()
+        self._clients.clear()
+        self._started = False
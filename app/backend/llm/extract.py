@@ -0,0 +1,166 @@
+import re
+from typing import Optional
+
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+FENCE = "```"
+
+_TRIPLE_QUOTE = re.compile(r'"""|\'\'\'')
+
+
+class CodeExtractor:
+    """从流式输出中提取代码。
+
+    去掉推理模型的 <think>...</think> 块、代码块之前的说明文字和包裹代码的 Markdown 代码块标记。
+    在代码块中遇到闭合标记时 done 变为 True，调用方可以立即关闭上游流，不再等待模型输出后续的
+    解释；三引号字符串中的代码块标记和带语言名的嵌套代码块不会结束提取。没有代码块的输出读到
+    流结束后整体作为代码。feed 只返回确定属于代码的完整行，其余内容暂存到下一次 feed 或 finish。
+
+    reasoning 为 True 时（推理模型的对话模板可能已经写入了 <think>，输出中只有 </think>），
+    输出不以代码块开头就暂存直到 </think>；流结束时仍未出现，说明服务端已去掉思考过程或模型
+    直接作答，暂存的内容按普通输出提取。以 <think> 开头的思考过程直到流结束都没有闭合时
+    没有代码，truncated 变为 True。
+    """
+
+    def __init__(self, reasoning: bool = False):
+        self.reasoning = reasoning
+        self.done = False
+        self.truncated = False
+        self._buffer = ""
+        self._state = "start"
+        # 暂存的是推理模型可能省略了 <think> 的思考过程
+        self._implicit_think = False
+        # body 状态下已确认不含代码块标记的前缀长度（到最后一个换行为止）
+        self._scanned = 0
+        # 代码块中未闭合的三引号，以及带语言名的嵌套代码块层数
+        self._quote: Optional[str] = None
+        self._depth = 0
+
+    def feed(self, text: str) -> str:
+        if self.done:
+            return ""
+        self._buffer += text
+        return self._drain(final=False)
+
+    def finish(self) -> str:
+        """流结束时调用，返回剩余的代码"""
+        if self.done:
+            return ""
+        code = self._drain(final=True)
+        self.done = True
+        return code
+
+    def _drain(self, final: bool) -> str:
+        while True:
+            state = self._state
+            if state == "start":
+                lead = self._buffer.lstrip()
+                if lead.startswith(THINK_OPEN):
+                    self._buffer = lead[len(THINK_OPEN):]
+                    self._state = "think"
+                    continue
+                if not final and THINK_OPEN.startswith(lead):
+                    return ""
+                if self.reasoning and not lead.startswith(FENCE):
+                    if not final and FENCE.startswith(lead):
+                        return ""
+                    self._implicit_think = True
+                    self._state = "think"
+                    continue
+                self._state = "body"
+            elif state == "think":
+                end = self._buffer.find(THINK_CLOSE)
+                if end >= 0:
+                    self._buffer = self._buffer[end + len(THINK_CLOSE):]
+                    self._state = "body"
+                    continue
+                if not final:
+                    if not self._implicit_think:
+                        # 思考内容不需要保留，只留下可能是半个 </think> 的结尾
+                        self._buffer = self._buffer[-(len(THINK_CLOSE) - 1):]
+                    return ""
+                if self._implicit_think:
+                    # 没有思考过程，暂存的就是回答
+                    self._state = "body"
+                    continue
+                # 思考过程被截断，没有代码
+                self._buffer = ""
+                self.truncated = True
+                return ""
+            elif state == "body":
+                start = self._find_fence(final)
+                if start >= 0:
+                    # 丢弃代码块之前的说明文字
+                    self._buffer = self._buffer[start + len(FENCE):]
+                    self._state = "fence_open"
+                    continue
+                if not final:
+                    return ""
+                self._buffer = self._buffer.lstrip()
+                self._state = "plain"
+            elif state == "fence_open":
+                # 跳过 ```python 这一行
+                newline = self._buffer.find("\n")
+                if newline < 0:
+                    if final:
+                        self._buffer = ""
+                    return ""
+                self._buffer = self._buffer[newline + 1:]
+                self._state = "fenced"
+            elif state == "fenced":
+                return self._drain_fenced(final)
+            else:
+                code, self._buffer = self._buffer, ""
+                return code
+
+    def _find_fence(self, final: bool) -> int:
+        """缓冲区中第一个以代码块标记开头的行中标记的位置，没有时返回 -1；
+        未以换行结束的最后一行只在流结束时检查"""
+        offset = self._scanned
+        while True:
+            newline = self._buffer.find("\n", offset)
+            if newline < 0 and not final:
+                self._scanned = offset
+                return -1
+            line = self._buffer[offset:] if newline < 0 else self._buffer[offset:newline]
+            stripped = line.lstrip()
+            if stripped.startswith(FENCE):
+                return offset + len(line) - len(stripped)
+            if newline < 0:
+                return -1
+            offset = newline + 1
+
+    def _drain_fenced(self, final: bool) -> str:
+        parts = []
+        lines = self._buffer.split("\n")
+        self._buffer = lines.pop()
+        for line in lines:
+            if self._closes(line):
+                self.done = True
+                self._buffer = ""
+                return "".join(parts)
+            parts.append(line + "\n")
+        if final:
+            partial, self._buffer = self._buffer, ""
+            if partial and not self._closes(partial):
+                parts.append(partial)
+        return "".join(parts)
+
+    def _closes(self, line: str) -> bool:
+        """更新三引号和嵌套代码块的状态，返回该行是否是包裹代码的闭合标记"""
+        stripped = line.strip()
+        if self._quote is None and stripped.startswith(FENCE):
+            if stripped != FENCE:
+                self._depth += 1
+                return False
+            if self._depth == 0:
+                return True
+            self._depth -= 1
+            return False
+        for match in _TRIPLE_QUOTE.finditer(line):
+            quote = match.group()
+            if self._quote is None:
+                self._quote = quote
+            elif self._quote == quote:
+                self._quote = None
+        return False
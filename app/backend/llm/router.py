@@ -0,0 +1,294 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+import openai
+from openai import AsyncOpenAI
+
+from ..utils.env import apply_env_overrides
+from ..utils.metrics import REGISTRY, Family
+from ..utils.models import ModelConfig
+from .clients import LLMClientRegistry
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+LLM_REQUEST_SECONDS = REGISTRY.histogram(
+    "llm_request_duration_seconds",
+    "LLM call latency per endpoint",
+    ("model", "endpoint", "outcome")
+)
+
+
+@dataclass
+class RouterConfig:
+    """模型路由配置"""
+    ewma_alpha: float = 0.2
+    # 连续失败多少次后打开熔断器，以及熔断后多久允许试探请求
+    failure_threshold: int = 3
+    open_seconds: float = 30.0
+    health_check_interval: float = 15.0
+    health_check_timeout: float = 5.0
+    # 尚无延迟样本时假定的延迟（秒）
+    default_latency: float = 1.0
+
+    @classmethod
+    def from_env(cls, prefix: str = "LLM_ROUTER_") -> "RouterConfig":
+        return apply_env_overrides(cls(), prefix)
+
+
+class NoHealthyEndpoint(Exception):
+    """模型及其备用模型都没有可用的副本"""
+
+
+def is_endpoint_failure(error: Exception) -> bool:
+    """连接失败、超时、5xx 和 429 视为副本故障；其他错误（如参数错误）与副本无关"""
+    if isinstance(error, openai.APIConnectionError):
+        return True
+    # 流式响应读取到一半连接中断时，httpx 的传输错误不会被包装成 APIConnectionError
+    if isinstance(error, httpx.TransportError):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code >= 500 or error.status_code == 429
+    return False
+
+
+class EndpointState:
+    """单个模型副本的运行状态"""
+
+    def __init__(self, model_id: str, base_url: str, api_key: str, config: RouterConfig):
+        self.model_id = model_id
+        self.base_url = base_url
+        self.api_key = api_key
+        self.config = config
+        self.in_flight = 0
+        self.ewma_latency: Optional[float] = None
+        self.ewma_error_rate = 0.0
+        self.consecutive_failures = 0
+        self.circuit = CIRCUIT_CLOSED
+        self.opened_at = 0.0
+        self.healthy = True
+        self.last_error: Optional[str] = None
+        self.last_probe: Optional[float] = None
+        self.requests = 0
+        self.failures = 0
+
+    def available(self, now: float) -> bool:
+        if self.circuit == CIRCUIT_OPEN and now - self.opened_at >= self.config.open_seconds:
+            # 冷却结束，允许一个试探请求
+            self.circuit = CIRCUIT_HALF_OPEN
+        if self.circuit == CIRCUIT_OPEN:
+            return False
+        if self.circuit == CIRCUIT_HALF_OPEN:
+            return self.in_flight == 0
+        return self.healthy
+
+    def load_score(self) -> float:
+        latency = self.ewma_latency if self.ewma_latency is not None else self.config.default_latency
+        return (self.in_flight + 1) * latency
+
+    def _update_error_rate(self, failed: bool):
+        alpha = self.config.ewma_alpha
+        self.ewma_error_rate = (1 - alpha) * self.ewma_error_rate + alpha * (1.0 if failed else 0.0)
+
+    def record_success(self, latency: float):
+        alpha = self.config.ewma_alpha
+        self.ewma_latency = latency if self.ewma_latency is None else (1 - alpha) * self.ewma_latency + alpha * latency
+        self._update_error_rate(False)
+        self.requests += 1
+        self.consecutive_failures = 0
+        self.circuit = CIRCUIT_CLOSED
+        self.healthy = True
+
+    def record_failure(self, error: Exception):
+        self._update_error_rate(True)
+        self.requests += 1
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.last_error = str(error)
+        if self.circuit == CIRCUIT_HALF_OPEN or self.consecutive_failures >= self.config.failure_threshold:
+            self.circuit = CIRCUIT_OPEN
+            self.opened_at = time.monotonic()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "base_url": self.base_url,
+            "healthy": self.healthy,
+            "circuit": self.circuit,
+            "latency_ms": round(self.ewma_latency * 1000, 1) if self.ewma_latency is not None else None,
+            "error_rate": round(self.ewma_error_rate, 4),
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "failures": self.failures,
+            "last_error": self.last_error
+        }
+
+
+class ModelRouter:
+    """在模型的多个副本间按负载路由请求，支持健康检查、熔断和备用模型"""
+
+    def __init__(self, models: Dict[str, ModelConfig], clients: LLMClientRegistry, config: Optional[RouterConfig] = None):
+        self.models = models
+        self.clients = clients
+        self.config = config or RouterConfig()
+        self.endpoints: Dict[str, List[EndpointState]] = {
+            model_id: [
+                EndpointState(model_id, base_url, model_config.api_key, self.config)
+                for base_url in model_config.endpoints
+            ]
+            for model_id, model_config in models.items()
+        }
+
+    def _route_chain(self, model_id: str) -> List[str]:
+        """模型本身加上依次的备用模型，避免循环"""
+        chain = []
+        while model_id is not None and model_id in self.models and model_id not in chain:
+            chain.append(model_id)
+            model_id = self.models[model_id].fallback
+        return chain
+
+    def _candidates(self, model_id: str, exclude: List[EndpointState]) -> List[EndpointState]:
+        now = time.monotonic()
+        available = [
+            endpoint for endpoint in self.endpoints[model_id]
+            if endpoint not in exclude and endpoint.available(now)
+        ]
+        return sorted(available, key=EndpointState.load_score)
+
+    def _attempts(self, model_id: str) -> Iterator[Tuple[str, EndpointState]]:
+        """按尝试顺序给出 (实际使用的模型, 副本)：先是模型本身负载最低的副本，再依次是备用模型"""
+        if model_id not in self.models:
+            raise KeyError(f"模型 {model_id} 不存在")
+        for routed_model in self._route_chain(model_id):
+            tried: List[EndpointState] = []
+            while True:
+                candidates = self._candidates(routed_model, tried)
+                if not candidates:
+                    break
+                endpoint = candidates[0]
+                tried.append(endpoint)
+                yield routed_model, endpoint
+
+    @staticmethod
+    def _no_healthy_endpoint(model_id: str, last_error: Optional[Exception]) -> NoHealthyEndpoint:
+        if last_error is not None:
+            return NoHealthyEndpoint(f"模型 {model_id} 的所有副本都调用失败: {last_error}")
+        return NoHealthyEndpoint(f"模型 {model_id} 没有可用的副本")
+
+    async def call(self, model_id: str, fn: Callable[[AsyncOpenAI, str], Awaitable[Any]]) -> Any:
+        """选择负载最低的健康副本执行 fn(client, model_name)，副本故障时切换到其他副本或备用模型"""
+        last_error: Optional[Exception] = None
+        for routed_model, endpoint in self._attempts(model_id):
+            client = self.clients.for_endpoint(endpoint.base_url, endpoint.api_key)
+            endpoint.in_flight += 1
+            start = time.monotonic()
+            try:
+                result = await fn(client, self.models[routed_model].model_name)
+            except Exception as e:
+                if not is_endpoint_failure(e):
+                    LLM_REQUEST_SECONDS.labels(routed_model, endpoint.base_url, "error").observe(time.monotonic() - start)
+                    raise
+                LLM_REQUEST_SECONDS.labels(routed_model, endpoint.base_url, "failover").observe(time.monotonic() - start)
+                endpoint.record_failure(e)
+                last_error = e
+                continue
+            finally:
+                endpoint.in_flight -= 1
+            latency = time.monotonic() - start
+            LLM_REQUEST_SECONDS.labels(routed_model, endpoint.base_url, "success").observe(latency)
+            endpoint.record_success(latency)
+            return result
+        raise self._no_healthy_endpoint(model_id, last_error) from last_error
+
+    @asynccontextmanager
+    async def stream(self, model_id: str, fn: Callable[[AsyncOpenAI, str], Awaitable[Any]]) -> AsyncIterator[Any]:
+        """与 call 相同地选择副本并用 fn 打开流式响应，在 with 块内消费。
+
+        只有打开流时的故障会切换副本；副本在整个 with 块期间计入在途请求，块正常结束
+        （包括提前关闭流）时按总耗时记录延迟，块内的副本故障计入熔断器后原样抛出。
+        """
+        last_error: Optional[Exception] = None
+        for routed_model, endpoint in self._attempts(model_id):
+            client = self.clients.for_endpoint(endpoint.base_url, endpoint.api_key)
+            endpoint.in_flight += 1
+            start = time.monotonic()
+            try:
+                try:
+                    response = await fn(client, self.models[routed_model].model_name)
+                except Exception as e:
+                    if not is_endpoint_failure(e):
+                        LLM_REQUEST_SECONDS.labels(routed_model, endpoint.base_url, "error").observe(time.monotonic() - start)
+                        raise
+                    LLM_REQUEST_SECONDS.labels(routed_model, endpoint.base_url, "failover").observe(time.monotonic() - start)
+                    endpoint.record_failure(e)
+                    last_error = e
+                    continue
+                try:
+                    yield response
+                except Exception as e:
+                    LLM_REQUEST_SECONDS.labels(routed_model, endpoint.base_url, "error").observe(time.monotonic() - start)
+                    if is_endpoint_failure(e):
+                        endpoint.record_failure(e)
+                    raise
+                latency = time.monotonic() - start
+                LLM_REQUEST_SECONDS.labels(routed_model, endpoint.base_url, "success").observe(latency)
+                endpoint.record_success(latency)
+                return
+            finally:
+                endpoint.in_flight -= 1
+        raise self._no_healthy_endpoint(model_id, last_error) from last_error
+
+    async def _probe(self, endpoint: EndpointState):
+        client = self.clients.for_endpoint(endpoint.base_url, endpoint.api_key)
+        try:
+            await client.with_options(
+                timeout=self.config.health_check_timeout,
+                max_retries=0
+            ).models.list()
+        except Exception as e:
+            endpoint.healthy = False
+            endpoint.last_error = str(e)
+        else:
+            endpoint.healthy = True
+            # 探活成功且冷却结束时关闭熔断器
+            if endpoint.circuit != CIRCUIT_CLOSED and time.monotonic() - endpoint.opened_at >= self.config.open_seconds:
+                endpoint.circuit = CIRCUIT_CLOSED
+                endpoint.consecutive_failures = 0
+        endpoint.last_probe = time.time()
+
+    async def health_check(self):
+        """并发探测所有副本"""
+        await asyncio.gather(*[
+            self._probe(endpoint)
+            for endpoints in self.endpoints.values()
+            for endpoint in endpoints
+        ])
+
+    async def run_health_checks(self):
+        """后台循环执行健康检查，随应用生命周期启动和取消"""
+        while True:
+            await self.health_check()
+            await asyncio.sleep(self.config.health_check_interval)
+
+    def snapshot(self, model_id: str) -> List[Dict[str, Any]]:
+        return [endpoint.snapshot() for endpoint in self.endpoints.get(model_id, [])]
+
+    def collect(self) -> List[Family]:
+        """副本的在途请求数、熔断状态和 EWMA 延迟，供 /metrics 抓取时读取"""
+        in_flight, circuit_open, latency = [], [], []
+        for model_id, endpoints in self.endpoints.items():
+            for endpoint in endpoints:
+                labels = {"model": model_id, "endpoint": endpoint.base_url}
+                in_flight.append((labels, endpoint.in_flight))
+                circuit_open.append((labels, 0 if endpoint.circuit == CIRCUIT_CLOSED else 1))
+                if endpoint.ewma_latency is not None:
+                    latency.append((labels, endpoint.ewma_latency))
+        return [
+            ("llm_endpoint_in_flight", "gauge", "In-flight LLM requests per endpoint", in_flight),
+            ("llm_endpoint_circuit_open", "gauge", "1 when the endpoint circuit breaker is open or half-open", circuit_open),
+            ("llm_endpoint_ewma_latency_seconds", "gauge", "EWMA latency used for routing", latency)
+        ]
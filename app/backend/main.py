@@ -1,12 +1,146 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 import uvicorn
 import asyncio
-from datetime import datetime
+import os
+import sys
+from services import (
+    BatchConfig, HistoryConfig, HistoryManager, PipelineObserver, PipelineRun, ServiceManager, SubtaskBatcher
+)
+from utils.cache import CacheConfig, TwoTierCache
+from utils.env import apply_env_overrides
+from utils.metrics import CONTENT_TYPE, REGISTRY
+from utils.models import AVAILABLE_MODELS
+from utils.sse import SSE_HEADERS, sse_event
+
+# 模型调用复用 app/main.py 的连接池和路由（backend.llm 以相对路径引用 backend.utils，需要 app 目录在导入路径上）
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if APP_DIR not in sys.path:
+    sys.path.append(APP_DIR)
+from backend.llm import ClientPoolConfig, LLMClientRegistry, ModelRouter, RouterConfig
+
+# 阶段结果和检查点存储：进程内 LRU，配置 REDIS_URL 时由 Redis 持久化
+stage_store = TwoTierCache(CacheConfig.from_env("STAGE_CACHE_"), namespace="stage")
+
+STAGE_DURATION = REGISTRY.histogram(
+    "pipeline_stage_duration_seconds",
+    "Pipeline stage duration by outcome",
+    ("stage", "outcome")
+)
+RUN_DURATION = REGISTRY.histogram(
+    "pipeline_run_duration_seconds",
+    "End-to-end pipeline run duration by final status",
+    ("status",)
+)
+
+class MetricsObserver(PipelineObserver):
+    """把阶段和运行的耗时写入 /metrics 直方图"""
+
+    def stage_finished(self, stage: str, outcome: str, duration: float):
+        STAGE_DURATION.labels(stage, outcome).observe(duration)
+
+    def run_finished(self, run: PipelineRun, duration: float):
+        # 被取消的运行状态仍为 running
+        status = "cancelled" if run.status == "running" else run.status
+        RUN_DURATION.labels(status).observe(duration)
+
+def load_history_config() -> HistoryConfig:
+    """HISTORY_MAX_TOKENS 等覆盖默认值，HISTORY_MODEL_BUDGETS 形如 deepseek-r1=24000,llama-33=6000"""
+    config = apply_env_overrides(HistoryConfig(), "HISTORY_")
+    for item in os.getenv("HISTORY_MODEL_BUDGETS", "").split(","):
+        model, _, budget = item.partition("=")
+        if model.strip() and budget.strip():
+            config.model_budgets[model.strip()] = int(budget)
+    return config
+
+# 对话历史超出预算时，较早的轮次被替换为增量维护的摘要（摘要与阶段结果存放在同一存储中）
+history = HistoryManager(load_history_config(), store=stage_store)
+
+# 长连接客户端（每个模型地址一个连接池）和副本路由（负载与 EWMA 延迟选择、熔断、备用模型）
+llm_clients = LLMClientRegistry(AVAILABLE_MODELS, ClientPoolConfig.from_env())
+model_router = ModelRouter(AVAILABLE_MODELS, llm_clients, RouterConfig.from_env())
+
+def load_batcher(router: ModelRouter) -> Optional[SubtaskBatcher]:
+    """PIPELINE_BATCH_MODEL 指定分析和评估阶段批量调用的模型，PIPELINE_BATCH_CONTEXT_TOKENS 等覆盖批次配置；
+    未设置模型时这两个阶段使用模拟结果"""
+    model_id = os.getenv("PIPELINE_BATCH_MODEL", "")
+    if not model_id:
+        return None
+    if model_id not in AVAILABLE_MODELS:
+        raise ValueError(f"PIPELINE_BATCH_MODEL 指定的模型 {model_id} 不存在")
+
+    async def complete(messages: List[Dict[str, Any]], schema: Dict[str, Any]) -> str:
+        async def create(client, model_name: str) -> str:
+            # schema 已写入提示词，这里只要求模型输出 JSON 对象，兼容不支持 json_schema 的服务端
+            response = await client.chat.completions.create(
+                model=model_name,
+                messages=messages,
+                temperature=0,
+                response_format={"type": "json_object"}
+            )
+            return response.choices[0].message.content or ""
+
+        return await router.call(model_id, create)
+
+    return SubtaskBatcher(complete, apply_env_overrides(BatchConfig(), "PIPELINE_BATCH_"))
+
+batcher = load_batcher(model_router)
+
+# 执行阶段同时执行的子任务数
+EXECUTION_PARALLELISM = int(os.getenv("PIPELINE_EXECUTION_PARALLELISM", "4"))
+
+# 所有请求共享一个服务管理器，每次请求在独立的 PipelineRun 中执行
+service_manager = ServiceManager(
+    stage_store=stage_store,
+    observer=MetricsObserver(),
+    history=history,
+    batcher=batcher,
+    execution_parallelism=EXECUTION_PARALLELISM
+)
+
+def pipeline_metrics():
+    return [
+        ("pipeline_active_runs", "gauge", "Pipeline runs currently executing", [({}, len(service_manager.active_runs))])
+    ]
 
-app = FastAPI()
+BATCH_METRIC_HELP = {
+    "batches": "Batched analysis and evaluation model calls",
+    "retries": "Subtasks retried individually after a batched call",
+    "items": "Subtasks sent through the batcher"
+}
+
+def batch_metrics():
+    return [
+        (f"pipeline_batch_{name}_total", "counter", BATCH_METRIC_HELP[name], [({}, value)])
+        for name, value in batcher.counters.items()
+    ]
+
+REGISTRY.add_collector(pipeline_metrics)
+if batcher is not None:
+    REGISTRY.add_collector(batch_metrics)
+    REGISTRY.add_collector(model_router.collect)
+REGISTRY.add_collector(stage_store.collect)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await stage_store.start()
+    router_task = None
+    if batcher is not None:
+        await llm_clients.start()
+        router_task = asyncio.create_task(model_router.run_health_checks())
+    try:
+        yield
+    finally:
+        if router_task is not None:
+            router_task.cancel()
+        await llm_clients.aclose()
+        await stage_store.aclose()
+
+app = FastAPI(lifespan=lifespan)
 
 # 配置CORS
 app.add_middleware(
@@ -23,6 +157,10 @@ class Message(BaseModel):
 
 class ChatRequest(BaseModel):
     messages: List[Message]
+    # 决定历史压缩使用的 token 预算
+    model: Optional[str] = None
+    # 为 True 时在响应中返回每个阶段的完整结果，默认只返回步骤状态和最终总结
+    include_results: bool = False
 
 class ExecutionStep(BaseModel):
     id: str
@@ -34,72 +172,130 @@ class ExecutionStep(BaseModel):
 class ChatResponse(BaseModel):
     message: str
     steps: List[ExecutionStep]
+    run_id: Optional[str] = None
+    summary: Optional[Dict[str, Any]] = None
+    results: Optional[Dict[str, Any]] = None
+
+# 流水线各阶段的展示信息，顺序与 ServiceManager 中的服务一致
+STEP_DEFINITIONS = {
+    "reasoning": ("推理阶段", "分析用户输入，理解任务需求"),
+    "decomposition": ("任务分解", "将任务分解为可执行的子任务"),
+    "analysis": ("执行前分析", "分析每个子任务的执行条件和资源需求"),
+    "execution": ("执行任务", "按依赖关系执行分解后的子任务"),
+    "evaluation": ("任务评估", "评估任务执行结果和效果"),
+    "summary": ("输出总结", "生成任务执行总结和后续建议")
+}
+
+def build_step(service_name: str, status: Dict[str, Any]) -> ExecutionStep:
+    title, description = STEP_DEFINITIONS[service_name]
+    return ExecutionStep(
+        id=service_name,
+        title=title,
+        description=description,
+        status=status["status"],
+        details=status.get("error") or status.get("details")
+    )
+
+def build_steps(run: PipelineRun) -> List[ExecutionStep]:
+    return [
+        build_step(name, status)
+        for name, status in run.get_all_status(STEP_DEFINITIONS, include_result=False).items()
+    ]
+
+def build_chat_response(run: PipelineRun, results: Dict[str, Any], include_results: bool = False) -> ChatResponse:
+    """默认只返回步骤状态和最终总结；include_results 为 True 时附带各阶段结果"""
+    summary = None
+    if "error" in results:
+        message = f"任务执行失败：{results['error']}"
+        stage_results = results["results"]
+    else:
+        summary = results["summary"]["result"]
+        execution_summary = summary["execution_summary"]
+        message = (
+            f"任务已完成：共 {execution_summary['total_tasks']} 个子任务，"
+            f"耗时 {execution_summary['total_time']}，状态 {execution_summary['overall_status']}。"
+        )
+        stage_results = results
+    return ChatResponse(
+        message=message,
+        steps=build_steps(run),
+        run_id=run.id,
+        summary=summary,
+        results=stage_results if include_results else None
+    )
+
+def create_chat_run(request: ChatRequest, with_events: bool = False) -> PipelineRun:
+    context: Dict[str, Any] = {"messages": [message.model_dump() for message in request.messages]}
+    if request.model:
+        context["model"] = request.model
+    return service_manager.create_run(context, with_events=with_events)
 
 @app.post("/api/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     try:
-        # 模拟执行流程
-        steps = [
-            ExecutionStep(
-                id="reasoning",
-                title="推理阶段",
-                description="分析用户输入，理解任务需求",
-                status="running",
-                details="正在分析用户输入..."
-            ),
-            ExecutionStep(
-                id="decomposition",
-                title="任务分解",
-                description="将任务分解为可执行的子任务",
-                status="pending"
-            ),
-            ExecutionStep(
-                id="analysis",
-                title="执行前分析",
-                description="分析每个子任务的执行条件和资源需求",
-                status="pending"
-            ),
-            ExecutionStep(
-                id="execution",
-                title="执行任务",
-                description="按顺序执行分解后的子任务",
-                status="pending"
-            ),
-            ExecutionStep(
-                id="evaluation",
-                title="任务评估",
-                description="评估任务执行结果和效果",
-                status="pending"
-            ),
-            ExecutionStep(
-                id="summary",
-                title="输出总结",
-                description="生成任务执行总结和后续建议",
-                status="pending"
-            )
-        ]
-
-        # 模拟异步处理
-        await asyncio.sleep(1)
-        
-        # 更新步骤状态
-        for i, step in enumerate(steps):
-            if i == 0:
-                step.status = "completed"
-                step.details = "已完成用户输入分析"
-            elif i == 1:
-                step.status = "running"
-                step.details = "正在分解任务..."
-            else:
-                step.status = "pending"
-
-        return ChatResponse(
-            message="这是一个模拟的回复消息。在实际应用中，这里会显示AI助手的真实回复。",
-            steps=steps
-        )
+        run = create_chat_run(request)
+        results = await service_manager.execute_all(run.context, run, lean=not request.include_results)
+        return build_chat_response(run, results, request.include_results)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """以 Server-Sent Events 推送流水线进度。
+
+    先发送 `run`（run id 和全部步骤的初始状态），每次步骤状态变化发送 `step`，
+    最后发送 `done`，内容为完整的 ChatResponse。
+    """
+    run = create_chat_run(request, with_events=True)
+    task = asyncio.create_task(service_manager.execute_all(run.context, run, lean=not request.include_results))
+
+    async def event_stream():
+        try:
+            yield sse_event("run", {
+                "run_id": run.id,
+                "steps": [step.model_dump() for step in build_steps(run)]
+            })
+            async for event in run.events.subscribe():
+                if event["type"] == "status":
+                    yield sse_event("step", build_step(event["service"], event).model_dump())
+            results = await task
+            yield sse_event("done", build_chat_response(run, results, request.include_results).model_dump())
+        except Exception as e:
+            yield sse_event("error", {"detail": str(e)})
+        finally:
+            # 客户端断开时停止流水线
+            if not task.done():
+                task.cancel()
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@app.post("/api/runs/{run_id}/resume", response_model=ChatResponse)
+async def resume_run(run_id: str):
+    """从上次成功的阶段继续执行失败的运行"""
+    try:
+        run = await service_manager.resume(run_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    results = await service_manager.execute_all(run.context, run, lean=True)
+    return build_chat_response(run, results)
+
+@app.get("/api/runs/{run_id}")
+async def get_run_status(run_id: str):
+    try:
+        run = service_manager.get_run(run_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {
+        "run_id": run.id,
+        "status": run.status,
+        "steps": build_steps(run)
+    }
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus 文本格式的阶段耗时、运行数和缓存命中指标"""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
@@ -0,0 +1,35 @@
+from .backend import BackendPolicyConfig, SandboxBackend, SandboxRouter
+from .executor import AdmissionConfig, SandboxExecutor, SandboxSaturated
+from .images import ImageBuilder, ImageBuilderConfig
+from .pool import (
+    ContainerPool,
+    ContainerPoolConfig,
+    ExecResult,
+    SandboxLimits,
+    SandboxPoolManager
+)
+from .process import ProcessSandbox, ProcessSandboxConfig
+from .scheduler import Allocation, ResourceConfig, ResourceRequest, ResourceScheduler, parse_resources
+
+__all__ = [
+    'BackendPolicyConfig',
+    'SandboxBackend',
+    'SandboxRouter',
+    'AdmissionConfig',
+    'SandboxExecutor',
+    'SandboxSaturated',
+    'ImageBuilder',
+    'ImageBuilderConfig',
+    'ContainerPool',
+    'ContainerPoolConfig',
+    'ExecResult',
+    'SandboxLimits',
+    'SandboxPoolManager',
+    'ProcessSandbox',
+    'ProcessSandboxConfig',
+    'Allocation',
+    'ResourceConfig',
+    'ResourceRequest',
+    'ResourceScheduler',
+    'parse_resources'
+]
@@ -0,0 +1,103 @@
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Protocol
+
+from ..utils.env import apply_env_overrides
+from ..utils.metrics import Family
+from .images import python_requirements
+from .pool import ExecResult, SandboxLimits
+from .scheduler import Allocation
+
+BACKEND_CHOICES = ("docker", "process", "auto")
+
+
+class SandboxBackend(Protocol):
+    """沙箱后端接口：SandboxPoolManager（Docker 容器池）和 ProcessSandbox（进程沙箱）"""
+
+    name: str
+    limits: SandboxLimits
+
+    def supports(self, language: str) -> bool:
+        ...
+
+    async def prepare(self, language: str, code: str):
+        """执行准入之前的准备工作（例如构建依赖镜像），不占用执行槽位"""
+        ...
+
+    def run(
+        self,
+        language: str,
+        code: str,
+        timeout: int,
+        on_output: Optional[Callable[[str, bytes], None]] = None,
+        allocation: Optional[Allocation] = None
+    ) -> ExecResult:
+        ...
+
+    def image_id(self, language: str, code: str) -> Optional[str]:
+        ...
+
+    def collect(self) -> List[Family]:
+        ...
+
+    def close(self):
+        ...
+
+
+@dataclass
+class BackendPolicyConfig:
+    """未指定后端的请求的选择策略"""
+    # docker、process 或 auto；auto 把小型、短时且没有第三方依赖的 Python 代码交给进程沙箱，
+    # 只应在所有代码都可信时使用
+    default: str = "docker"
+    fast_max_code_bytes: int = 4096
+    fast_max_timeout: int = 5
+
+    @classmethod
+    def from_env(cls, prefix: str = "SANDBOX_BACKEND_") -> "BackendPolicyConfig":
+        return apply_env_overrides(cls(), prefix)
+
+
+class SandboxRouter:
+    """按请求或策略为每次执行选择沙箱后端。
+
+    选出的后端不可用或不支持该语言时直接报错，不会换用其他后端：进程沙箱只用于可信代码，
+    只有请求或策略明确选择 process 或 auto 时才会使用，Docker 不可用时不会退回到进程沙箱。
+    """
+
+    def __init__(self, backends: Iterable[Optional[SandboxBackend]], policy: Optional[BackendPolicyConfig] = None):
+        self.policy = policy or BackendPolicyConfig()
+        if self.policy.default not in BACKEND_CHOICES:
+            raise ValueError(f"未知的沙箱后端策略: {self.policy.default}")
+        self.backends: Dict[str, SandboxBackend] = {
+            backend.name: backend for backend in backends if backend is not None
+        }
+
+    @property
+    def available(self) -> bool:
+        return bool(self.backends)
+
+    def remove(self, name: str):
+        """移除无法启动的后端"""
+        self.backends.pop(name, None)
+
+    def _fast(self, language: str, code: str, timeout: int) -> bool:
+        return (
+            language == "python"
+            and len(code.encode()) <= self.policy.fast_max_code_bytes
+            and timeout <= self.policy.fast_max_timeout
+            and not python_requirements(code)
+        )
+
+    def select(self, language: str, code: str, timeout: int, requested: Optional[str] = None) -> SandboxBackend:
+        """返回执行 code 的后端；指定的后端不存在、不可用或不支持该语言时抛出 ValueError"""
+        if requested is not None and requested not in BACKEND_CHOICES:
+            raise ValueError(f"未知的沙箱后端: {requested}")
+        name = requested or self.policy.default
+        if name == "auto":
+            name = "process" if self._fast(language, code, timeout) else "docker"
+        backend = self.backends.get(name)
+        if backend is None:
+            raise ValueError(f"沙箱后端 {name} 不可用")
+        if not backend.supports(language):
+            raise ValueError(f"沙箱后端 {name} 不支持语言: {language}")
+        return backend
@@ -0,0 +1,130 @@
+import asyncio
+import functools
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from ..utils.env import apply_env_overrides
+from ..utils.metrics import REGISTRY, Family
+from .scheduler import Allocation, ResourceConfig, ResourceRequest, ResourceScheduler
+
+QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    "sandbox_queue_wait_seconds",
+    "Time spent waiting for a sandbox execution slot"
+)
+REJECTIONS = REGISTRY.counter(
+    "sandbox_rejections_total",
+    "Sandbox requests rejected by admission control",
+    ("status",)
+)
+
+
+@dataclass
+class AdmissionConfig:
+    """沙箱执行的并发与排队配置"""
+    max_concurrency: int = 4
+    max_queue_depth: int = 32
+    queue_timeout: float = 10.0
+    min_retry_after: int = 1
+
+    @classmethod
+    def from_env(cls, prefix: str = "SANDBOX_ADMISSION_") -> "AdmissionConfig":
+        return apply_env_overrides(cls(), prefix)
+
+
+class SandboxSaturated(Exception):
+    """沙箱已饱和，请求被拒绝"""
+
+    def __init__(self, message: str, status_code: int, retry_after: int):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class SandboxExecutor:
+    """在专用线程池中执行同步的 Docker 操作，按主机 CPU、内存和槽位准入并对排队请求做背压。
+
+    每次执行按资源申请（例如执行前分析的 required_resources）分配 CPU 和内存，
+    由 ResourceScheduler 装箱放行，分配结果以 allocation 关键字参数传给 fn，用于设置容器限制。
+    """
+
+    def __init__(self, config: AdmissionConfig, resources: Optional[ResourceConfig] = None):
+        self.config = config
+        self._pool = ThreadPoolExecutor(max_workers=config.max_concurrency, thread_name_prefix="sandbox")
+        self.scheduler = ResourceScheduler(resources or ResourceConfig(), config.max_concurrency)
+        # 执行耗时的指数滑动平均，用于估算 Retry-After
+        self._avg_duration = 1.0
+
+    def _retry_after(self) -> int:
+        rounds = self.scheduler.waiting / self.config.max_concurrency + 1
+        return max(self.config.min_retry_after, math.ceil(self._avg_duration * rounds))
+
+    def _release(self, allocation: Allocation, started: float):
+        self._avg_duration = 0.8 * self._avg_duration + 0.2 * (time.monotonic() - started)
+        self.scheduler.release(allocation)
+
+    async def acquire(self, resources: Optional[ResourceRequest] = None) -> Allocation:
+        """等待主机上有足够的资源；队列已满或等待超时时抛出 SandboxSaturated"""
+        allocation = self.scheduler.size(resources)
+        if self.scheduler.waiting >= self.config.max_queue_depth and not self.scheduler.fits(allocation):
+            REJECTIONS.labels(429).inc()
+            raise SandboxSaturated("沙箱执行队列已满", 429, self._retry_after())
+
+        queued = time.monotonic()
+        try:
+            await self.scheduler.acquire(allocation, self.config.queue_timeout)
+        except asyncio.TimeoutError:
+            REJECTIONS.labels(503).inc()
+            raise SandboxSaturated("等待沙箱执行资源超时", 503, self._retry_after())
+        QUEUE_WAIT_SECONDS.observe(time.monotonic() - queued)
+        return allocation
+
+    def start(self, allocation: Allocation, fn: Callable[..., Any], *args, **kwargs) -> asyncio.Future:
+        """用已获得的资源在线程池中启动 fn(*args, allocation=allocation, **kwargs)"""
+        started = time.monotonic()
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._pool, functools.partial(fn, *args, allocation=allocation, **kwargs))
+        # 线程无法被取消，资源在线程真正结束后才释放，请求被取消时也不会超额占用主机
+        future.add_done_callback(lambda _: self._release(allocation, started))
+        return future
+
+    async def submit(
+        self,
+        fn: Callable[..., Any],
+        *args,
+        resources: Optional[ResourceRequest] = None,
+        **kwargs
+    ) -> Any:
+        """排队等待资源，然后在线程池中执行 fn"""
+        allocation = await self.acquire(resources)
+        return await asyncio.shield(self.start(allocation, fn, *args, **kwargs))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.scheduler.running,
+            "waiting": self.scheduler.waiting,
+            "max_concurrency": self.config.max_concurrency,
+            "max_queue_depth": self.config.max_queue_depth,
+            **self.scheduler.stats()
+        }
+
+    def collect(self) -> List[Family]:
+        """执行中和排队中的请求数以及资源分配情况，供 /metrics 抓取时读取"""
+        scheduler = self.scheduler
+        return [
+            ("sandbox_executions_running", "gauge", "Sandbox executions holding a slot", [({}, scheduler.running)]),
+            ("sandbox_queue_depth", "gauge", "Requests waiting for sandbox resources", [({}, scheduler.waiting)]),
+            ("sandbox_allocated", "gauge", "Host resources allocated to running sandboxes", [
+                ({"resource": "cpus"}, scheduler.allocated_cpus),
+                ({"resource": "memory_mb"}, scheduler.allocated_memory_mb)
+            ]),
+            ("sandbox_capacity", "gauge", "Host resources available to sandboxes", [
+                ({"resource": "cpus"}, scheduler.config.cpus),
+                ({"resource": "memory_mb"}, scheduler.config.memory_mb)
+            ])
+        ]
+
+    def close(self):
+        self._pool.shutdown(wait=True, cancel_futures=True)
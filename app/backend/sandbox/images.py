@@ -0,0 +1,362 @@
+import ast
+import hashlib
+import io
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, FrozenSet, Iterator, List, Optional
+
+import docker
+
+from ..utils.env import apply_env_overrides
+from ..utils.metrics import REGISTRY, Family
+
+IMAGE_LABEL = "creation.sandbox.deps"
+
+# import 名与 PyPI 包名不一致的常见情况
+PYTHON_PACKAGE_NAMES: Dict[str, str] = {
+    "PIL": "Pillow",
+    "bs4": "beautifulsoup4",
+    "cv2": "opencv-python-headless",
+    "dateutil": "python-dateutil",
+    "sklearn": "scikit-learn",
+    "skimage": "scikit-image",
+    "yaml": "PyYAML",
+}
+
+# 各语言在镜像中安装依赖的命令，包名追加在末尾
+INSTALL_COMMANDS: Dict[str, List[str]] = {
+    "python": ["pip", "install", "--no-cache-dir"],
+}
+
+_PACKAGE_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]*$")
+
+IMAGE_BUILD_SECONDS = REGISTRY.histogram(
+    "sandbox_image_build_seconds",
+    "Time to build a dependency image for the sandbox",
+    ("language", "outcome")
+)
+IMAGE_LOOKUPS = REGISTRY.counter(
+    "sandbox_image_lookups_total",
+    "Dependency image lookups by result",
+    ("language", "result")
+)
+
+
+_IMPORT_ERRORS = {"ImportError", "ModuleNotFoundError", "Exception", "BaseException"}
+
+
+def _catches_import_error(handler: ast.ExceptHandler) -> bool:
+    if handler.type is None:
+        return True
+    types = handler.type.elts if isinstance(handler.type, ast.Tuple) else [handler.type]
+    return any(isinstance(node, ast.Name) and node.id in _IMPORT_ERRORS for node in types)
+
+
+def _top_level_imports(body: List[ast.stmt]) -> Iterator[str]:
+    """模块级语句中导入的顶层模块名，进入 if 的各分支和 try 的各部分，不进入函数和类。
+    捕获 ImportError 的 try 块中的导入是可选依赖，不计入"""
+    for node in body:
+        if isinstance(node, ast.Import):
+            yield from (alias.name.split(".")[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            if node.level == 0 and node.module:
+                yield node.module.split(".")[0]
+        elif isinstance(node, ast.If):
+            yield from _top_level_imports(node.body)
+            yield from _top_level_imports(node.orelse)
+        elif isinstance(node, (ast.Try, ast.TryStar)):
+            if not any(_catches_import_error(handler) for handler in node.handlers):
+                yield from _top_level_imports(node.body)
+            for handler in node.handlers:
+                yield from _top_level_imports(handler.body)
+            yield from _top_level_imports(node.orelse)
+            yield from _top_level_imports(node.finalbody)
+
+
+def python_requirements(code: str) -> FrozenSet[str]:
+    """代码中顶层 import 的第三方包；标准库、相对导入和可选导入不计入，无法解析的代码返回空集"""
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return frozenset()
+    modules = set(_top_level_imports(tree.body))
+    return frozenset(
+        PYTHON_PACKAGE_NAMES.get(module, module)
+        for module in modules
+        if module not in sys.stdlib_module_names and module != "__future__"
+    )
+
+
+# 各语言从代码推导依赖包集合的方法，未列出的语言总是使用基础镜像
+REQUIREMENT_PARSERS: Dict[str, Callable[[str], FrozenSet[str]]] = {
+    "python": python_requirements,
+}
+
+
+@dataclass
+class ImageBuilderConfig:
+    """依赖镜像构建配置"""
+    enabled: bool = True
+    # 依赖镜像占用的磁盘上限（只计算基础镜像之上新增的层），超出时淘汰最久未使用的镜像
+    max_bytes: int = 10 * 1024 * 1024 * 1024
+    # 单个程序最多安装的包数，超出时直接使用基础镜像
+    max_packages: int = 10
+    # 允许安装的包，逗号分隔；为空时不安装任何包，需要第三方依赖的代码都在基础镜像中执行
+    allowed_packages: str = ""
+    # 启动时预先构建的依赖组合，组合之间用分号、包之间用逗号分隔，例如 "numpy,pandas;requests"
+    prebuild: str = ""
+    # 构建失败的依赖组合在该时间内不再重试
+    failure_ttl: float = 300.0
+    # 请求在进入执行准入前等待依赖镜像构建的最长时间（秒），超时后先在基础镜像中执行，构建在后台继续
+    build_wait: float = 60.0
+    # 同时进行的后台构建数
+    build_workers: int = 2
+    tag_prefix: str = "creation-sandbox"
+
+    @classmethod
+    def from_env(cls, prefix: str = "SANDBOX_IMAGE_") -> "ImageBuilderConfig":
+        return apply_env_overrides(cls(), prefix)
+
+    def allowed(self) -> FrozenSet[str]:
+        return frozenset(name.strip().lower() for name in self.allowed_packages.split(",") if name.strip())
+
+    def prebuild_stacks(self) -> List[FrozenSet[str]]:
+        stacks = []
+        for stack in self.prebuild.split(";"):
+            packages = frozenset(name.strip() for name in stack.split(",") if name.strip())
+            if packages:
+                stacks.append(packages)
+        return stacks
+
+
+class ImageBuilder:
+    """按依赖包集合在基础镜像之上构建并复用沙箱镜像。
+
+    镜像以 (基础镜像, 排序后的包名) 的哈希作为标签，依赖相同的程序共用同一个镜像，
+    只有第一次需要安装依赖。已构建的镜像按最近使用顺序保存，总大小超出 max_bytes 时
+    淘汰最久未使用的镜像，on_evict 回调用于关闭该镜像的容器池。
+    """
+
+    def __init__(self, docker_client, config: ImageBuilderConfig):
+        self.docker_client = docker_client
+        self.config = config
+        self.on_evict: Optional[Callable[[str], None]] = None
+        # 标签 -> 新增层的字节数，按最近使用排序
+        self._images: "OrderedDict[str, int]" = OrderedDict()
+        self._bytes = 0
+        self._failures: Dict[str, float] = {}
+        self._base_sizes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._building: Dict[str, threading.Lock] = {}
+        # 标签 -> 进行中的后台构建，同一依赖组合只排队一次
+        self._pending: Dict[str, Future] = {}
+        self._executor = ThreadPoolExecutor(max_workers=config.build_workers, thread_name_prefix="sandbox-image-build")
+
+    def requirements(self, language: str, code: str) -> FrozenSet[str]:
+        parser = REQUIREMENT_PARSERS.get(language)
+        return parser(code) if parser is not None else frozenset()
+
+    def tag_for(self, language: str, base_image: str, packages: FrozenSet[str]) -> str:
+        digest = hashlib.sha256("\n".join([base_image, *sorted(packages)]).encode()).hexdigest()
+        return f"{self.config.tag_prefix}-{language}:{digest[:16]}"
+
+    def _usable(self, packages: FrozenSet[str]) -> bool:
+        if len(packages) > self.config.max_packages:
+            return False
+        if not all(_PACKAGE_NAME.match(name) for name in packages):
+            return False
+        allowed = self.config.allowed()
+        return all(name.lower() in allowed for name in packages)
+
+    def load_existing(self):
+        """登记上一次进程构建的依赖镜像，重启后仍可复用并计入磁盘预算"""
+        images = self.docker_client.images.list(filters={"label": IMAGE_LABEL})
+        images.sort(key=lambda image: image.attrs.get("Created", ""))
+        for image in images:
+            size = max(0, image.attrs.get("Size", 0) - self._base_size(image.labels.get(IMAGE_LABEL, "")))
+            with self._lock:
+                for tag in image.tags:
+                    if tag.startswith(self.config.tag_prefix) and tag not in self._images:
+                        self._add(tag, size)
+        self._evict()
+
+    def _packages(self, language: str, code: str) -> Optional[FrozenSet[str]]:
+        """code 需要安装的包，返回 None 表示直接使用基础镜像"""
+        if not self.config.enabled or language not in INSTALL_COMMANDS:
+            return None
+        packages = self.requirements(language, code)
+        if not packages:
+            return None
+        if not self._usable(packages):
+            IMAGE_LOOKUPS.labels(language, "rejected").inc()
+            return None
+        return packages
+
+    def lookup(self, language: str, base_image: str, code: str) -> Optional[str]:
+        """不触发构建地返回 code 将使用的镜像；所需的依赖镜像尚未构建时返回 None"""
+        packages = self._packages(language, code)
+        if packages is None:
+            return base_image
+        tag = self.tag_for(language, base_image, packages)
+        with self._lock:
+            return tag if tag in self._images else None
+
+    def image_for(self, language: str, base_image: str, code: str) -> str:
+        """返回运行 code 所用的镜像，从不触发构建；依赖镜像尚未构建完成时返回基础镜像"""
+        packages = self._packages(language, code)
+        if packages is None:
+            return base_image
+        tag = self.tag_for(language, base_image, packages)
+        if self._touch(tag):
+            IMAGE_LOOKUPS.labels(language, "hit").inc()
+            return tag
+        IMAGE_LOOKUPS.labels(language, "miss").inc()
+        return base_image
+
+    def schedule(self, language: str, base_image: str, code: str) -> Optional[Future]:
+        """在后台构建 code 所需的依赖镜像，返回构建的 Future；不需要构建时返回 None"""
+        packages = self._packages(language, code)
+        if packages is None:
+            return None
+        tag = self.tag_for(language, base_image, packages)
+        if self._touch(tag):
+            return None
+        with self._lock:
+            future = self._pending.get(tag)
+            if future is None:
+                future = self._executor.submit(self._build_pending, language, base_image, packages, tag)
+                self._pending[tag] = future
+            return future
+
+    def _build_pending(self, language: str, base_image: str, packages: FrozenSet[str], tag: str) -> str:
+        try:
+            self.ensure(language, base_image, packages)
+        except Exception as e:
+            IMAGE_LOOKUPS.labels(language, "failed").inc()
+            print(f"Warning: could not build sandbox image {tag}: {e}")
+            raise
+        else:
+            IMAGE_LOOKUPS.labels(language, "built").inc()
+            return tag
+        finally:
+            with self._lock:
+                self._pending.pop(tag, None)
+
+    def _touch(self, tag: str) -> bool:
+        with self._lock:
+            if tag not in self._images:
+                return False
+            self._images.move_to_end(tag)
+            return True
+
+    def ensure(self, language: str, base_image: str, packages: FrozenSet[str]) -> str:
+        """构建（或复用已有的）依赖镜像并返回标签，同一标签的并发请求只构建一次"""
+        tag = self.tag_for(language, base_image, packages)
+        with self._lock:
+            build_lock = self._building.setdefault(tag, threading.Lock())
+        try:
+            with build_lock:
+                if self._touch(tag):
+                    return tag
+                with self._lock:
+                    failed_at = self._failures.get(tag)
+                if failed_at is not None and time.monotonic() - failed_at < self.config.failure_ttl:
+                    raise RuntimeError(f"依赖 {', '.join(sorted(packages))} 最近构建失败")
+                try:
+                    try:
+                        image = self.docker_client.images.get(tag)
+                    except docker.errors.ImageNotFound:
+                        image = self._build(language, base_image, packages, tag)
+                except Exception:
+                    with self._lock:
+                        self._failures[tag] = time.monotonic()
+                    raise
+                size = max(0, image.attrs.get("Size", 0) - self._base_size(base_image))
+                with self._lock:
+                    self._failures.pop(tag, None)
+                    self._add(tag, size)
+        finally:
+            # 成功和失败都要移除，否则每个构建失败的依赖组合都会留下一把锁
+            with self._lock:
+                if self._building.get(tag) is build_lock:
+                    del self._building[tag]
+        self._evict()
+        return tag
+
+    def _build(self, language: str, base_image: str, packages: FrozenSet[str], tag: str):
+        install = " ".join([*INSTALL_COMMANDS[language], *sorted(packages)])
+        dockerfile = f"FROM {base_image}\nUSER root\nRUN {install}\n"
+        start = time.monotonic()
+        outcome = "error"
+        try:
+            image, _ = self.docker_client.images.build(
+                fileobj=io.BytesIO(dockerfile.encode()),
+                tag=tag,
+                labels={IMAGE_LABEL: base_image},
+                rm=True,
+                forcerm=True
+            )
+            outcome = "success"
+            return image
+        finally:
+            IMAGE_BUILD_SECONDS.labels(language, outcome).observe(time.monotonic() - start)
+
+    def _base_size(self, base_image: str) -> int:
+        if not base_image:
+            return 0
+        size = self._base_sizes.get(base_image)
+        if size is None:
+            try:
+                size = self.docker_client.images.get(base_image).attrs.get("Size", 0)
+            except docker.errors.APIError:
+                size = 0
+            self._base_sizes[base_image] = size
+        return size
+
+    def _add(self, tag: str, size: int):
+        self._images[tag] = size
+        self._bytes += size
+
+    def _evict(self):
+        """淘汰最久未使用的镜像直到总大小不超过预算，最近登记的镜像总是保留"""
+        while True:
+            with self._lock:
+                if self._bytes <= self.config.max_bytes or len(self._images) <= 1:
+                    return
+                tag, size = self._images.popitem(last=False)
+                self._bytes -= size
+            if self.on_evict is not None:
+                self.on_evict(tag)
+            try:
+                self.docker_client.images.remove(tag)
+            except docker.errors.APIError as e:
+                print(f"Warning: could not remove sandbox image {tag}: {e}")
+
+    def prebuild(self, language: str, base_image: str):
+        """构建配置中的常用依赖组合，单个组合失败不影响其余组合"""
+        for packages in self.config.prebuild_stacks():
+            try:
+                self.ensure(language, base_image, packages)
+            except Exception as e:
+                print(f"Warning: could not prebuild sandbox image with {', '.join(sorted(packages))}: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"images": len(self._images), "bytes": self._bytes}
+
+    def close(self):
+        """取消排队中的后台构建，正在进行的构建不等待"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def collect(self) -> List[Family]:
+        """已构建的依赖镜像数和磁盘占用，供 /metrics 抓取时读取"""
+        stats = self.stats()
+        return [
+            ("sandbox_images", "gauge", "Dependency images kept for the sandbox", [({}, stats["images"])]),
+            ("sandbox_image_bytes", "gauge", "Disk used by dependency image layers", [({}, stats["bytes"])])
+        ]
@@ -0,0 +1,36 @@
+class OutputBuffer:
+    """有界输出缓冲区：保留开头 head_bytes 字节和末尾 tail_bytes 字节，中间部分丢弃"""
+
+    def __init__(self, head_bytes: int, tail_bytes: int):
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.total = 0
+        self._head = bytearray()
+        self._tail = bytearray()
+
+    def write(self, data: bytes):
+        self.total += len(data)
+        room = self.head_bytes - len(self._head)
+        if room > 0:
+            self._head += data[:room]
+            data = data[room:]
+        if data and self.tail_bytes > 0:
+            # 尾部环形缓冲，只保留最新的 tail_bytes 字节
+            self._tail += data[-self.tail_bytes:]
+            excess = len(self._tail) - self.tail_bytes
+            if excess > 0:
+                del self._tail[:excess]
+
+    @property
+    def truncated(self) -> bool:
+        return self.total > len(self._head) + len(self._tail)
+
+    def getvalue(self) -> str:
+        head = self._head.decode(errors="replace")
+        if not self._tail:
+            return head
+        tail = self._tail.decode(errors="replace")
+        if not self.truncated:
+            return head + tail
+        dropped = self.total - len(self._head) - len(self._tail)
+        return f"{head}\n... [{dropped} bytes truncated] ...\n{tail}"
@@ -0,0 +1,531 @@
+import asyncio
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import docker
+
+from ..utils.env import apply_env_overrides
+from ..utils.metrics import REGISTRY, Family
+from .images import ImageBuilder
+from .output import OutputBuffer
+from .scheduler import Allocation
+
+POOL_LABEL = "creation.sandbox.pool"
+
+# 各语言在容器内的执行命令，代码作为最后一个参数传入
+LANGUAGE_COMMANDS: Dict[str, List[str]] = {
+    "python": ["python", "-c"],
+}
+
+# 在独立工作目录中执行代码，结束后清空 /tmp，避免状态泄漏给下一次执行
+_RUN_SCRIPT = (
+    'mkdir -p /tmp/run && cd /tmp/run && timeout -k 1 "$SANDBOX_TIMEOUT" "$@"; '
+    'rc=$?; cd / && find /tmp -mindepth 1 -delete 2>/dev/null; exit $rc'
+)
+
+# coreutils timeout 超时返回 124，被 SIGKILL 结束（超时或内存超限）返回 137；
+# 用户程序也可能以这两个值退出，是否超时或被终止由 ExecResult 的字段单独判断
+EXIT_TIMEOUT = 124
+EXIT_KILLED = 137
+
+CONTAINER_START_SECONDS = REGISTRY.histogram(
+    "sandbox_container_start_seconds",
+    "Time to start a pooled sandbox container",
+    ("image",)
+)
+CHECKOUT_WAIT_SECONDS = REGISTRY.histogram(
+    "sandbox_checkout_wait_seconds",
+    "Time spent waiting for a pooled container, including cold starts",
+    ("image",)
+)
+EXEC_SECONDS = REGISTRY.histogram(
+    "sandbox_exec_seconds",
+    "Wall time of code execution inside a container",
+    ("image", "outcome")
+)
+CONTAINERS_RECYCLED = REGISTRY.counter(
+    "sandbox_containers_recycled_total",
+    "Containers destroyed after use",
+    ("image", "reason")
+)
+
+
+def exec_outcome(result: "ExecResult") -> str:
+    if result.timed_out:
+        return "timeout"
+    if result.killed:
+        return "killed"
+    return "success" if result.exit_code == 0 else "error"
+
+
+@dataclass
+class SandboxLimits:
+    """沙箱容器资源限制"""
+    mem_limit: str = "100m"
+    cpu_period: int = 100000
+    cpu_quota: int = 50000
+    pids_limit: int = 64
+    tmpfs_size: str = "64m"
+    user: str = "nobody"
+    # 每个输出流保留的开头和末尾字节数，以及流式转发给客户端的字节上限
+    output_head_bytes: int = 64 * 1024
+    output_tail_bytes: int = 16 * 1024
+    stream_max_bytes: int = 1024 * 1024
+
+    @classmethod
+    def from_env(cls, prefix: str = "SANDBOX_") -> "SandboxLimits":
+        return apply_env_overrides(cls(), prefix)
+
+    def sizing(self, allocation: Optional[Allocation]) -> Dict[str, Any]:
+        """容器的 CPU 和内存限制；没有分配结果时使用这里配置的默认限制"""
+        if allocation is None:
+            return {"cpu_quota": self.cpu_quota, "mem_limit": self.mem_limit}
+        return {
+            "cpu_quota": max(1000, int(allocation.cpus * self.cpu_period)),
+            "mem_limit": f"{allocation.memory_mb}m"
+        }
+
+
+@dataclass
+class ContainerPoolConfig:
+    """预热容器池配置"""
+    min_size: int = 1
+    max_size: int = 4
+    max_uses: int = 50
+    checkout_timeout: float = 10.0
+    health_check_interval: float = 30.0
+
+    @classmethod
+    def from_env(cls, prefix: str = "SANDBOX_POOL_") -> "ContainerPoolConfig":
+        return apply_env_overrides(cls(), prefix)
+
+
+@dataclass
+class ExecResult:
+    """一次沙箱执行的结果"""
+    exit_code: int
+    stdout: str
+    stderr: str
+    duration: float
+    truncated: bool = False
+    # 沙箱自身的判断：执行超时，或因超出资源限制（内存）被终止
+    timed_out: bool = False
+    killed: bool = False
+
+
+@dataclass
+class PooledContainer:
+    container: Any
+    created_at: float = field(default_factory=time.monotonic)
+    uses: int = 0
+    # 当前生效的 CPU 和内存限制，None 表示创建时的默认限制
+    sizing: Optional[Dict[str, Any]] = None
+
+
+class ContainerPool:
+    """单个镜像的预热容器池：容器预先启动并保持空闲，执行时通过 exec 运行代码"""
+
+    def __init__(self, docker_client, image: str, config: ContainerPoolConfig, limits: SandboxLimits):
+        self.docker_client = docker_client
+        self.image = image
+        self.config = config
+        self.limits = limits
+        self._idle: List[PooledContainer] = []
+        self._total = 0
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def _create(self) -> PooledContainer:
+        start = time.monotonic()
+        container = self.docker_client.containers.run(
+            self.image,
+            command=["sleep", "infinity"],
+            detach=True,
+            network_disabled=True,
+            read_only=True,
+            tmpfs={"/tmp": f"size={self.limits.tmpfs_size},mode=1777"},
+            mem_limit=self.limits.mem_limit,
+            # 不允许使用 swap，内存超限即被终止
+            memswap_limit=self.limits.mem_limit,
+            cpu_period=self.limits.cpu_period,
+            cpu_quota=self.limits.cpu_quota,
+            pids_limit=self.limits.pids_limit,
+            labels={POOL_LABEL: self.image}
+        )
+        CONTAINER_START_SECONDS.labels(self.image).observe(time.monotonic() - start)
+        return PooledContainer(container)
+
+    def _destroy(self, pooled: PooledContainer):
+        try:
+            pooled.container.remove(force=True)
+        except docker.errors.APIError:
+            pass
+
+    def _recycle(self, pooled: PooledContainer):
+        """销毁容器并补足到最小容量，在后台线程中执行"""
+        self._destroy(pooled)
+        try:
+            self.fill()
+        except Exception as e:
+            print(f"Warning: could not refill sandbox pool for {self.image}: {e}")
+
+    def _unreserve(self):
+        with self._cond:
+            self._total -= 1
+            self._cond.notify()
+
+    def fill(self):
+        """启动容器直到空闲+使用中的数量达到 min_size"""
+        while True:
+            with self._cond:
+                if self._closed or self._total >= self.config.min_size:
+                    return
+                self._total += 1
+            try:
+                pooled = self._create()
+            except Exception:
+                self._unreserve()
+                raise
+            with self._cond:
+                self._idle.append(pooled)
+                self._cond.notify()
+
+    def checkout(self) -> PooledContainer:
+        """取出一个空闲容器；没有空闲且未达上限时新建，否则等待"""
+        deadline = time.monotonic() + self.config.checkout_timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError(f"{self.image} 容器池已关闭")
+                if self._idle:
+                    return self._idle.pop()
+                if self._total < self.config.max_size:
+                    self._total += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"等待 {self.image} 沙箱容器超时")
+                self._cond.wait(remaining)
+        try:
+            return self._create()
+        except Exception:
+            self._unreserve()
+            raise
+
+    def release(self, pooled: PooledContainer, dirty: bool = False):
+        """归还容器；状态不干净或达到使用次数上限时回收"""
+        pooled.uses += 1
+        recycle = dirty or pooled.uses >= self.config.max_uses
+        with self._cond:
+            if not recycle and not self._closed:
+                self._idle.append(pooled)
+                self._cond.notify()
+                return
+            self._total -= 1
+            self._cond.notify()
+        CONTAINERS_RECYCLED.labels(self.image, "dirty" if dirty else "max_uses").inc()
+        threading.Thread(target=self._recycle, args=(pooled,), daemon=True).start()
+
+    def _has_leftover_processes(self, pooled: PooledContainer) -> bool:
+        # 除了保活的 sleep 进程外不应再有其他进程
+        try:
+            return len(pooled.container.top().get("Processes") or []) > 1
+        except docker.errors.APIError:
+            return True
+
+    def _oom_killed(self, pooled: PooledContainer) -> bool:
+        """容器中是否有进程因内存超限被终止；Docker 在容器的 cgroup 发生 OOM 时置位且不会清除，
+        发生过 OOM 的容器不再复用，因此该状态只对应本次执行"""
+        try:
+            pooled.container.reload()
+            return bool(pooled.container.attrs.get("State", {}).get("OOMKilled"))
+        except docker.errors.APIError:
+            return False
+
+    def _resize(self, pooled: PooledContainer, allocation: Optional[Allocation]):
+        """按本次分配的资源调整容器限制，与当前限制相同时不调用 Docker"""
+        sizing = self.limits.sizing(allocation)
+        if sizing == (pooled.sizing or self.limits.sizing(None)):
+            return
+        # 与创建时一样不允许使用 swap
+        pooled.container.update(
+            cpu_period=self.limits.cpu_period,
+            cpu_quota=sizing["cpu_quota"],
+            mem_limit=sizing["mem_limit"],
+            memswap_limit=sizing["mem_limit"]
+        )
+        pooled.sizing = sizing
+
+    def run(
+        self,
+        command: List[str],
+        code: str,
+        timeout: int,
+        on_output: Optional[Callable[[str, bytes], None]] = None,
+        allocation: Optional[Allocation] = None
+    ) -> ExecResult:
+        """在池中容器内执行代码，on_output 会在每段 stdout/stderr 输出产生时被调用；
+        allocation 为调度器分配的资源，决定本次执行的容器限制"""
+        wait_start = time.monotonic()
+        pooled = self.checkout()
+        CHECKOUT_WAIT_SECONDS.labels(self.image).observe(time.monotonic() - wait_start)
+        dirty = True
+        try:
+            self._resize(pooled, allocation)
+            api = self.docker_client.api
+            start = time.monotonic()
+            exec_id = api.exec_create(
+                pooled.container.id,
+                ["sh", "-c", _RUN_SCRIPT, "sandbox", *command, code],
+                user=self.limits.user,
+                environment={
+                    "SANDBOX_TIMEOUT": str(timeout),
+                    "HOME": "/tmp/run",
+                    "PYTHONDONTWRITEBYTECODE": "1"
+                }
+            )["Id"]
+            stdout = OutputBuffer(self.limits.output_head_bytes, self.limits.output_tail_bytes)
+            stderr = OutputBuffer(self.limits.output_head_bytes, self.limits.output_tail_bytes)
+            for out, err in api.exec_start(exec_id, stream=True, demux=True):
+                if out:
+                    stdout.write(out)
+                    if on_output is not None:
+                        on_output("stdout", out)
+                if err:
+                    stderr.write(err)
+                    if on_output is not None:
+                        on_output("stderr", err)
+            exit_code = api.exec_inspect(exec_id)["ExitCode"]
+            duration = time.monotonic() - start
+            # 超时以实际耗时为准，程序自己返回 124 或 137 不算超时
+            timed_out = exit_code in (EXIT_TIMEOUT, EXIT_KILLED) and duration >= timeout
+            result = ExecResult(
+                exit_code=exit_code,
+                stdout=stdout.getvalue(),
+                stderr=stderr.getvalue(),
+                duration=duration,
+                truncated=stdout.truncated or stderr.truncated,
+                timed_out=timed_out,
+                killed=exit_code != 0 and not timed_out and self._oom_killed(pooled)
+            )
+            EXEC_SECONDS.labels(self.image, exec_outcome(result)).observe(result.duration)
+            dirty = result.timed_out or result.killed or self._has_leftover_processes(pooled)
+            return result
+        finally:
+            self.release(pooled, dirty=dirty)
+
+    def health_check(self):
+        """检查空闲容器是否仍在运行，移除异常容器并补足最小容量"""
+        with self._cond:
+            idle = list(self._idle)
+        for pooled in idle:
+            try:
+                pooled.container.reload()
+                healthy = pooled.container.status == "running"
+            except docker.errors.APIError:
+                healthy = False
+            if healthy:
+                continue
+            with self._cond:
+                if pooled not in self._idle:
+                    continue
+                self._idle.remove(pooled)
+                self._total -= 1
+                self._cond.notify()
+            self._destroy(pooled)
+        self.fill()
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {
+                "idle": len(self._idle),
+                "in_use": self._total - len(self._idle),
+                "total": self._total
+            }
+
+    def close(self):
+        """关闭容器池并删除空闲容器，使用中的容器归还时删除"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._total -= len(idle)
+            self._cond.notify_all()
+        for pooled in idle:
+            self._destroy(pooled)
+
+
+class SandboxPoolManager:
+    """按语言管理预热容器池。
+
+    配置 images 后，依赖第三方包的代码在预装了这些包的镜像中执行，每个依赖镜像有自己的容器池，
+    镜像被淘汰时关闭对应的容器池。
+    """
+
+    name = "docker"
+
+    def __init__(
+        self,
+        docker_client,
+        config: Optional[ContainerPoolConfig] = None,
+        limits: Optional[SandboxLimits] = None,
+        commands: Optional[Dict[str, List[str]]] = None,
+        images: Optional[ImageBuilder] = None
+    ):
+        self.docker_client = docker_client
+        self.config = config or ContainerPoolConfig()
+        self.limits = limits or SandboxLimits()
+        self.commands = commands or LANGUAGE_COMMANDS
+        self.pools: Dict[str, ContainerPool] = {}
+        # 依赖镜像标签 -> (语言, 容器池)；这些池不预热，空闲容器在首次使用后保留
+        self.image_pools: Dict[str, Tuple[str, ContainerPool]] = {}
+        self._lock = threading.Lock()
+        # 镜像标签 -> 镜像 id，用于执行结果缓存键；健康检查时清空，以便感知镜像被重新拉取
+        self._image_ids: Dict[str, str] = {}
+        self.images = images
+        if images is not None:
+            images.on_evict = self._close_image_pool
+
+    def supports(self, language: str) -> bool:
+        return language in self.commands
+
+    def pool_for(self, language: str) -> ContainerPool:
+        if not self.supports(language):
+            raise ValueError(f"不支持的语言: {language}")
+        with self._lock:
+            pool = self.pools.get(language)
+            if pool is None:
+                pool = ContainerPool(self.docker_client, self.base_image(language), self.config, self.limits)
+                self.pools[language] = pool
+            return pool
+
+    @staticmethod
+    def base_image(language: str) -> str:
+        return f"{language}:latest"
+
+    def _image_pool(self, language: str, image: str) -> ContainerPool:
+        with self._lock:
+            entry = self.image_pools.get(image)
+            if entry is None:
+                entry = (language, ContainerPool(self.docker_client, image, replace(self.config, min_size=0), self.limits))
+                self.image_pools[image] = entry
+            return entry[1]
+
+    def _close_image_pool(self, image: str):
+        with self._lock:
+            self._image_ids.pop(image, None)
+            entry = self.image_pools.pop(image, None)
+        if entry is not None:
+            entry[1].close()
+
+    async def prepare(self, language: str, code: str):
+        """在执行准入之前构建 code 所需的依赖镜像，最多等待 build_wait 秒；
+        超时或构建失败时返回，run 在基础镜像中执行，构建在后台继续"""
+        if self.images is None or not self.supports(language):
+            return
+        future = self.images.schedule(language, self.pool_for(language).image, code)
+        if future is None:
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), self.images.config.build_wait)
+        except Exception:
+            # 构建失败已由构建线程记录
+            pass
+
+    def pool_for_code(self, language: str, code: str) -> ContainerPool:
+        """code 所需依赖对应的容器池，没有第三方依赖或依赖镜像尚未构建完成时为该语言的基础池"""
+        pool = self.pool_for(language)
+        if self.images is None:
+            return pool
+        image = self.images.image_for(language, pool.image, code)
+        if image == pool.image:
+            return pool
+        return self._image_pool(language, image)
+
+    def image_id(self, language: str, code: str) -> Optional[str]:
+        """code 将在其中运行的镜像的 id，不触发依赖镜像构建；镜像尚不存在时返回 None"""
+        image = self.pool_for(language).image
+        if self.images is not None:
+            image = self.images.lookup(language, image, code)
+            if image is None:
+                return None
+        with self._lock:
+            image_id = self._image_ids.get(image)
+        if image_id is None:
+            try:
+                image_id = self.docker_client.images.get(image).id
+            except docker.errors.APIError:
+                return None
+            with self._lock:
+                self._image_ids[image] = image_id
+        return image_id
+
+    def remove_orphans(self):
+        """删除上一次进程遗留的池容器"""
+        for container in self.docker_client.containers.list(all=True, filters={"label": POOL_LABEL}):
+            try:
+                container.remove(force=True)
+            except docker.errors.APIError:
+                pass
+
+    def warm_up(self, languages: Iterable[str]):
+        """为指定语言预先启动容器"""
+        self.remove_orphans()
+        for language in languages:
+            self.pool_for(language).fill()
+
+    def prebuild_images(self, languages: Iterable[str]):
+        """登记已有的依赖镜像并构建配置中的常用依赖组合，可能耗时较长，宜在后台执行"""
+        if self.images is None:
+            return
+        self.images.load_existing()
+        for language in languages:
+            self.images.prebuild(language, self.pool_for(language).image)
+
+    def run(
+        self,
+        language: str,
+        code: str,
+        timeout: int,
+        on_output: Optional[Callable[[str, bytes], None]] = None,
+        allocation: Optional[Allocation] = None
+    ) -> ExecResult:
+        return self.pool_for_code(language, code).run(self.commands[language], code, timeout, on_output, allocation)
+
+    def _all_pools(self) -> List[ContainerPool]:
+        with self._lock:
+            return [*self.pools.values(), *(pool for _, pool in self.image_pools.values())]
+
+    def health_check(self):
+        with self._lock:
+            self._image_ids.clear()
+        for pool in self._all_pools():
+            pool.health_check()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {language: pool.stats() for language, pool in list(self.pools.items())}
+
+    def collect(self) -> List[Family]:
+        """各语言容器池的占用情况，供 /metrics 抓取时读取"""
+        with self._lock:
+            pools = [
+                *((language, pool) for language, pool in self.pools.items()),
+                *self.image_pools.values()
+            ]
+        samples = []
+        for language, pool in pools:
+            stats = pool.stats()
+            labels = {"language": language, "image": pool.image}
+            samples.append(({**labels, "state": "idle"}, stats["idle"]))
+            samples.append(({**labels, "state": "in_use"}, stats["in_use"]))
+        families = [("sandbox_pool_containers", "gauge", "Pooled sandbox containers by state", samples)]
+        if self.images is not None:
+            families.extend(self.images.collect())
+        return families
+
+    def close(self):
+        if self.images is not None:
+            self.images.close()
+        for pool in self._all_pools():
+            pool.close()
@@ -0,0 +1,300 @@
+import json
+import os
+import selectors
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from ..utils.env import apply_env_overrides
+from ..utils.metrics import Family
+from .output import OutputBuffer
+from .pool import EXEC_SECONDS, EXIT_KILLED, EXIT_TIMEOUT, ExecResult, SandboxLimits, exec_outcome
+from .scheduler import Allocation
+from .zygote import HEADER
+
+ZYGOTE_PATH = Path(__file__).with_name("zygote.py")
+
+
+@dataclass
+class ProcessSandboxConfig:
+    """进程沙箱配置"""
+    # 进程沙箱只适合可信代码，需要显式开启
+    enabled: bool = False
+    # 为 False 时不创建隔离命名空间（代码可以访问网络），仅用于不支持 user namespace 的开发环境
+    namespaces: bool = True
+    # 没有调度器分配结果时的地址空间上限
+    memory_mb: int = 256
+    max_file_bytes: int = 16 * 1024 * 1024
+    # RLIMIT_NPROC 按用户计数，包含 API 进程自身的线程
+    max_processes: int = 256
+    max_open_files: int = 64
+    # 私有临时目录的父目录，为空时使用系统临时目录
+    tmp_root: str = ""
+    startup_timeout: float = 5.0
+
+    @classmethod
+    def from_env(cls, prefix: str = "SANDBOX_PROCESS_") -> "ProcessSandboxConfig":
+        return apply_env_overrides(cls(), prefix)
+
+
+class _Run:
+    __slots__ = ("pid", "status", "started", "finished")
+
+    def __init__(self):
+        self.pid: Optional[int] = None
+        self.status: Optional[int] = None
+        self.started = threading.Event()
+        self.finished = threading.Event()
+
+
+class ProcessSandbox:
+    """在子进程中执行可信 Python 代码的轻量沙箱后端，启动开销为毫秒级。
+
+    子进程由常驻的 fork 服务器（zygote.py）派生：fork 服务器运行在独立的 user、network 和
+    IPC 命名空间中，子进程继承这些命名空间（无网络），在临时工作目录中以 rlimit 限制
+    CPU 时间、地址空间、文件大小、进程数和打开文件数。
+
+    这不是安全边界：没有 mount 和 PID 命名空间，也没有 chroot，代码可以读写 API 进程用户能访问的
+    所有文件、看到宿主机上的进程，用 setsid 脱离进程组的子进程在执行结束后仍会存活；CPU 份额也无法
+    用 rlimit 限制。因此只能用于可信代码，模型生成或用户提交的代码应使用 Docker 后端。
+    """
+
+    name = "process"
+    languages = ("python",)
+
+    def __init__(self, config: Optional[ProcessSandboxConfig] = None, limits: Optional[SandboxLimits] = None):
+        self.config = config or ProcessSandboxConfig()
+        self.limits = limits or SandboxLimits()
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._process: Optional[subprocess.Popen] = None
+        self._sock: Optional[socket.socket] = None
+        self._runs: Dict[str, _Run] = {}
+        self.running = 0
+
+    def supports(self, language: str) -> bool:
+        return language in self.languages
+
+    async def prepare(self, language: str, code: str):
+        pass
+
+    def start(self):
+        """启动 fork 服务器；已在运行时不做任何事"""
+        with self._lock:
+            if self._process is not None and self._process.poll() is None:
+                return
+            parent, child = socket.socketpair()
+            process = subprocess.Popen(
+                [sys.executable, "-I", "-S", str(ZYGOTE_PATH), str(child.fileno()), "1" if self.config.namespaces else "0"],
+                pass_fds=[child.fileno()],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL
+            )
+            child.close()
+            reader = parent.makefile("rb")
+            parent.settimeout(self.config.startup_timeout)
+            try:
+                line = reader.readline()
+            except OSError:
+                line = b""
+            message = json.loads(line) if line else {"error": "进程沙箱启动超时"}
+            if not message.get("ready"):
+                process.kill()
+                parent.close()
+                raise RuntimeError(message.get("error", "进程沙箱启动失败"))
+            parent.settimeout(None)
+            self._process, self._sock = process, parent
+            threading.Thread(target=self._read_events, args=(process, reader), daemon=True).start()
+
+    def _read_events(self, process: subprocess.Popen, reader):
+        """把 fork 服务器的响应分发给对应的执行"""
+        for line in reader:
+            message = json.loads(line)
+            with self._lock:
+                run = self._runs.get(message["id"])
+            if run is None:
+                continue
+            if "pid" in message:
+                run.pid = message["pid"]
+                run.started.set()
+            else:
+                run.status = message["status"]
+                run.finished.set()
+        # fork 服务器已退出：唤醒所有等待者，下一次执行时重新启动
+        with self._lock:
+            runs = list(self._runs.values())
+            if self._process is process:
+                self._process = None
+        for run in runs:
+            run.started.set()
+            run.finished.set()
+
+    def _request(self, run_id: str, request: Dict[str, Any], fds: List[int]):
+        body = json.dumps({"id": run_id, **request}).encode()
+        with self._send_lock:
+            socket.send_fds(self._sock, [HEADER.pack(len(body))], fds)
+            self._sock.sendall(body)
+
+    def _rlimits(self, timeout: int, allocation: Optional[Allocation]) -> Dict[str, int]:
+        memory_mb = allocation.memory_mb if allocation is not None else self.config.memory_mb
+        return {
+            "cpu_seconds": timeout + 1,
+            "address_space_bytes": memory_mb * 1024 * 1024,
+            "file_size_bytes": self.config.max_file_bytes,
+            "processes": self.config.max_processes,
+            "open_files": self.config.max_open_files
+        }
+
+    def run(
+        self,
+        language: str,
+        code: str,
+        timeout: int,
+        on_output: Optional[Callable[[str, bytes], None]] = None,
+        allocation: Optional[Allocation] = None
+    ) -> ExecResult:
+        if not self.supports(language):
+            raise ValueError(f"进程沙箱不支持语言: {language}")
+        self.start()
+        start = time.monotonic()
+        run_id = uuid.uuid4().hex
+        run = _Run()
+        workdir = tempfile.mkdtemp(prefix="sandbox-", dir=self.config.tmp_root or None)
+        stdout_r, stdout_w = os.pipe()
+        stderr_r, stderr_w = os.pipe()
+        with self._lock:
+            self._runs[run_id] = run
+            self.running += 1
+        try:
+            try:
+                self._request(run_id, {
+                    "cwd": workdir,
+                    "code": code,
+                    "limits": self._rlimits(timeout, allocation)
+                }, [stdout_w, stderr_w])
+            finally:
+                os.close(stdout_w)
+                os.close(stderr_w)
+            if not run.started.wait(self.config.startup_timeout) or run.pid is None:
+                raise RuntimeError("进程沙箱未能启动代码")
+
+            stdout = OutputBuffer(self.limits.output_head_bytes, self.limits.output_tail_bytes)
+            stderr = OutputBuffer(self.limits.output_head_bytes, self.limits.output_tail_bytes)
+            timed_out = self._collect_output(run, start + timeout, {stdout_r: ("stdout", stdout), stderr_r: ("stderr", stderr)}, on_output)
+            if not run.finished.wait(1.0):
+                self._kill(run)
+                run.finished.wait(1.0)
+            # 终止进程组中残留的后台进程；调用 setsid 脱离进程组的进程无法追踪
+            self._kill(run)
+            # 超出 CPU 时间（SIGXCPU）也算超时；fork 服务器退出导致没有退出状态时视为被终止
+            timed_out = timed_out or run.status == -signal.SIGXCPU
+            result = ExecResult(
+                exit_code=self._exit_code(run.status, timed_out),
+                stdout=stdout.getvalue(),
+                stderr=stderr.getvalue(),
+                duration=time.monotonic() - start,
+                truncated=stdout.truncated or stderr.truncated,
+                timed_out=timed_out,
+                killed=not timed_out and run.status is None
+            )
+            EXEC_SECONDS.labels(self.name, exec_outcome(result)).observe(result.duration)
+            return result
+        finally:
+            os.close(stdout_r)
+            os.close(stderr_r)
+            with self._lock:
+                self._runs.pop(run_id, None)
+                self.running -= 1
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def _collect_output(
+        self,
+        run: _Run,
+        deadline: float,
+        streams: Dict[int, Any],
+        on_output: Optional[Callable[[str, bytes], None]]
+    ) -> bool:
+        """读取输出直到两个管道都关闭；超过 deadline 时终止进程组，返回是否超时"""
+        timed_out = False
+        selector = selectors.DefaultSelector()
+        for fd in streams:
+            selector.register(fd, selectors.EVENT_READ)
+        try:
+            open_streams = len(streams)
+            while open_streams:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    if timed_out:
+                        # 终止后仍有进程（例如脱离了进程组）持有管道，不再等待
+                        break
+                    timed_out = True
+                    self._kill(run)
+                    deadline = time.monotonic() + 1.0
+                    continue
+                for key, _ in selector.select(remaining):
+                    data = os.read(key.fd, 65536)
+                    if not data:
+                        selector.unregister(key.fd)
+                        open_streams -= 1
+                        continue
+                    stream, buffer = streams[key.fd]
+                    buffer.write(data)
+                    if on_output is not None:
+                        on_output(stream, data)
+        finally:
+            selector.close()
+        return timed_out
+
+    @staticmethod
+    def _kill(run: _Run):
+        try:
+            os.killpg(run.pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _exit_code(status: Optional[int], timed_out: bool) -> int:
+        """与 Docker 后端保持一致：超时（包括 CPU 时间超限）为 124，被 SIGKILL 终止为 137"""
+        if timed_out:
+            return EXIT_TIMEOUT
+        if status is None:
+            return EXIT_KILLED
+        if status < 0:
+            return 128 - status
+        return status
+
+    def image_id(self, language: str, code: str) -> Optional[str]:
+        """执行环境的标识，用于执行结果缓存键"""
+        return f"process:{sys.executable}:{sys.version}"
+
+    def health_check(self):
+        try:
+            self.start()
+        except Exception as e:
+            print(f"Warning: process sandbox is unavailable: {e}")
+
+    def collect(self) -> List[Family]:
+        return [("sandbox_process_running", "gauge", "Code running in the process sandbox", [({}, self.running)])]
+
+    def close(self):
+        with self._lock:
+            process, sock = self._process, self._sock
+            self._process = self._sock = None
+        if sock is not None:
+            # fork 服务器读到 EOF 后会终止仍在运行的代码并退出
+            sock.close()
+        if process is not None:
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
@@ -0,0 +1,227 @@
+import asyncio
+import os
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Mapping, Optional
+
+from ..utils.env import apply_env_overrides
+
+_QUANTITY = re.compile(r"^\s*([0-9]*\.?[0-9]+)\s*([a-zA-Z]*)")
+
+# 内存单位 -> MB，不带单位的数字按 MB 计
+_MEMORY_UNITS = {
+    "": 1, "b": 1 / (1024 * 1024),
+    "k": 1 / 1024, "kb": 1 / 1024, "ki": 1 / 1024, "kib": 1 / 1024,
+    "m": 1, "mb": 1, "mi": 1, "mib": 1,
+    "g": 1024, "gb": 1024, "gi": 1024, "gib": 1024,
+}
+
+
+@dataclass
+class ResourceRequest:
+    """一次执行申请的资源，字段为 None 时使用默认值"""
+    cpus: Optional[float] = None
+    memory_mb: Optional[int] = None
+
+
+@dataclass(frozen=True)
+class Allocation:
+    """调度器实际分配给一次执行的资源"""
+    cpus: float
+    memory_mb: int
+
+
+def parse_memory_mb(value: Any) -> Optional[int]:
+    """解析 "1GB"、"800MB"、"512m" 等内存描述，纯数字按 MB 计"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return int(value)
+    match = _QUANTITY.match(str(value))
+    if not match:
+        return None
+    unit = match.group(2).lower()
+    if unit not in _MEMORY_UNITS:
+        return None
+    return max(1, int(float(match.group(1)) * _MEMORY_UNITS[unit]))
+
+
+def parse_cpus(value: Any) -> Optional[float]:
+    """解析 "1 core"、"0.8 core"、"2 cores"、"500m"（毫核）等 CPU 描述"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    match = _QUANTITY.match(str(value))
+    if not match:
+        return None
+    number, unit = float(match.group(1)), match.group(2).lower()
+    if unit == "m":
+        return number / 1000
+    if unit in ("", "core", "cores", "cpu", "cpus", "vcpu", "vcpus"):
+        return number
+    return None
+
+
+def parse_resources(required: Optional[Mapping[str, Any]]) -> ResourceRequest:
+    """把执行前分析给出的 required_resources（memory、cpu）转换为资源申请，无法解析的字段使用默认值"""
+    if not required:
+        return ResourceRequest()
+    return ResourceRequest(
+        cpus=parse_cpus(required["cpu"]) if "cpu" in required else None,
+        memory_mb=parse_memory_mb(required["memory"]) if "memory" in required else None
+    )
+
+
+def _host_memory_mb() -> int:
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return 4096
+
+
+@dataclass
+class ResourceConfig:
+    """主机资源预算和单次执行的资源策略"""
+    # 可供沙箱使用的 CPU 核数和内存，0 表示按主机总量扣除 reserved_fraction 后自动计算
+    cpus: float = 0.0
+    memory_mb: int = 0
+    reserved_fraction: float = 0.2
+    # 未给出资源估计时的默认值，与原先固定的容器限制一致
+    default_cpus: float = 0.5
+    default_memory_mb: int = 100
+    # 单次执行的资源上下限，估计值会被截断到该范围内
+    min_cpus: float = 0.1
+    max_cpus: float = 2.0
+    min_memory_mb: int = 32
+    max_memory_mb: int = 1024
+    # 排在队首的申请最多被后来的小申请插队的次数，超过后暂停插队直到它被满足
+    starvation_limit: int = 8
+
+    @classmethod
+    def from_env(cls, prefix: str = "SANDBOX_HOST_") -> "ResourceConfig":
+        return apply_env_overrides(cls(), prefix).resolve_host()
+
+    def resolve_host(self) -> "ResourceConfig":
+        """把为 0 的 cpus、memory_mb 替换为主机总量扣除 reserved_fraction 后的值"""
+        usable = 1 - self.reserved_fraction
+        if self.cpus <= 0:
+            self.cpus = round((os.cpu_count() or 1) * usable, 2)
+        if self.memory_mb <= 0:
+            self.memory_mb = int(_host_memory_mb() * usable)
+        return self
+
+
+class _Waiter:
+    __slots__ = ("allocation", "future", "queued_at", "bypassed")
+
+    def __init__(self, allocation: Allocation, future: asyncio.Future):
+        self.allocation = allocation
+        self.future = future
+        self.queued_at = time.monotonic()
+        self.bypassed = 0
+
+
+class ResourceScheduler:
+    """按 CPU、内存和执行槽位三个维度装箱的准入调度器。
+
+    申请按到达顺序排队，每次有资源释放时从队首开始依次放行放得下的申请（first fit），
+    放不下的大申请不会阻塞后面的小申请；为避免大申请饿死，队首申请被插队
+    starvation_limit 次后，后面的申请要等它先被满足。所有方法都应在事件循环线程中调用。
+    """
+
+    def __init__(self, config: ResourceConfig, slots: int):
+        self.config = config.resolve_host()
+        self.slots = slots
+        self.allocated_cpus = 0.0
+        self.allocated_memory_mb = 0
+        self.running = 0
+        self._waiters: List[_Waiter] = []
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def size(self, request: Optional[ResourceRequest] = None) -> Allocation:
+        """按策略上下限和主机容量截断申请"""
+        request = request or ResourceRequest()
+        config = self.config
+        cpus = request.cpus if request.cpus is not None else config.default_cpus
+        memory_mb = request.memory_mb if request.memory_mb is not None else config.default_memory_mb
+        cpus = min(max(cpus, config.min_cpus), config.max_cpus, config.cpus)
+        memory_mb = min(max(memory_mb, config.min_memory_mb), config.max_memory_mb, config.memory_mb)
+        return Allocation(round(cpus, 3), int(memory_mb))
+
+    def fits(self, allocation: Allocation) -> bool:
+        return (
+            self.running < self.slots
+            and self.allocated_cpus + allocation.cpus <= self.config.cpus + 1e-9
+            and self.allocated_memory_mb + allocation.memory_mb <= self.config.memory_mb
+        )
+
+    def _grant(self, allocation: Allocation):
+        self.running += 1
+        self.allocated_cpus += allocation.cpus
+        self.allocated_memory_mb += allocation.memory_mb
+
+    def release(self, allocation: Allocation):
+        self.running -= 1
+        self.allocated_cpus = max(0.0, self.allocated_cpus - allocation.cpus)
+        self.allocated_memory_mb = max(0, self.allocated_memory_mb - allocation.memory_mb)
+        self._dispatch()
+
+    def _dispatch(self):
+        """从队首开始放行放得下的申请"""
+        blocked: List[_Waiter] = []
+        for waiter in list(self._waiters):
+            if waiter.future.done():
+                self._waiters.remove(waiter)
+                continue
+            if any(earlier.bypassed >= self.config.starvation_limit for earlier in blocked):
+                break
+            if not self.fits(waiter.allocation):
+                blocked.append(waiter)
+                continue
+            self._waiters.remove(waiter)
+            self._grant(waiter.allocation)
+            waiter.future.set_result(None)
+            for earlier in blocked:
+                earlier.bypassed += 1
+
+    async def acquire(self, allocation: Allocation, timeout: float):
+        """排队直到 allocation 被放行；超时抛出 asyncio.TimeoutError"""
+        waiter = _Waiter(allocation, asyncio.get_running_loop().create_future())
+        self._waiters.append(waiter)
+        self._dispatch()
+        if waiter.future.done():
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+        except BaseException:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # 超时或取消与放行同时发生，归还已经分到的资源
+                self.release(allocation)
+            else:
+                waiter.future.cancel()
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                self._dispatch()
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "capacity": {"cpus": self.config.cpus, "memory_mb": self.config.memory_mb, "slots": self.slots},
+            "allocated": {
+                "cpus": round(self.allocated_cpus, 3),
+                "memory_mb": self.allocated_memory_mb,
+                "slots": self.running
+            },
+            "queue": [
+                {
+                    "cpus": waiter.allocation.cpus,
+                    "memory_mb": waiter.allocation.memory_mb,
+                    "waited_seconds": round(now - waiter.queued_at, 3),
+                    "bypassed": waiter.bypassed
+                }
+                for waiter in self._waiters
+                if not waiter.future.done()
+            ]
+        }
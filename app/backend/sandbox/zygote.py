@@ -0,0 +1,164 @@
+"""进程沙箱的 fork 服务器，作为独立脚本运行，只依赖标准库。
+
+启动后先进入新的 user、network 和 IPC 命名空间（没有网络），然后等待 ProcessSandbox 的请求：
+每个请求 fork 一个子进程，在私有临时目录中设置 rlimit 后直接执行代码，省去每次启动解释器的开销。
+
+协议（Unix socket）：
+- 请求：4 字节长度前缀加 JSON，长度前缀随 SCM_RIGHTS 附带子进程的 stdout、stderr 管道写端
+- 响应：每行一个 JSON，{"id", "pid"} 表示已启动，{"id", "status"} 表示已退出（status 为负数表示被信号终止）
+"""
+import json
+import os
+import resource
+import selectors
+import signal
+import socket
+import struct
+import sys
+import traceback
+import types
+
+HEADER = struct.Struct("!I")
+
+RLIMITS = {
+    "cpu_seconds": resource.RLIMIT_CPU,
+    "address_space_bytes": resource.RLIMIT_AS,
+    "file_size_bytes": resource.RLIMIT_FSIZE,
+    "processes": resource.RLIMIT_NPROC,
+    "open_files": resource.RLIMIT_NOFILE,
+}
+
+
+def recv_exact(sock: socket.socket, size: int, initial: bytes = b"") -> bytes:
+    data = bytearray(initial)
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise EOFError
+        data += chunk
+    return bytes(data)
+
+
+def send_message(sock: socket.socket, message: dict):
+    sock.sendall(json.dumps(message).encode() + b"\n")
+
+
+def run_child(request: dict, fds: list):
+    """在 fork 出的子进程中执行代码，不会返回"""
+    status = 1
+    try:
+        os.setsid()
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(devnull, 0)
+        os.dup2(fds[0], 1)
+        os.dup2(fds[1], 2)
+        os.closerange(3, 65536)
+        for signum in (signal.SIGPIPE, signal.SIGINT, signal.SIGCHLD):
+            signal.signal(signum, signal.SIG_DFL)
+        signal.set_wakeup_fd(-1)
+
+        workdir = request["cwd"]
+        os.chdir(workdir)
+        os.environ.clear()
+        os.environ.update({
+            "HOME": workdir,
+            "TMPDIR": workdir,
+            "PATH": "/usr/local/bin:/usr/bin:/bin",
+            "LANG": "C.UTF-8",
+            "PYTHONDONTWRITEBYTECODE": "1",
+        })
+        resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+        for name, value in request["limits"].items():
+            resource.setrlimit(RLIMITS[name], (value, value))
+
+        # 以 __main__ 模块执行，与 python -c 的行为一致
+        main = types.ModuleType("__main__")
+        sys.modules["__main__"] = main
+        sys.argv = ["-c"]
+        exec(compile(request["code"], "<string>", "exec"), main.__dict__)
+        status = 0
+    except SystemExit as e:
+        if e.code is None:
+            status = 0
+        elif isinstance(e.code, int):
+            status = e.code
+        else:
+            print(e.code, file=sys.stderr)
+            status = 1
+    except BaseException:
+        traceback.print_exc()
+        status = 1
+    finally:
+        for stream in (sys.stdout, sys.stderr):
+            try:
+                stream.flush()
+            except BaseException:
+                pass
+        os._exit(status & 0xFF)
+
+
+def main():
+    sock = socket.socket(fileno=int(sys.argv[1]))
+    if sys.argv[2] == "1":
+        try:
+            os.unshare(os.CLONE_NEWUSER | os.CLONE_NEWNET | os.CLONE_NEWIPC)
+        except (AttributeError, OSError) as e:
+            send_message(sock, {"error": f"无法创建隔离命名空间: {e}"})
+            sys.exit(2)
+
+    wakeup_r, wakeup_w = os.pipe()
+    os.set_blocking(wakeup_r, False)
+    os.set_blocking(wakeup_w, False)
+    signal.set_wakeup_fd(wakeup_w)
+    signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+
+    selector = selectors.DefaultSelector()
+    selector.register(sock, selectors.EVENT_READ)
+    selector.register(wakeup_r, selectors.EVENT_READ)
+    running = {}
+    send_message(sock, {"ready": True})
+
+    while True:
+        for key, _ in selector.select():
+            if key.fileobj is sock:
+                try:
+                    header, fds, _, _ = socket.recv_fds(sock, HEADER.size, 2)
+                    if not header:
+                        raise EOFError
+                    (length,) = HEADER.unpack(recv_exact(sock, HEADER.size, header))
+                    request = json.loads(recv_exact(sock, length))
+                except EOFError:
+                    # API 进程已退出，结束所有仍在运行的代码
+                    for pid in running:
+                        try:
+                            os.killpg(pid, signal.SIGKILL)
+                        except OSError:
+                            pass
+                    return
+                pid = os.fork()
+                if pid == 0:
+                    run_child(request, fds)
+                for fd in fds:
+                    os.close(fd)
+                running[pid] = request["id"]
+                send_message(sock, {"id": request["id"], "pid": pid})
+            else:
+                try:
+                    while os.read(wakeup_r, 512):
+                        pass
+                except BlockingIOError:
+                    pass
+                while running:
+                    try:
+                        pid, status = os.waitpid(-1, os.WNOHANG)
+                    except ChildProcessError:
+                        break
+                    if pid == 0:
+                        break
+                    run_id = running.pop(pid, None)
+                    if run_id is not None:
+                        send_message(sock, {"id": run_id, "status": os.waitstatus_to_exitcode(status)})
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,10 @@
 from .base_service import BaseService
+from .batching import BatchConfig, BatchItemError, SubtaskBatcher
+from .dag_scheduler import DAGScheduler, DependencyError
+from .event_bus import RunEventBus
+from .history import HistoryConfig, HistoryManager
+from .models import PipelineContext, StageStatus
+from .pipeline_run import PipelineObserver, PipelineRun
 from .reasoning_service import ReasoningService
 from .decomposition_service import DecompositionService
 from .analysis_service import AnalysisService
@@ -9,6 +15,18 @@ from .service_manager import ServiceManager
 
 __all__ = [
     'BaseService',
+    'BatchConfig',
+    'BatchItemError',
+    'SubtaskBatcher',
+    'DAGScheduler',
+    'DependencyError',
+    'RunEventBus',
+    'HistoryConfig',
+    'HistoryManager',
+    'PipelineContext',
+    'StageStatus',
+    'PipelineObserver',
+    'PipelineRun',
     'ReasoningService',
     'DecompositionService',
     'AnalysisService',
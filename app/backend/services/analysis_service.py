@@ -1,10 +1,81 @@
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 from .base_service import BaseService
+from .batching import SubtaskBatcher
+from .models import AnalysisResult, Subtask, SubtaskAnalysis
+
+RISK_LEVELS = ("low", "medium", "high")
+
+ANALYSIS_INSTRUCTION = "你负责执行前分析：检查每个子任务的依赖是否满足，评估所需资源并识别潜在风险。"
+
+# 单个子任务分析结果的 JSON schema
+ANALYSIS_SCHEMA = {
+    "type": "object",
+    "required": ["subtask_id", "dependencies_met", "required_resources", "potential_risks", "risk_level"],
+    "properties": {
+        "subtask_id": {"type": "string"},
+        "dependencies_met": {"type": "boolean"},
+        "required_resources": {
+            "type": "object",
+            "properties": {
+                "memory": {"type": "string"},
+                "cpu": {"type": "string"},
+                "storage": {"type": "string"}
+            }
+        },
+        "potential_risks": {"type": "array", "items": {"type": "string"}},
+        "risk_level": {"type": "string", "enum": list(RISK_LEVELS)}
+    }
+}
 
 class AnalysisService(BaseService):
-    """执行前分析服务，负责分析每个子任务的执行条件和资源需求"""
+    """执行前分析服务，负责分析每个子任务的执行条件和资源需求。
+
+    配置了 batcher 时，所有子任务通过少量批量模型调用完成分析。
+    """
+    
+    name = "analysis"
+    cache_inputs = ("decomposition_result",)
     
-    async def execute(self, context: Dict[str, Any]) -> Dict[str, Any]:
+    def __init__(self, batcher: Optional[SubtaskBatcher] = None):
+        super().__init__()
+        self.batcher = batcher
+    
+    def get_cache_inputs(self, context: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        # 模型批量分析与模拟分析的结果不能互相复用
+        return {**super().get_cache_inputs(context), "batched": self.batcher is not None}
+    
+    async def analyze_subtasks(self, subtasks: List[Subtask]) -> List[SubtaskAnalysis]:
+        """返回与 subtasks 顺序一致的分析结果"""
+        if self.batcher is not None:
+            items = [
+                {
+                    "subtask_id": str(subtask.id),
+                    "title": subtask.title,
+                    "description": subtask.description,
+                    "dependencies": subtask.dependencies
+                }
+                for subtask in subtasks
+            ]
+            results = await self.batcher.run_in_order(ANALYSIS_INSTRUCTION, items, ANALYSIS_SCHEMA)
+            return [SubtaskAnalysis.from_dict(result) for result in results]
+        
+        # 模拟分析结果
+        return [
+            SubtaskAnalysis(
+                subtask_id=subtask.id,
+                dependencies_met=True,
+                required_resources={
+                    "memory": "1GB",
+                    "cpu": "1 core",
+                    "storage": "100MB"
+                },
+                potential_risks=["risk1", "risk2"],
+                risk_level="low"
+            )
+            for subtask in subtasks
+        ]
+    
+    async def execute(self, context: Dict[str, Any]) -> AnalysisResult:
         try:
             self.set_status("running", "正在分析执行条件...")
             
@@ -13,36 +84,26 @@ class AnalysisService(BaseService):
             if not decomposition_result:
                 raise ValueError("没有找到任务分解的结果")
             
-            subtasks = decomposition_result.get("subtasks", [])
+            subtasks = decomposition_result.subtasks
             
             # 分析每个子任务的执行条件和资源需求
-            # TODO: 在这里实现实际的分析逻辑
-            # 例如：检查依赖项、评估资源需求、识别潜在风险等
-            
-            # 模拟分析结果
-            analysis_results = []
-            for subtask in subtasks:
-                analysis_results.append({
-                    "subtask_id": subtask["id"],
-                    "dependencies_met": True,
-                    "required_resources": {
-                        "memory": "1GB",
-                        "cpu": "1 core",
-                        "storage": "100MB"
-                    },
-                    "potential_risks": ["risk1", "risk2"],
-                    "risk_level": "low"
-                })
+            # TODO: 资源汇总仍为模拟值，接入模型后按各子任务的 required_resources 累加
+            analysis_results = await self.analyze_subtasks(subtasks)
+            overall_risk_level = max(
+                (result.risk_level for result in analysis_results),
+                key=RISK_LEVELS.index,
+                default="low"
+            )
             
-            analysis_result = {
-                "subtask_analyses": analysis_results,
-                "overall_risk_level": "low",
-                "resource_requirements": {
+            analysis_result = AnalysisResult(
+                subtask_analyses=analysis_results,
+                overall_risk_level=overall_risk_level,
+                resource_requirements={
                     "total_memory": "2GB",
                     "total_cpu": "2 cores",
                     "total_storage": "200MB"
                 }
-            }
+            )
             
             self.set_status("completed", "已完成执行条件分析")
             self.set_result(analysis_result)
@@ -1,39 +1,120 @@
 from abc import ABC, abstractmethod
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .models import StageModel, StageStatus, to_plain
+from .pipeline_run import ServiceState, current_run
+from .result_stream import ResultStream
+from .stage_store import hash_inputs
 
 class BaseService(ABC):
-    """基础服务类，定义所有服务的基本接口"""
+    """基础服务类，定义所有服务的基本接口。
+
+    服务实例可被并发的多次运行共享：状态写入当前运行（current_run）中对应的
+    ServiceState，没有运行上下文时写入实例自身的默认状态。
+    """
+    
+    # 服务名称，与 ServiceManager 中的键以及上下文中的 "<name>_result" 对应
+    name: str = ""
+    # 决定本阶段结果的上下文字段，用于计算阶段缓存键；为空表示不缓存
+    cache_inputs: Tuple[str, ...] = ()
+    # 阶段逻辑变化时修改版本号，使旧的缓存结果失效
+    cache_version: str = "1"
+    # 是否逐个产出子任务结果 / 是否能边接收上游结果边处理；相邻的两类阶段会被并发执行
+    produces_stream: bool = False
+    consumes_stream: bool = False
     
     def __init__(self):
-        self.status: str = "pending"
-        self.details: Optional[str] = None
-        self.result: Optional[Dict[str, Any]] = None
-        self.error: Optional[str] = None
+        self._default_state = ServiceState()
+
+    @property
+    def state(self) -> ServiceState:
+        """当前运行中本服务的状态"""
+        run = current_run.get()
+        if run is None:
+            return self._default_state
+        return run.state_for(self.name)
+
+    @property
+    def status(self) -> str:
+        return self.state.status
+
+    @property
+    def details(self) -> Optional[str]:
+        return self.state.details
+
+    @property
+    def result(self) -> Optional[StageModel]:
+        return self.state.result
+
+    @property
+    def error(self) -> Optional[str]:
+        return self.state.error
+
+    def get_cache_inputs(self, context: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """返回参与缓存键计算的输入，返回 None 表示本次不缓存"""
+        if not self.cache_inputs:
+            return None
+        return {key: to_plain(context.get(key)) for key in self.cache_inputs}
+
+    def cache_key(self, context: Dict[str, Any]) -> Optional[str]:
+        """按输入内容计算阶段缓存键"""
+        inputs = self.get_cache_inputs(context)
+        if inputs is None:
+            return None
+        return f"stage:{self.name}:{self.cache_version}:{hash_inputs(inputs)}"
 
     @abstractmethod
-    async def execute(self, context: Dict[str, Any]) -> Dict[str, Any]:
-        """执行服务的主要逻辑"""
+    async def execute(self, context: Dict[str, Any]) -> StageModel:
+        """执行服务的主要逻辑，返回本阶段的结果模型"""
         pass
 
+    async def execute_streaming(
+        self,
+        context: Dict[str, Any],
+        upstream: Optional[ResultStream],
+        emit: Callable[[StageModel], None]
+    ) -> StageModel:
+        """流式执行：从 upstream 逐个接收上游结果，用 emit 逐个产出本阶段结果。
+
+        upstream 结束时上游阶段的完整结果已写入 context。默认实现等待上游结束后按普通方式执行，
+        并把结果逐条产出。
+        """
+        if upstream is not None:
+            async for _ in upstream:
+                pass
+        result = await self.execute(context)
+        for item in self.stream_items(result):
+            emit(item)
+        return result
+
+    def stream_items(self, result: StageModel) -> List[StageModel]:
+        """完整结果中的逐个子任务结果，用于从检查点恢复时向下游重放"""
+        return []
+
+    def _publish(self, event: Dict[str, Any]):
+        """向当前运行的事件总线发布事件"""
+        run = current_run.get()
+        if run is not None:
+            run.publish({"service": self.name, **event})
+
     def set_status(self, status: str, details: Optional[str] = None):
         """设置服务状态和详细信息"""
-        self.status = status
-        self.details = details
+        state = self.state
+        state.status = status
+        state.details = details
+        self._publish({"type": "status", "status": status, "details": details, "error": state.error})
 
-    def set_result(self, result: Dict[str, Any]):
+    def set_result(self, result: StageModel):
         """设置服务执行结果"""
-        self.result = result
+        self.state.result = result
+        self._publish({"type": "result", "result": to_plain(result)})
 
     def set_error(self, error: str):
         """设置错误信息"""
-        self.error = error
-        self.status = "error"
-
-    def get_status(self) -> Dict[str, Any]:
-        """获取服务当前状态"""
-        return {
-            "status": self.status,
-            "details": self.details,
-            "result": self.result,
-            "error": self.error
-        } 
\ No newline at end of file
+        state = self.state
+        state.error = error
+        state.status = "error"
+        self._publish({"type": "status", "status": "error", "details": state.details, "error": error})
+
+    def get_status(self, include_result: bool = True) -> StageStatus:
+        """获取服务当前状态，include_result 为 False 时不包含结果本身"""
+        return self.state.as_dict(include_result)
@@ -0,0 +1,207 @@
+import asyncio
+import json
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from .history import Message, Tokenizer, estimate_tokens
+
+# (消息, 响应的 JSON schema) -> 模型返回的原始文本；调用方可把 schema 作为 response_format 传给模型
+CompletionFn = Callable[[List[Message], Dict[str, Any]], Awaitable[str]]
+
+_JSON_TYPES = {
+    "string": str,
+    "boolean": bool,
+    "integer": int,
+    "number": (int, float),
+    "array": list,
+    "object": dict
+}
+
+
+class BatchItemError(Exception):
+    """部分子任务在批量调用和逐个重试后仍没有得到有效结果"""
+
+    def __init__(self, item_ids: List[str]):
+        super().__init__(f"子任务 {', '.join(item_ids)} 未得到有效的模型输出")
+        self.item_ids = item_ids
+
+
+@dataclass
+class BatchConfig:
+    """批量调用配置"""
+    # 模型上下文窗口（token），单个批次的输入和预留输出之和不超过该值
+    context_tokens: int = 8000
+    # 为每个子任务预留的输出 token
+    output_tokens_per_item: int = 300
+    max_items_per_batch: int = 20
+    # 同时进行的批次数
+    max_concurrency: int = 4
+
+
+def validate(value: Any, schema: Dict[str, Any]) -> bool:
+    """校验 JSON schema 中的 type、enum、required、properties 和 items"""
+    expected = schema.get("type")
+    if expected is not None:
+        python_type = _JSON_TYPES.get(expected)
+        if python_type is None or not isinstance(value, python_type):
+            return False
+        # bool 是 int 的子类，不能当作数字
+        if expected in ("integer", "number") and isinstance(value, bool):
+            return False
+    if "enum" in schema and value not in schema["enum"]:
+        return False
+    if isinstance(value, dict):
+        if any(key not in value for key in schema.get("required", [])):
+            return False
+        for key, property_schema in schema.get("properties", {}).items():
+            if key in value and not validate(value[key], property_schema):
+                return False
+    if isinstance(value, list) and "items" in schema:
+        return all(validate(item, schema["items"]) for item in value)
+    return True
+
+
+def parse_results(text: str) -> List[Any]:
+    """解析模型输出，兼容 {"results": [...]}、裸数组和 markdown 代码块"""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        text = text.rsplit("```", 1)[0]
+    payload = json.loads(text)
+    if isinstance(payload, dict):
+        payload = payload.get("results")
+    if not isinstance(payload, list):
+        raise ValueError("模型输出中没有 results 数组")
+    return payload
+
+
+class SubtaskBatcher:
+    """把多个子任务打包进一次结构化的模型调用。
+
+    子任务按上下文窗口切分成批次并发调用，结果按 id 映射回子任务；
+    只有批量结果中缺失或校验失败的子任务才会单独重试，往返次数与批次数成正比。
+    """
+
+    def __init__(
+        self,
+        complete: CompletionFn,
+        config: Optional[BatchConfig] = None,
+        tokenizer: Tokenizer = estimate_tokens
+    ):
+        self.complete = complete
+        self.config = config or BatchConfig()
+        self.tokenizer = tokenizer
+        self.counters: Dict[str, int] = {"batches": 0, "retries": 0, "items": 0}
+
+    @staticmethod
+    def response_schema(item_schema: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {"results": {"type": "array", "items": item_schema}}
+        }
+
+    def _messages(self, instruction: str, items: List[Dict[str, Any]], item_schema: Dict[str, Any], id_key: str) -> List[Message]:
+        system = (
+            f"{instruction}\n"
+            f"对下面 JSON 数组中的每一项分别给出结果，按 {id_key} 对应。"
+            f"只输出一个 JSON 对象 {{\"results\": [...]}}，每个元素满足以下 JSON schema：\n"
+            f"{json.dumps(item_schema, ensure_ascii=False)}"
+        )
+        return [
+            {"role": "system", "content": system},
+            {"role": "user", "content": json.dumps(items, ensure_ascii=False)}
+        ]
+
+    def plan(self, instruction: str, items: List[Dict[str, Any]], item_schema: Dict[str, Any]) -> List[List[Dict[str, Any]]]:
+        """按上下文窗口和单批上限把子任务切分成批次"""
+        base = self.tokenizer(instruction) + self.tokenizer(json.dumps(item_schema, ensure_ascii=False)) + 50
+        available = self.config.context_tokens - base
+        batches: List[List[Dict[str, Any]]] = []
+        current: List[Dict[str, Any]] = []
+        used = 0
+        for item in items:
+            cost = self.tokenizer(json.dumps(item, ensure_ascii=False)) + self.config.output_tokens_per_item
+            if current and (used + cost > available or len(current) >= self.config.max_items_per_batch):
+                batches.append(current)
+                current, used = [], 0
+            # 单个子任务超出窗口时仍单独成批，由模型端报错
+            current.append(item)
+            used += cost
+        if current:
+            batches.append(current)
+        return batches
+
+    async def _call(
+        self,
+        instruction: str,
+        items: List[Dict[str, Any]],
+        item_schema: Dict[str, Any],
+        id_key: str
+    ) -> Dict[str, Dict[str, Any]]:
+        """执行一次调用，返回其中有效的结果（id -> 结果）"""
+        expected = {str(item[id_key]) for item in items}
+        try:
+            text = await self.complete(
+                self._messages(instruction, items, item_schema, id_key),
+                self.response_schema(item_schema)
+            )
+            results = parse_results(text)
+        except (ValueError, TypeError):
+            # 整批输出无法解析（json.JSONDecodeError 是 ValueError 的子类）
+            return {}
+        valid: Dict[str, Dict[str, Any]] = {}
+        for result in results:
+            if not isinstance(result, dict) or not validate(result, item_schema):
+                continue
+            result_id = str(result.get(id_key))
+            if result_id in expected and result_id not in valid:
+                valid[result_id] = result
+        return valid
+
+    async def run(
+        self,
+        instruction: str,
+        items: List[Dict[str, Any]],
+        item_schema: Dict[str, Any],
+        id_key: str = "subtask_id"
+    ) -> Dict[str, Dict[str, Any]]:
+        """返回 id -> 结果；重试后仍缺失的子任务抛出 BatchItemError"""
+        if not items:
+            return {}
+        limiter = asyncio.Semaphore(self.config.max_concurrency)
+
+        async def call(batch: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+            async with limiter:
+                return await self._call(instruction, batch, item_schema, id_key)
+
+        batches = self.plan(instruction, items, item_schema)
+        self.counters["batches"] += len(batches)
+        self.counters["items"] += len(items)
+        results: Dict[str, Dict[str, Any]] = {}
+        for batch_results in await asyncio.gather(*[call(batch) for batch in batches]):
+            results.update(batch_results)
+
+        # 只对缺失或无效的子任务逐个重试
+        missing = [item for item in items if str(item[id_key]) not in results]
+        if missing:
+            self.counters["retries"] += len(missing)
+            for retried in await asyncio.gather(*[call([item]) for item in missing]):
+                results.update(retried)
+        failed = [str(item[id_key]) for item in items if str(item[id_key]) not in results]
+        if failed:
+            raise BatchItemError(failed)
+        return results
+
+    async def run_in_order(
+        self,
+        instruction: str,
+        items: List[Dict[str, Any]],
+        item_schema: Dict[str, Any],
+        id_key: str = "subtask_id"
+    ) -> List[Dict[str, Any]]:
+        """与 run 相同，但按 items 的顺序返回结果；缺少结果的子任务全部列在 BatchItemError 中"""
+        results = await self.run(instruction, items, item_schema, id_key)
+        missing = [str(item[id_key]) for item in items if str(item[id_key]) not in results]
+        if missing:
+            raise BatchItemError(missing)
+        return [results[str(item[id_key])] for item in items]
@@ -0,0 +1,143 @@
+import asyncio
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+
+class DependencyError(ValueError):
+    """子任务依赖关系无效（缺失依赖或存在环）"""
+
+
+class DAGScheduler:
+    """按依赖关系调度子任务：依赖满足的子任务在并发上限内同时执行，失败时跳过所有下游子任务"""
+
+    def __init__(self, max_parallelism: int = 4):
+        if max_parallelism < 1:
+            raise ValueError("max_parallelism 必须大于 0")
+        self.max_parallelism = max_parallelism
+
+    @staticmethod
+    def validate(subtasks: List[Dict[str, Any]]) -> Dict[str, List[str]]:
+        """检查重复 id、缺失依赖和环，返回 id -> 依赖列表"""
+        graph: Dict[str, List[str]] = {}
+        for subtask in subtasks:
+            if subtask["id"] in graph:
+                raise DependencyError(f"子任务 {subtask['id']} 重复")
+            graph[subtask["id"]] = list(subtask.get("dependencies", []))
+
+        for subtask_id, dependencies in graph.items():
+            missing = [dep for dep in dependencies if dep not in graph]
+            if missing:
+                raise DependencyError(f"子任务 {subtask_id} 依赖的 {', '.join(missing)} 不存在")
+
+        # Kahn 拓扑排序，无法排完说明存在环
+        indegree = {subtask_id: len(set(deps)) for subtask_id, deps in graph.items()}
+        dependents: Dict[str, List[str]] = {subtask_id: [] for subtask_id in graph}
+        for subtask_id, dependencies in graph.items():
+            for dep in set(dependencies):
+                dependents[dep].append(subtask_id)
+        queue = [subtask_id for subtask_id, degree in indegree.items() if degree == 0]
+        visited = 0
+        while queue:
+            current = queue.pop()
+            visited += 1
+            for child in dependents[current]:
+                indegree[child] -= 1
+                if indegree[child] == 0:
+                    queue.append(child)
+        if visited != len(graph):
+            cyclic = sorted(subtask_id for subtask_id, degree in indegree.items() if degree > 0)
+            raise DependencyError(f"子任务依赖存在环: {', '.join(cyclic)}")
+        return graph
+
+    async def run(
+        self,
+        subtasks: List[Dict[str, Any]],
+        execute: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]],
+        on_record: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """执行所有子任务，返回 id -> 执行记录（含真实的开始/结束时间和耗时）。
+
+        on_record 在每条记录产生时（包括被跳过的子任务）立即回调，供下游阶段流式消费。
+        """
+        graph = self.validate(subtasks)
+        by_id = {subtask["id"]: subtask for subtask in subtasks}
+        remaining: Dict[str, Set[str]] = {subtask_id: set(deps) for subtask_id, deps in graph.items()}
+        dependents: Dict[str, List[str]] = {subtask_id: [] for subtask_id in graph}
+        for subtask_id, dependencies in graph.items():
+            for dep in set(dependencies):
+                dependents[dep].append(subtask_id)
+
+        records: Dict[str, Dict[str, Any]] = {}
+        ready = [subtask["id"] for subtask in subtasks if not remaining[subtask["id"]]]
+        running: Dict[asyncio.Task, str] = {}
+
+        def skip_dependents(subtask_id: str):
+            for child in dependents[subtask_id]:
+                if child in records:
+                    continue
+                records[child] = {
+                    "subtask_id": child,
+                    "status": "skipped",
+                    "start_time": None,
+                    "end_time": None,
+                    "duration": 0.0,
+                    "output": f"依赖的子任务 {subtask_id} 未成功完成，已跳过"
+                }
+                if on_record is not None:
+                    on_record(records[child])
+                skip_dependents(child)
+
+        try:
+            while ready or running:
+                while ready and len(running) < self.max_parallelism:
+                    subtask_id = ready.pop(0)
+                    running[asyncio.create_task(self._run_one(by_id[subtask_id], execute))] = subtask_id
+
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    subtask_id = running.pop(task)
+                    record = task.result()
+                    records[subtask_id] = record
+                    if on_record is not None:
+                        on_record(record)
+                    if record["status"] != "completed":
+                        skip_dependents(subtask_id)
+                        continue
+                    for child in dependents[subtask_id]:
+                        remaining[child].discard(subtask_id)
+                        if not remaining[child] and child not in records:
+                            ready.append(child)
+        finally:
+            for task in running:
+                task.cancel()
+
+        return records
+
+    @staticmethod
+    async def _run_one(
+        subtask: Dict[str, Any],
+        execute: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+    ) -> Dict[str, Any]:
+        start_time = datetime.now()
+        started = time.perf_counter()
+        try:
+            result = await execute(subtask)
+            status = result.pop("status", "completed")
+            error = None
+        except Exception as e:
+            result = {}
+            status = "failed"
+            error = str(e)
+        end_time = datetime.now()
+        record = {
+            "subtask_id": subtask["id"],
+            "status": status,
+            "start_time": start_time.isoformat(timespec="milliseconds"),
+            "end_time": end_time.isoformat(timespec="milliseconds"),
+            "duration": round(time.perf_counter() - started, 6),
+            **result
+        }
+        if error is not None:
+            record["error"] = error
+        return record
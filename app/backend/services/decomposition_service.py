@@ -1,10 +1,14 @@
 from typing import Any, Dict, List
 from .base_service import BaseService
+from .models import DecompositionResult, Subtask
 
 class DecompositionService(BaseService):
     """任务分解服务，负责将任务分解为可执行的子任务"""
     
-    async def execute(self, context: Dict[str, Any]) -> Dict[str, Any]:
+    name = "decomposition"
+    cache_inputs = ("reasoning_result",)
+    
+    async def execute(self, context: Dict[str, Any]) -> DecompositionResult:
         try:
             self.set_status("running", "正在分解任务...")
             
@@ -18,28 +22,28 @@ class DecompositionService(BaseService):
             # 例如：使用 LLM 将任务分解为具体的子任务
             
             # 模拟任务分解结果
-            subtasks = [
-                {
-                    "id": "subtask1",
-                    "title": "子任务1",
-                    "description": "子任务1的描述",
-                    "dependencies": [],
-                    "estimated_time": "5分钟"
-                },
-                {
-                    "id": "subtask2",
-                    "title": "子任务2",
-                    "description": "子任务2的描述",
-                    "dependencies": ["subtask1"],
-                    "estimated_time": "10分钟"
-                }
+            subtasks: List[Subtask] = [
+                Subtask(
+                    id="subtask1",
+                    title="子任务1",
+                    description="子任务1的描述",
+                    dependencies=[],
+                    estimated_time="5分钟"
+                ),
+                Subtask(
+                    id="subtask2",
+                    title="子任务2",
+                    description="子任务2的描述",
+                    dependencies=["subtask1"],
+                    estimated_time="10分钟"
+                )
             ]
             
-            decomposition_result = {
-                "subtasks": subtasks,
-                "total_tasks": len(subtasks),
-                "estimated_total_time": "15分钟"
-            }
+            decomposition_result = DecompositionResult(
+                subtasks=subtasks,
+                total_tasks=len(subtasks),
+                estimated_total_time="15分钟"
+            )
             
             self.set_status("completed", "已完成任务分解")
             self.set_result(decomposition_result)
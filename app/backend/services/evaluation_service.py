@@ -1,10 +1,155 @@
-from typing import Any, Dict, List
+import asyncio
+from typing import Any, Callable, Dict, List, Optional
 from .base_service import BaseService
+from .batching import SubtaskBatcher
+from .models import EvaluationResult, SubtaskEvaluation, SubtaskRecord
+from .result_stream import ResultStream
+
+EVALUATION_INSTRUCTION = "你负责评估任务执行结果：检查每个子任务的输出质量、性能和正确性，指出问题并给出改进建议。"
+
+_SCORE = {"type": "number"}
+
+# 单个子任务评估结果的 JSON schema
+EVALUATION_SCHEMA = {
+    "type": "object",
+    "required": ["subtask_id", "success_rate", "performance_score", "quality_score", "issues", "improvements"],
+    "properties": {
+        "subtask_id": {"type": "string"},
+        "success_rate": _SCORE,
+        "performance_score": _SCORE,
+        "quality_score": _SCORE,
+        "issues": {"type": "array", "items": {"type": "string"}},
+        "improvements": {"type": "array", "items": {"type": "string"}}
+    }
+}
+
+def _average(values: List[float]) -> float:
+    return round(sum(values) / len(values), 4) if values else 0.0
 
 class EvaluationService(BaseService):
-    """任务评估服务，负责评估任务执行结果和效果"""
+    """任务评估服务，负责评估任务执行结果和效果。
+
+    配置了 batcher 时，所有子任务通过少量批量模型调用完成评估。
+    流式执行时每个子任务的执行记录一到达就开始评估，同时到达的记录合并为一批。
+    """
+    
+    name = "evaluation"
+    cache_inputs = ("execution_result",)
+    produces_stream = True
+    consumes_stream = True
+    
+    def __init__(self, batcher: Optional[SubtaskBatcher] = None):
+        super().__init__()
+        self.batcher = batcher
+    
+    def get_cache_inputs(self, context: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        # 模型批量评估与模拟评估的结果不能互相复用
+        return {**super().get_cache_inputs(context), "batched": self.batcher is not None}
+    
+    async def evaluate_subtasks(self, subtask_results: List[SubtaskRecord]) -> List[SubtaskEvaluation]:
+        """返回与 subtask_results 顺序一致的评估结果"""
+        if self.batcher is not None:
+            items = [
+                {
+                    "subtask_id": str(result.subtask_id),
+                    "status": result.status,
+                    "output": result.output,
+                    "error": result.error,
+                    "duration": result.duration
+                }
+                for result in subtask_results
+            ]
+            evaluations = await self.batcher.run_in_order(EVALUATION_INSTRUCTION, items, EVALUATION_SCHEMA)
+            return [SubtaskEvaluation.from_dict(evaluation) for evaluation in evaluations]
+        
+        # 模拟评估结果
+        return [
+            SubtaskEvaluation(
+                subtask_id=result.subtask_id,
+                success_rate=0.95,
+                performance_score=0.85,
+                quality_score=0.9,
+                issues=[],
+                improvements=["improvement1", "improvement2"]
+            )
+            for result in subtask_results
+        ]
+    
+    def stream_items(self, result: EvaluationResult) -> List[SubtaskEvaluation]:
+        return result.subtask_evaluations
+    
+    @staticmethod
+    def build_result(evaluation_results: List[SubtaskEvaluation]) -> EvaluationResult:
+        """由逐个子任务的评估汇总出总体评估结果"""
+        return EvaluationResult(
+            subtask_evaluations=evaluation_results,
+            overall_metrics={
+                "average_success_rate": _average([item.success_rate for item in evaluation_results]),
+                "average_performance_score": _average([item.performance_score for item in evaluation_results]),
+                "average_quality_score": _average([item.quality_score for item in evaluation_results]),
+                "total_issues": sum(len(item.issues) for item in evaluation_results),
+                "total_improvements": sum(len(item.improvements) for item in evaluation_results)
+            },
+            recommendations=[
+                "建议1",
+                "建议2"
+            ]
+        )
+    
+    async def execute_streaming(
+        self,
+        context: Dict[str, Any],
+        upstream: Optional[ResultStream],
+        emit: Callable[[SubtaskEvaluation], None]
+    ) -> EvaluationResult:
+        if upstream is None:
+            return await super().execute_streaming(context, upstream, emit)
+        try:
+            self.set_status("running", "正在评估已完成的子任务...")
+            
+            evaluations: Dict[str, SubtaskEvaluation] = {}
+            
+            async def evaluate(batch: List[SubtaskRecord]):
+                for evaluation in await self.evaluate_subtasks(batch):
+                    evaluations[str(evaluation.subtask_id)] = evaluation
+                    emit(evaluation)
+            
+            # 评估与仍在执行的子任务重叠进行
+            tasks: List[asyncio.Task] = []
+            try:
+                async for batch in upstream.batches():
+                    tasks.append(asyncio.create_task(evaluate(batch)))
+                await asyncio.gather(*tasks)
+            finally:
+                for task in tasks:
+                    task.cancel()
+            
+            # 上游流结束时执行结果已写入上下文，按子任务顺序输出
+            execution_result = context.get("execution_result")
+            if not execution_result:
+                raise ValueError("没有找到任务执行的结果")
+            missing = [
+                str(record.subtask_id)
+                for record in execution_result.subtask_results
+                if str(record.subtask_id) not in evaluations
+            ]
+            if missing:
+                raise ValueError(f"子任务 {', '.join(missing)} 没有评估结果")
+            evaluation_result = self.build_result([
+                evaluations[str(record.subtask_id)]
+                for record in execution_result.subtask_results
+            ])
+            
+            self.set_status("completed", "已完成执行结果评估")
+            self.set_result(evaluation_result)
+            
+            return evaluation_result
+            
+        except Exception as e:
+            self.set_error(f"任务评估阶段发生错误: {str(e)}")
+            raise
     
-    async def execute(self, context: Dict[str, Any]) -> Dict[str, Any]:
+    async def execute(self, context: Dict[str, Any]) -> EvaluationResult:
         try:
             self.set_status("running", "正在评估执行结果...")
             
@@ -13,39 +158,13 @@ class EvaluationService(BaseService):
             if not execution_result:
                 raise ValueError("没有找到任务执行的结果")
             
-            subtask_results = execution_result.get("subtask_results", [])
+            subtask_results = execution_result.subtask_results
             
             # 评估每个子任务的执行结果
-            # TODO: 在这里实现实际的评估逻辑
-            # 例如：检查输出质量、评估性能指标、验证结果正确性等
-            
-            # 模拟评估结果
-            evaluation_results = []
-            for result in subtask_results:
-                evaluation_results.append({
-                    "subtask_id": result["subtask_id"],
-                    "success_rate": 0.95,
-                    "performance_score": 0.85,
-                    "quality_score": 0.9,
-                    "issues": [],
-                    "improvements": ["improvement1", "improvement2"]
-                })
+            evaluation_results = await self.evaluate_subtasks(subtask_results)
             
             # 计算总体评估结果
-            evaluation_result = {
-                "subtask_evaluations": evaluation_results,
-                "overall_metrics": {
-                    "average_success_rate": 0.95,
-                    "average_performance_score": 0.85,
-                    "average_quality_score": 0.9,
-                    "total_issues": 0,
-                    "total_improvements": 4
-                },
-                "recommendations": [
-                    "建议1",
-                    "建议2"
-                ]
-            }
+            evaluation_result = self.build_result(evaluation_results)
             
             self.set_status("completed", "已完成执行结果评估")
             self.set_result(evaluation_result)
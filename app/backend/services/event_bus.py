@@ -0,0 +1,44 @@
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+
+class RunEventBus:
+    """单次运行的事件总线：发布不阻塞，后加入的订阅者会先收到已发布的历史事件"""
+
+    def __init__(self):
+        self.history: List[Dict[str, Any]] = []
+        self.closed = False
+        self._subscribers: List[asyncio.Queue] = []
+
+    def publish(self, event: Dict[str, Any]):
+        if self.closed:
+            return
+        self.history.append(event)
+        for queue in self._subscribers:
+            queue.put_nowait(event)
+
+    def close(self):
+        """结束运行，所有订阅者的迭代随之结束"""
+        if self.closed:
+            return
+        self.closed = True
+        for queue in self._subscribers:
+            queue.put_nowait(None)
+
+    async def subscribe(self) -> AsyncIterator[Dict[str, Any]]:
+        queue: asyncio.Queue[Optional[Dict[str, Any]]] = asyncio.Queue()
+        for event in self.history:
+            queue.put_nowait(event)
+        if self.closed:
+            queue.put_nowait(None)
+        else:
+            self._subscribers.append(queue)
+        try:
+            while True:
+                event = await queue.get()
+                if event is None:
+                    return
+                yield event
+        finally:
+            if queue in self._subscribers:
+                self._subscribers.remove(queue)
@@ -1,10 +1,62 @@
-from typing import Any, Dict, List
+import time
+from typing import Any, Callable, Dict, List, Optional
 from .base_service import BaseService
+from .dag_scheduler import DAGScheduler
+from .models import ExecutionResult, SubtaskAnalysis, SubtaskRecord
+from .result_stream import ResultStream
 
 class ExecutionService(BaseService):
-    """任务执行服务，负责按顺序执行分解后的子任务"""
+    """任务执行服务，负责按依赖关系并发执行分解后的子任务"""
     
-    async def execute(self, context: Dict[str, Any]) -> Dict[str, Any]:
+    name = "execution"
+    # 执行阶段有副作用，不设置 cache_inputs，不参与阶段缓存
+    produces_stream = True
+    
+    def __init__(self, max_parallelism: int = 4):
+        super().__init__()
+        self.scheduler = DAGScheduler(max_parallelism)
+    
+    async def execute_subtask(self, subtask: Dict[str, Any], analysis: Optional[SubtaskAnalysis]) -> Dict[str, Any]:
+        """执行单个子任务"""
+        # TODO: 在这里实现实际的执行逻辑
+        # 例如：调用相应的API、执行代码、处理数据等
+        
+        # 模拟执行结果
+        return {
+            "output": f"子任务 {subtask['id']} 的执行结果",
+            "metrics": {
+                "resource_usage": {
+                    "memory": "800MB",
+                    "cpu": "0.8 core"
+                }
+            }
+        }
+    
+    @staticmethod
+    def _finalize_record(record: Dict[str, Any]) -> SubtaskRecord:
+        record.setdefault("metrics", {})["execution_time"] = f"{record['duration']:.3f}秒"
+        return SubtaskRecord.from_dict(record)
+    
+    def stream_items(self, result: ExecutionResult) -> List[SubtaskRecord]:
+        return result.subtask_results
+    
+    async def execute_streaming(
+        self,
+        context: Dict[str, Any],
+        upstream: Optional[ResultStream],
+        emit: Callable[[SubtaskRecord], None]
+    ) -> ExecutionResult:
+        # 每个子任务一结束就把执行记录交给下游
+        return await self._run(context, emit)
+    
+    async def execute(self, context: Dict[str, Any]) -> ExecutionResult:
+        return await self._run(context)
+    
+    async def _run(
+        self,
+        context: Dict[str, Any],
+        emit: Optional[Callable[[SubtaskRecord], None]] = None
+    ) -> ExecutionResult:
         try:
             self.set_status("running", "正在执行任务...")
             
@@ -15,42 +67,42 @@ class ExecutionService(BaseService):
             if not decomposition_result or not analysis_result:
                 raise ValueError("缺少必要的任务信息")
             
-            subtasks = decomposition_result.get("subtasks", [])
-            subtask_analyses = analysis_result.get("subtask_analyses", [])
-            
-            # 按顺序执行子任务
-            execution_results = []
-            for subtask, analysis in zip(subtasks, subtask_analyses):
-                # TODO: 在这里实现实际的执行逻辑
-                # 例如：调用相应的API、执行代码、处理数据等
-                
-                # 模拟执行结果
-                execution_results.append({
-                    "subtask_id": subtask["id"],
-                    "status": "completed",
-                    "start_time": "2024-03-24T10:00:00",
-                    "end_time": "2024-03-24T10:05:00",
-                    "output": f"子任务 {subtask['id']} 的执行结果",
-                    "metrics": {
-                        "execution_time": "5分钟",
-                        "resource_usage": {
-                            "memory": "800MB",
-                            "cpu": "0.8 core"
-                        }
-                    }
-                })
-            
-            execution_result = {
-                "subtask_results": execution_results,
-                "total_execution_time": "15分钟",
-                "overall_status": "completed"
-            }
+            # 调度器按 id 和 dependencies 处理 dict 形式的子任务
+            subtasks = [subtask.to_dict() for subtask in decomposition_result.subtasks]
+            analyses = {analysis.subtask_id: analysis for analysis in analysis_result.subtask_analyses}
+            
+            # 每条记录产生时转换为 SubtaskRecord，流式执行时同一个对象也交给下游
+            finalized: Dict[str, SubtaskRecord] = {}
+            
+            def on_record(record: Dict[str, Any]):
+                finalized[record["subtask_id"]] = self._finalize_record(record)
+                if emit is not None:
+                    emit(finalized[record["subtask_id"]])
+            
+            # 依赖满足的子任务并发执行，失败子任务的下游会被跳过
+            started = time.perf_counter()
+            await self.scheduler.run(
+                subtasks,
+                lambda subtask: self.execute_subtask(subtask, analyses.get(subtask["id"])),
+                on_record=on_record
+            )
+            total_time = time.perf_counter() - started
+            
+            execution_results = [finalized[subtask["id"]] for subtask in subtasks]
+            
+            failed = [record.subtask_id for record in execution_results if record.status != "completed"]
+            execution_result = ExecutionResult(
+                subtask_results=execution_results,
+                total_execution_time=f"{total_time:.3f}秒",
+                overall_status="failed" if failed else "completed",
+                failed_subtasks=failed
+            )
             
-            self.set_status("completed", "已完成任务执行")
+            self.set_status("completed", "已完成任务执行" if not failed else f"{len(failed)} 个子任务未完成")
             self.set_result(execution_result)
             
             return execution_result
             
         except Exception as e:
             self.set_error(f"任务执行阶段发生错误: {str(e)}")
-            raise 
\ No newline at end of file
+            raise
@@ -0,0 +1,172 @@
+import hashlib
+import math
+import re
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional
+from .stage_store import InMemoryStageStore, StageStore
+
+Message = Dict[str, str]
+Tokenizer = Callable[[str], int]
+# (上一次的摘要, 新需要并入摘要的消息) -> 新摘要
+Summarizer = Callable[[Optional[str], List[Message]], Awaitable[str]]
+
+# 中日韩字符大致一个字一个 token，其余文本按约 4 个字符一个 token 估算
+_CJK = re.compile(r"[\u3000-\u9fff\uac00-\ud7af\uff00-\uffef]")
+
+SUMMARY_PREFIX = "以下是较早对话的摘要：\n"
+
+
+def estimate_tokens(text: str) -> int:
+    """不依赖具体分词器的 token 数估算"""
+    cjk = len(_CJK.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+@dataclass
+class HistoryConfig:
+    """对话历史压缩配置"""
+    # 未单独配置的模型使用的提示词 token 预算
+    max_tokens: int = 8000
+    # 模型 id -> token 预算
+    model_budgets: Dict[str, int] = field(default_factory=dict)
+    # 摘要本身最多占用的 token 数
+    summary_max_tokens: int = 1000
+    # 无论预算如何都原样保留的最近消息数
+    min_recent_messages: int = 2
+    # 每条消息的角色和格式开销
+    message_overhead: int = 4
+    # 查找已有摘要时最多向前回溯的消息数
+    summary_lookback: int = 32
+    # 缓存 token 计数的消息数
+    count_cache_size: int = 10000
+
+
+class ExtractiveSummarizer:
+    """不调用模型的摘要器：每条消息保留开头一段，超出 token 上限时丢弃最早的条目"""
+
+    def __init__(self, max_tokens: int, tokenizer: Tokenizer = estimate_tokens, snippet_chars: int = 200):
+        self.max_tokens = max_tokens
+        self.tokenizer = tokenizer
+        self.snippet_chars = snippet_chars
+
+    async def __call__(self, previous: Optional[str], messages: List[Message]) -> str:
+        # TODO: 接入 LLM 后改为让模型在上一次摘要的基础上合并新消息
+        lines = previous.split("\n") if previous else []
+        for message in messages:
+            content = " ".join(message.get("content", "").split())
+            if len(content) > self.snippet_chars:
+                content = content[:self.snippet_chars] + "…"
+            lines.append(f"{message.get('role', 'user')}: {content}")
+        tokens = [self.tokenizer(line) + 1 for line in lines]
+        total = sum(tokens)
+        start = 0
+        while total > self.max_tokens and start < len(lines) - 1:
+            total -= tokens[start]
+            start += 1
+        return "\n".join(lines[start:])
+
+
+class HistoryManager:
+    """按 token 预算压缩对话历史。
+
+    开头的 system 消息和最近的若干轮对话原样保留，更早的对话替换为一条摘要消息。
+    摘要按消息前缀的链式哈希保存在 store 中，对话变长时只需把新移出窗口的消息并入
+    上一次的摘要，而不必每次重新总结全部历史。
+    """
+
+    def __init__(
+        self,
+        config: Optional[HistoryConfig] = None,
+        store: Optional[StageStore] = None,
+        summarizer: Optional[Summarizer] = None,
+        tokenizer: Tokenizer = estimate_tokens
+    ):
+        self.config = config or HistoryConfig()
+        self.store: StageStore = store or InMemoryStageStore()
+        self.tokenizer = tokenizer
+        self.summarizer = summarizer or ExtractiveSummarizer(self.config.summary_max_tokens, tokenizer)
+        self._counts: "OrderedDict[str, int]" = OrderedDict()
+
+    def budget_for(self, model: Optional[str]) -> int:
+        return self.config.model_budgets.get(model, self.config.max_tokens) if model else self.config.max_tokens
+
+    def count(self, message: Message) -> int:
+        """单条消息的 token 数，按内容哈希缓存，重复发送的历史消息不会被重复计数"""
+        content = message.get("content", "")
+        key = hashlib.sha1(content.encode()).hexdigest()
+        tokens = self._counts.get(key)
+        if tokens is None:
+            tokens = self.tokenizer(content)
+            self._counts[key] = tokens
+            if len(self._counts) > self.config.count_cache_size:
+                self._counts.popitem(last=False)
+        else:
+            self._counts.move_to_end(key)
+        return tokens + self.config.message_overhead
+
+    def count_messages(self, messages: List[Message]) -> int:
+        return sum(self.count(message) for message in messages)
+
+    @staticmethod
+    def _prefix_hashes(messages: List[Message]) -> List[str]:
+        """hashes[i] 标识前 i 条消息，前缀相同的对话共享同一个摘要"""
+        hashes = [""]
+        for message in messages:
+            digest = hashlib.sha256()
+            digest.update(hashes[-1].encode())
+            digest.update(message.get("role", "").encode())
+            digest.update(b"\0")
+            digest.update(message.get("content", "").encode())
+            hashes.append(digest.hexdigest())
+        return hashes
+
+    @staticmethod
+    def _summary_key(prefix_hash: str) -> str:
+        return f"history:{prefix_hash}"
+
+    async def _summarize(self, conversation: List[Message], cut: int) -> str:
+        """返回 conversation[:cut] 的摘要，优先在已有的较短前缀摘要上增量合并"""
+        hashes = self._prefix_hashes(conversation[:cut])
+        previous, start = None, 0
+        for index in range(cut, max(0, cut - self.config.summary_lookback), -1):
+            cached = await self.store.get(self._summary_key(hashes[index]))
+            if cached is not None:
+                previous, start = cached, index
+                break
+        if start == cut:
+            return previous
+        summary = await self.summarizer(previous, conversation[start:cut])
+        await self.store.set(self._summary_key(hashes[cut]), summary)
+        return summary
+
+    async def compact(self, messages: List[Message], model: Optional[str] = None) -> List[Message]:
+        """历史超出模型预算时返回压缩后的消息列表，否则原样返回"""
+        budget = self.budget_for(model)
+        if self.count_messages(messages) <= budget:
+            return messages
+
+        # 开头的 system 消息（包括之前压缩产生的摘要）始终保留
+        head = 0
+        while head < len(messages) and messages[head].get("role") == "system":
+            head += 1
+        system, conversation = messages[:head], messages[head:]
+
+        # 预留摘要所需的空间后，从最新的消息往前尽量多地保留原文
+        remaining = budget - self.count_messages(system) - self.config.summary_max_tokens - self.config.message_overhead
+        cut = len(conversation)
+        while cut > 0:
+            tokens = self.count(conversation[cut - 1])
+            if tokens > remaining and len(conversation) - cut >= self.config.min_recent_messages:
+                break
+            remaining -= tokens
+            cut -= 1
+        if cut == 0:
+            return messages
+
+        summary = await self._summarize(conversation, cut)
+        return [
+            *system,
+            {"role": "system", "content": SUMMARY_PREFIX + summary},
+            *conversation[cut:]
+        ]
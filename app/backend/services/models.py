@@ -0,0 +1,180 @@
+from dataclasses import asdict, dataclass, field, fields
+from typing import Any, Dict, List, NotRequired, Optional, TypedDict
+
+# 各阶段的输出在运行上下文中以带 __slots__ 的 dataclass 保存，比同样内容的 dict 占用更少内存，
+# 字段也有固定的结构；写入阶段缓存、检查点和 API 响应时才用 to_dict 转换为可 JSON 序列化的 dict，
+# 从缓存或检查点读出时用 from_dict 还原。
+
+
+class StageModel:
+    """阶段结果模型的基类"""
+    __slots__ = ()
+
+    # 字段名 -> 列表元素的模型类型，from_dict 用它还原嵌套的子任务结果
+    item_types: Dict[str, type] = {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]):
+        """忽略未知字段；缺少没有默认值的字段时抛出 TypeError"""
+        names = {model_field.name for model_field in fields(cls)}
+        values = {key: value for key, value in data.items() if key in names}
+        for name, item_type in cls.item_types.items():
+            if name in values:
+                values[name] = [item_type.from_dict(item) for item in values[name]]
+        return cls(**values)
+
+
+class ChatMessage(TypedDict):
+    role: str
+    content: str
+
+
+@dataclass(slots=True)
+class ReasoningResult(StageModel):
+    intent: str
+    key_points: List[str]
+    requirements: List[str]
+    constraints: List[str]
+
+
+@dataclass(slots=True)
+class Subtask(StageModel):
+    id: str
+    title: str = ""
+    description: str = ""
+    dependencies: List[str] = field(default_factory=list)
+    estimated_time: str = ""
+
+
+@dataclass(slots=True)
+class DecompositionResult(StageModel):
+    item_types = {"subtasks": Subtask}
+
+    subtasks: List[Subtask]
+    total_tasks: int
+    estimated_total_time: str
+
+
+@dataclass(slots=True)
+class SubtaskAnalysis(StageModel):
+    subtask_id: str
+    dependencies_met: bool
+    required_resources: Dict[str, str]
+    potential_risks: List[str]
+    risk_level: str
+
+
+@dataclass(slots=True)
+class AnalysisResult(StageModel):
+    item_types = {"subtask_analyses": SubtaskAnalysis}
+
+    subtask_analyses: List[SubtaskAnalysis]
+    overall_risk_level: str
+    resource_requirements: Dict[str, str]
+
+
+@dataclass(slots=True)
+class SubtaskRecord(StageModel):
+    """DAGScheduler 产出的单个子任务执行记录，status 为 completed、failed 或 skipped"""
+    subtask_id: str
+    status: str
+    start_time: Optional[str] = None
+    end_time: Optional[str] = None
+    duration: float = 0.0
+    output: Any = None
+    error: Optional[str] = None
+    metrics: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass(slots=True)
+class ExecutionResult(StageModel):
+    item_types = {"subtask_results": SubtaskRecord}
+
+    subtask_results: List[SubtaskRecord]
+    total_execution_time: str
+    overall_status: str
+    failed_subtasks: List[str]
+
+
+@dataclass(slots=True)
+class SubtaskEvaluation(StageModel):
+    subtask_id: str
+    success_rate: float
+    performance_score: float
+    quality_score: float
+    issues: List[str]
+    improvements: List[str]
+
+
+@dataclass(slots=True)
+class EvaluationResult(StageModel):
+    item_types = {"subtask_evaluations": SubtaskEvaluation}
+
+    subtask_evaluations: List[SubtaskEvaluation]
+    overall_metrics: Dict[str, float]
+    recommendations: List[str]
+
+
+@dataclass(slots=True)
+class SummaryResult(StageModel):
+    execution_summary: Dict[str, Any]
+    performance_summary: Dict[str, float]
+    key_findings: List[str]
+    recommendations: List[str]
+    next_steps: List[str]
+
+
+# 上下文中各阶段结果的键 -> 模型类型
+RESULT_MODELS: Dict[str, type] = {
+    "reasoning_result": ReasoningResult,
+    "decomposition_result": DecompositionResult,
+    "analysis_result": AnalysisResult,
+    "execution_result": ExecutionResult,
+    "evaluation_result": EvaluationResult,
+    "summary_result": SummaryResult
+}
+
+
+class PipelineContext(TypedDict, total=False):
+    """一次运行的上下文：请求输入加上各阶段写入的 <name>_result"""
+    messages: List[ChatMessage]
+    model: str
+    reasoning_result: ReasoningResult
+    decomposition_result: DecompositionResult
+    analysis_result: AnalysisResult
+    execution_result: ExecutionResult
+    evaluation_result: EvaluationResult
+    summary_result: SummaryResult
+
+
+class StageStatus(TypedDict):
+    """阶段状态；result 只在要求包含结果时出现，为阶段结果的 dict 形式"""
+    status: str
+    details: Optional[str]
+    error: Optional[str]
+    result: NotRequired[Optional[Dict[str, Any]]]
+
+
+def to_plain(value: Any) -> Any:
+    """把阶段结果（或包含阶段结果的上下文）转换为可 JSON 序列化的形式"""
+    if isinstance(value, StageModel):
+        return value.to_dict()
+    if isinstance(value, dict):
+        return {key: to_plain(item) for key, item in value.items()}
+    return value
+
+
+def context_to_dict(context: PipelineContext) -> Dict[str, Any]:
+    return {key: to_plain(value) for key, value in context.items()}
+
+
+def context_from_dict(data: Dict[str, Any]) -> PipelineContext:
+    """还原检查点中的上下文，阶段结果转换回模型"""
+    context: PipelineContext = {}
+    for key, value in data.items():
+        model = RESULT_MODELS.get(key)
+        context[key] = model.from_dict(value) if model is not None and isinstance(value, dict) else value
+    return context
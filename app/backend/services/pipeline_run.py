@@ -0,0 +1,82 @@
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, Optional
+from .event_bus import RunEventBus
+from .models import PipelineContext, StageModel, StageStatus, to_plain
+
+
+class ServiceState:
+    """单个服务在一次运行中的状态"""
+    __slots__ = ("status", "details", "result", "error")
+
+    def __init__(self):
+        self.status: str = "pending"
+        self.details: Optional[str] = None
+        self.result: Optional[StageModel] = None
+        self.error: Optional[str] = None
+
+    def as_dict(self, include_result: bool = True) -> StageStatus:
+        state: StageStatus = {
+            "status": self.status,
+            "details": self.details,
+            "error": self.error
+        }
+        if include_result:
+            state["result"] = to_plain(self.result)
+        return state
+
+
+class PipelineRun:
+    """一次流水线运行：持有本次运行的上下文和各服务状态，服务实例本身不保存运行状态"""
+    __slots__ = ("id", "context", "states", "status", "created_at", "finished_at", "events")
+
+    def __init__(
+        self,
+        initial_context: Optional[Dict[str, Any]] = None,
+        run_id: Optional[str] = None,
+        with_events: bool = False
+    ):
+        self.id = run_id or uuid.uuid4().hex
+        self.context: PipelineContext = dict(initial_context or {})
+        # 服务状态在第一次被访问时创建
+        self.states: Dict[str, ServiceState] = {}
+        self.status = "pending"
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        # 只有需要推送进度的运行才创建事件总线
+        self.events: Optional[RunEventBus] = RunEventBus() if with_events else None
+
+    def publish(self, event: Dict[str, Any]):
+        if self.events is not None:
+            self.events.publish(event)
+
+    def state_for(self, service_name: str) -> ServiceState:
+        state = self.states.get(service_name)
+        if state is None:
+            state = self.states[service_name] = ServiceState()
+        return state
+
+    def get_status(self, service_name: str, include_result: bool = True) -> StageStatus:
+        state = self.states.get(service_name) or ServiceState()
+        return state.as_dict(include_result)
+
+    def get_all_status(self, service_names: Iterable[str], include_result: bool = True) -> Dict[str, StageStatus]:
+        return {name: self.get_status(name, include_result) for name in service_names}
+
+
+class PipelineObserver:
+    """流水线观察者，ServiceManager 在每个阶段和每次运行结束时回调，默认不做任何事。
+
+    回调在流水线的协程中同步执行，实现应保持轻量（例如只更新指标）。
+    """
+
+    def stage_finished(self, stage: str, outcome: str, duration: float):
+        """outcome 为 completed、cached、restored 或 error"""
+
+    def run_finished(self, run: PipelineRun, duration: float):
+        pass
+
+
+# 当前协程所属的运行，asyncio 任务创建时会复制该上下文
+current_run: ContextVar[Optional[PipelineRun]] = ContextVar("current_run", default=None)
@@ -1,11 +1,24 @@
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 from .base_service import BaseService
+from .models import ReasoningResult
 
 
 class ReasoningService(BaseService):
     """推理阶段服务，负责分析用户输入和理解任务需求"""
     
-    async def execute(self, context: Dict[str, Any]) -> Dict[str, Any]:
+    name = "reasoning"
+    
+    def get_cache_inputs(self, context: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        # 推理结果只取决于最后一条用户消息
+        user_message = next(
+            (msg for msg in reversed(context.get("messages", [])) if msg["role"] == "user"),
+            None
+        )
+        if user_message is None:
+            return None
+        return {"user_message": user_message["content"]}
+    
+    async def execute(self, context: Dict[str, Any]) -> ReasoningResult:
         try:
             self.set_status("running", "正在分析用户输入...")
             
@@ -29,12 +42,12 @@ class ReasoningService(BaseService):
             # 例如：使用 LLM 分析用户意图、提取关键信息等
             
             # 模拟分析结果
-            analysis_result = {
-                "intent": "task_execution",
-                "key_points": ["point1", "point2"],
-                "requirements": ["req1", "req2"],
-                "constraints": ["constraint1", "constraint2"]
-            }
+            analysis_result = ReasoningResult(
+                intent="task_execution",
+                key_points=["point1", "point2"],
+                requirements=["req1", "req2"],
+                constraints=["constraint1", "constraint2"]
+            )
             
             self.set_status("completed", "已完成用户输入分析")
             self.set_result(analysis_result)
@@ -0,0 +1,63 @@
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+
+class _End:
+    __slots__ = ("error",)
+
+    def __init__(self, error: Optional[BaseException]):
+        self.error = error
+
+
+class UpstreamFailed(Exception):
+    """上游阶段失败，流提前结束"""
+
+
+class ResultStream:
+    """相邻阶段之间传递逐个子任务结果的单消费者异步流。
+
+    上游每产生一个结果就 put，结束时 close；上游失败时 close(error)，
+    下游迭代到结尾会抛出 UpstreamFailed。
+    """
+
+    def __init__(self):
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self.closed = False
+
+    def put(self, item: Dict[str, Any]):
+        if self.closed:
+            raise RuntimeError("结果流已关闭")
+        self._queue.put_nowait(item)
+
+    def close(self, error: Optional[BaseException] = None):
+        if self.closed:
+            return
+        self.closed = True
+        self._queue.put_nowait(_End(error))
+
+    def drain_nowait(self) -> List[Dict[str, Any]]:
+        """取出当前已到达的全部结果，不等待；遇到结束标记时放回队列"""
+        items = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if isinstance(item, _End):
+                self._queue.put_nowait(item)
+                break
+            items.append(item)
+        return items
+
+    async def batches(self) -> AsyncIterator[List[Dict[str, Any]]]:
+        """至少等到一个结果，再连同已到达的其余结果一起产出，便于下游按批处理"""
+        async for item in self:
+            yield [item, *self.drain_nowait()]
+
+    async def __aiter__(self) -> AsyncIterator[Dict[str, Any]]:
+        while True:
+            item = await self._queue.get()
+            if isinstance(item, _End):
+                # 结束标记留在队列中，重复迭代也会立即结束
+                self._queue.put_nowait(item)
+                if item.error is not None:
+                    raise UpstreamFailed(f"上游阶段失败: {item.error}") from item.error
+                return
+            yield item
@@ -1,5 +1,14 @@
-from typing import Any, Dict, List
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
 from .base_service import BaseService
+from .batching import SubtaskBatcher
+from .history import HistoryManager
+from .models import RESULT_MODELS, PipelineContext, StageModel, StageStatus, context_from_dict, context_to_dict
+from .pipeline_run import PipelineObserver, PipelineRun, current_run
+from .result_stream import ResultStream
+from .stage_store import InMemoryStageStore, StageStore
 from .reasoning_service import ReasoningService
 from .decomposition_service import DecompositionService
 from .analysis_service import AnalysisService
@@ -8,60 +17,274 @@ from .evaluation_service import EvaluationService
 from .summary_service import SummaryService
 
 class ServiceManager:
-    """服务管理器，负责协调各个服务的执行"""
-    
-    def __init__(self):
+    """服务管理器，负责协调各个服务的执行。
+
+    服务实例在所有运行间共享，每次运行的上下文和服务状态保存在独立的
+    PipelineRun 中，因此同一个管理器可以并发处理多个请求。
+
+    各阶段结果按输入内容缓存在 stage_store 中，相同输入不会重复计算；
+    每个阶段成功后保存检查点，失败的运行可以通过 resume 从上次成功的阶段继续。
+    阶段耗时和结果通过 observer 上报（例如写入 /metrics）。
+    执行前由 history 把上下文中的对话历史压缩到模型的 token 预算以内。
+    配置 batcher 后，分析和评估阶段按批次而不是按子任务调用模型。
+    execution_parallelism 限制执行阶段同时执行的子任务数。
+
+    相邻的流式阶段（执行 -> 评估 -> 总结）并发运行，通过 ResultStream 逐个传递子任务结果，
+    每个子任务的评估在其执行完成后立即开始，而不必等待整个阶段结束。
+    """
+
+    def __init__(
+        self,
+        max_finished_runs: int = 100,
+        stage_store: Optional[StageStore] = None,
+        observer: Optional[PipelineObserver] = None,
+        history: Optional[HistoryManager] = None,
+        batcher: Optional[SubtaskBatcher] = None,
+        stream_stages: bool = True,
+        execution_parallelism: int = 4
+    ):
         self.services: Dict[str, BaseService] = {
             "reasoning": ReasoningService(),
             "decomposition": DecompositionService(),
-            "analysis": AnalysisService(),
-            "execution": ExecutionService(),
-            "evaluation": EvaluationService(),
+            "analysis": AnalysisService(batcher),
+            "execution": ExecutionService(execution_parallelism),
+            "evaluation": EvaluationService(batcher),
             "summary": SummaryService()
         }
-        self.context: Dict[str, Any] = {}
-    
-    async def execute_all(self, initial_context: Dict[str, Any]) -> Dict[str, Any]:
-        """按顺序执行所有服务"""
+        # 正在执行的运行，以及最近结束的运行（便于结束后查询状态）
+        self.active_runs: Dict[str, PipelineRun] = {}
+        self.finished_runs: "OrderedDict[str, PipelineRun]" = OrderedDict()
+        self.max_finished_runs = max_finished_runs
+        self.stage_store: StageStore = stage_store or InMemoryStageStore()
+        self.observer = observer or PipelineObserver()
+        self.history = history or HistoryManager(store=self.stage_store)
+        self.stream_stages = stream_stages
+
+    def create_run(
+        self,
+        initial_context: PipelineContext,
+        run_id: Optional[str] = None,
+        with_events: bool = False
+    ) -> PipelineRun:
+        """创建一次运行，可在 execute_all 之前拿到 run id；with_events 为 True 时可订阅进度事件"""
+        return PipelineRun(initial_context, run_id, with_events)
+
+    def _finish_run(self, run: PipelineRun, started: float):
+        run.finished_at = time.time()
+        self.observer.run_finished(run, time.perf_counter() - started)
+        run.publish({"type": "run", "status": run.status})
+        if run.events is not None:
+            run.events.close()
+        self.active_runs.pop(run.id, None)
+        self.finished_runs[run.id] = run
+        while len(self.finished_runs) > self.max_finished_runs:
+            self.finished_runs.popitem(last=False)
+
+    async def execute_all(
+        self,
+        initial_context: PipelineContext,
+        run: Optional[PipelineRun] = None,
+        lean: bool = False
+    ) -> Dict[str, Any]:
+        """按顺序执行所有服务。
+
+        返回 {阶段名: {"status": StageStatus, "result": 阶段结果的 dict 形式}}，状态中不再重复包含结果；
+        lean 为 True 时只有最后一个阶段（总结）带 result，其余阶段只返回状态。
+        """
+        run = run or self.create_run(initial_context)
+        self.active_runs[run.id] = run
+        run.status = "running"
+        started = time.perf_counter()
+        token = current_run.set(run)
+        results = {}
         try:
-            self.context = initial_context.copy()
-            results = {}
-            
-            # 按顺序执行各个服务
-            for service_name, service in self.services.items():
-                # 执行服务
-                result = await service.execute(self.context)
-                
-                # 更新上下文
-                self.context[f"{service_name}_result"] = result
-                results[service_name] = {
-                    "status": service.get_status(),
-                    "result": result
-                }
-                
+            if run.context.get("messages"):
+                run.context["messages"] = await self.history.compact(run.context["messages"], run.context.get("model"))
+
+            # 按顺序执行各个服务，相邻的流式阶段作为一组并发执行
+            stages = list(self.services.items())
+            index = 0
+            while index < len(stages):
+                group = self._stage_group(stages, index)
+                index += len(group)
+                if len(group) > 1:
+                    group_results = await self._execute_streaming_group(group, run)
+                else:
+                    service_name, service = group[0]
+                    result_key = f"{service_name}_result"
+                    if result_key in run.context:
+                        # 从检查点恢复的阶段不再执行
+                        result = self._restore_stage(service, run)
+                    else:
+                        result = await self._execute_stage(service, run)
+
+                    # 更新上下文并保存检查点
+                    run.context[result_key] = result
+                    await self._save_checkpoint(run)
+                    group_results = [result]
+
+                for (service_name, service), result in zip(group, group_results):
+                    results[service_name] = {"status": service.get_status(include_result=False)}
+                    if not lean or service_name == stages[-1][0]:
+                        results[service_name]["result"] = result.to_dict()
+
                 # 如果服务执行失败，停止后续服务
-                if service.status == "error":
+                if any(service.status == "error" for _, service in group):
+                    run.status = "error"
                     break
-            
+            else:
+                run.status = "completed"
+
             return results
-            
+
         except Exception as e:
+            run.status = "error"
             # 发生错误时，返回所有已执行服务的结果
             return {
                 "error": str(e),
                 "results": results
             }
-    
-    def get_service_status(self, service_name: str) -> Dict[str, Any]:
-        """获取指定服务的状态"""
+        finally:
+            current_run.reset(token)
+            self._finish_run(run, started)
+
+    def _stage_group(self, stages: List[Tuple[str, BaseService]], index: int) -> List[Tuple[str, BaseService]]:
+        """从 index 开始，产出流的阶段与其后能消费流的阶段连成一组"""
+        group = [stages[index]]
+        if not self.stream_stages:
+            return group
+        while (
+            index + len(group) < len(stages)
+            and group[-1][1].produces_stream
+            and stages[index + len(group)][1].consumes_stream
+        ):
+            group.append(stages[index + len(group)])
+        return group
+
+    def _restore_stage(self, service: BaseService, run: PipelineRun) -> StageModel:
+        result = run.context[f"{service.name}_result"]
+        service.set_status("completed", "已从检查点恢复")
+        service.set_result(result)
+        self.observer.stage_finished(service.name, "restored", 0.0)
+        return result
+
+    async def _execute_streaming_group(self, group: List[Tuple[str, BaseService]], run: PipelineRun) -> List[StageModel]:
+        """并发执行一组流式阶段，每个阶段消费前一个阶段的输出流。
+
+        阶段在把结果写入上下文后才关闭自己的输出流，因此下游读到流结束时可以直接使用上游的完整结果。
+        这些阶段的输入在开始时尚未确定，不参与阶段缓存。
+        """
+        streams = [ResultStream() for _ in group]
+
+        async def run_stage(position: int, service: BaseService) -> StageModel:
+            upstream = streams[position - 1] if position > 0 else None
+            output = streams[position]
+            started = time.perf_counter()
+            try:
+                if f"{service.name}_result" in run.context:
+                    result = self._restore_stage(service, run)
+                    if upstream is not None:
+                        async for _ in upstream:
+                            pass
+                    for item in service.stream_items(result):
+                        output.put(item)
+                else:
+                    try:
+                        result = await service.execute_streaming(run.context, upstream, output.put)
+                    except Exception:
+                        self.observer.stage_finished(service.name, "error", time.perf_counter() - started)
+                        raise
+                    outcome = "error" if service.status == "error" else "completed"
+                    self.observer.stage_finished(service.name, outcome, time.perf_counter() - started)
+                run.context[f"{service.name}_result"] = result
+                await self._save_checkpoint(run)
+            except BaseException as e:
+                output.close(e)
+                raise
+            output.close()
+            return result
+
+        tasks = [asyncio.create_task(run_stage(position, service)) for position, (_, service) in enumerate(group)]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            # 下游的失败由上游失败引起，优先抛出最靠前阶段的异常
+            for task in tasks:
+                if task in done and task.exception() is not None:
+                    raise task.exception()
+            return [task.result() for task in tasks]
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _execute_stage(self, service: BaseService, run: PipelineRun) -> StageModel:
+        """执行单个阶段，输入相同时直接复用缓存的结果"""
+        started = time.perf_counter()
+        cache_key = service.cache_key(run.context)
+        if cache_key is not None:
+            cached = await self.stage_store.get(cache_key)
+            if cached is not None:
+                cached = RESULT_MODELS[f"{service.name}_result"].from_dict(cached)
+                service.set_status("completed", "已复用缓存结果")
+                service.set_result(cached)
+                self.observer.stage_finished(service.name, "cached", time.perf_counter() - started)
+                return cached
+
+        try:
+            result = await service.execute(run.context)
+        except Exception:
+            self.observer.stage_finished(service.name, "error", time.perf_counter() - started)
+            raise
+        outcome = "error" if service.status == "error" else "completed"
+        self.observer.stage_finished(service.name, outcome, time.perf_counter() - started)
+        if outcome == "completed" and cache_key is not None:
+            await self.stage_store.set(cache_key, result.to_dict())
+        return result
+
+    @staticmethod
+    def _checkpoint_key(run_id: str) -> str:
+        return f"checkpoint:{run_id}"
+
+    async def _save_checkpoint(self, run: PipelineRun):
+        await self.stage_store.set(self._checkpoint_key(run.id), context_to_dict(run.context))
+
+    async def resume(self, run_id: str, with_events: bool = False) -> PipelineRun:
+        """从检查点重建运行：已成功的阶段结果保留在上下文中，execute_all 只会执行剩余阶段"""
+        if run_id in self.active_runs:
+            raise ValueError(f"运行 {run_id} 仍在执行")
+        finished = self.finished_runs.get(run_id)
+        if finished is not None:
+            context = finished.context
+        else:
+            stored = await self.stage_store.get(self._checkpoint_key(run_id))
+            if stored is None:
+                raise ValueError(f"运行 {run_id} 没有可用的检查点")
+            context = context_from_dict(stored)
+        return self.create_run(context, run_id, with_events)
+
+    def get_run(self, run_id: str) -> PipelineRun:
+        """按 id 获取正在执行或最近结束的运行"""
+        run = self.active_runs.get(run_id) or self.finished_runs.get(run_id)
+        if run is None:
+            raise ValueError(f"运行 {run_id} 不存在")
+        return run
+
+    def list_active_runs(self) -> List[str]:
+        return list(self.active_runs)
+
+    def get_service_status(self, service_name: str, run_id: Optional[str] = None) -> StageStatus:
+        """获取指定服务的状态，指定 run_id 时返回该次运行中的状态"""
         service = self.services.get(service_name)
         if not service:
             raise ValueError(f"服务 {service_name} 不存在")
+        if run_id is not None:
+            return self.get_run(run_id).get_status(service_name)
         return service.get_status()
-    
-    def get_all_status(self) -> Dict[str, Dict[str, Any]]:
-        """获取所有服务的状态"""
+
+    def get_all_status(self, run_id: Optional[str] = None) -> Dict[str, StageStatus]:
+        """获取所有服务的状态，指定 run_id 时返回该次运行中的状态"""
+        if run_id is not None:
+            return self.get_run(run_id).get_all_status(self.services)
         return {
             name: service.get_status()
             for name, service in self.services.items()
-        } 
\ No newline at end of file
+        }
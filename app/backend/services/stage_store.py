@@ -0,0 +1,48 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Protocol, Tuple
+
+
+class StageStore(Protocol):
+    """阶段结果和检查点的存储接口，值需可 JSON 序列化"""
+
+    async def get(self, key: str) -> Optional[Any]:
+        ...
+
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        ...
+
+
+def hash_inputs(inputs: Dict[str, Any]) -> str:
+    """对阶段输入做稳定序列化后取 sha256"""
+    payload = json.dumps(inputs, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class InMemoryStageStore:
+    """进程内的阶段存储，按条目数做 LRU 淘汰"""
+
+    def __init__(self, max_entries: int = 1024, ttl: int = 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        payload, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return json.loads(payload)
+
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        # 存储序列化后的副本，避免调用方后续修改结果影响缓存
+        self._data[key] = (json.dumps(value, ensure_ascii=False, default=str), time.monotonic() + (ttl or self.ttl))
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
@@ -1,51 +1,138 @@
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, List, Optional
 from .base_service import BaseService
+from .models import DecompositionResult, EvaluationResult, ExecutionResult, SubtaskEvaluation, SummaryResult
+from .result_stream import ResultStream
+
+class SummaryAggregate:
+    """逐条累加子任务评估，结束时得到与 overall_metrics 一致的平均分"""
+    __slots__ = ("count", "success_rate", "performance_score", "quality_score")
+
+    def __init__(self):
+        self.count = 0
+        self.success_rate = 0.0
+        self.performance_score = 0.0
+        self.quality_score = 0.0
+
+    def add(self, evaluation: SubtaskEvaluation):
+        self.count += 1
+        self.success_rate += evaluation.success_rate
+        self.performance_score += evaluation.performance_score
+        self.quality_score += evaluation.quality_score
+
+    def performance_summary(self) -> Dict[str, float]:
+        def average(total: float) -> float:
+            return round(total / self.count, 4) if self.count else 0.0
+        return {
+            "success_rate": average(self.success_rate),
+            "performance_score": average(self.performance_score),
+            "quality_score": average(self.quality_score)
+        }
 
 class SummaryService(BaseService):
-    """输出总结服务，负责生成任务执行总结和后续建议"""
+    """输出总结服务，负责生成任务执行总结和后续建议。
+
+    流式执行时边接收子任务评估边累加指标，评估结束后只需组装最终总结。
+    """
+    
+    name = "summary"
+    cache_inputs = (
+        "reasoning_result",
+        "decomposition_result",
+        "analysis_result",
+        "execution_result",
+        "evaluation_result"
+    )
+    consumes_stream = True
     
-    async def execute(self, context: Dict[str, Any]) -> Dict[str, Any]:
+    @staticmethod
+    def build_summary(
+        decomposition_result: DecompositionResult,
+        execution_result: ExecutionResult,
+        evaluation_result: EvaluationResult,
+        performance_summary: Dict[str, Any]
+    ) -> SummaryResult:
+        # TODO: 在这里实现实际的总结生成逻辑
+        # 例如：使用 LLM 生成总结报告、分析关键发现等
+        
+        # 模拟总结结果
+        return SummaryResult(
+            execution_summary={
+                "total_tasks": decomposition_result.total_tasks,
+                "total_time": execution_result.total_execution_time,
+                "overall_status": execution_result.overall_status
+            },
+            performance_summary=performance_summary,
+            key_findings=[
+                "发现1",
+                "发现2",
+                "发现3"
+            ],
+            recommendations=evaluation_result.recommendations,
+            next_steps=[
+                "下一步1",
+                "下一步2"
+            ]
+        )
+    
+    @staticmethod
+    def _require_results(context: Dict[str, Any]):
+        results = [context.get(f"{name}_result") for name in ("reasoning", "decomposition", "analysis", "execution", "evaluation")]
+        if not all(results):
+            raise ValueError("缺少某些阶段的结果")
+    
+    async def execute_streaming(
+        self,
+        context: Dict[str, Any],
+        upstream: Optional[ResultStream],
+        emit: Callable[[SummaryResult], None]
+    ) -> SummaryResult:
+        if upstream is None:
+            return await super().execute_streaming(context, upstream, emit)
+        try:
+            self.set_status("running", "正在汇总评估结果...")
+            
+            aggregate = SummaryAggregate()
+            async for evaluation in upstream:
+                aggregate.add(evaluation)
+            
+            # 上游流结束时前面各阶段的结果都已写入上下文
+            self._require_results(context)
+            summary_result = self.build_summary(
+                context["decomposition_result"],
+                context["execution_result"],
+                context["evaluation_result"],
+                aggregate.performance_summary()
+            )
+            
+            self.set_status("completed", "已完成总结生成")
+            self.set_result(summary_result)
+            
+            return summary_result
+            
+        except Exception as e:
+            self.set_error(f"总结生成阶段发生错误: {str(e)}")
+            raise
+    
+    async def execute(self, context: Dict[str, Any]) -> SummaryResult:
         try:
             self.set_status("running", "正在生成总结...")
             
             # 获取所有阶段的结果
-            reasoning_result = context.get("reasoning_result")
-            decomposition_result = context.get("decomposition_result")
-            analysis_result = context.get("analysis_result")
-            execution_result = context.get("execution_result")
-            evaluation_result = context.get("evaluation_result")
-            
-            if not all([reasoning_result, decomposition_result, analysis_result, 
-                       execution_result, evaluation_result]):
-                raise ValueError("缺少某些阶段的结果")
+            self._require_results(context)
+            evaluation_result = context["evaluation_result"]
+            overall_metrics = evaluation_result.overall_metrics
             
             # 生成总结
-            # TODO: 在这里实现实际的总结生成逻辑
-            # 例如：使用 LLM 生成总结报告、分析关键发现等
-            
-            # 模拟总结结果
-            summary_result = {
-                "execution_summary": {
-                    "total_tasks": decomposition_result["total_tasks"],
-                    "total_time": execution_result["total_execution_time"],
-                    "overall_status": execution_result["overall_status"]
-                },
-                "performance_summary": {
-                    "success_rate": evaluation_result["overall_metrics"]["average_success_rate"],
-                    "performance_score": evaluation_result["overall_metrics"]["average_performance_score"],
-                    "quality_score": evaluation_result["overall_metrics"]["average_quality_score"]
-                },
-                "key_findings": [
-                    "发现1",
-                    "发现2",
-                    "发现3"
-                ],
-                "recommendations": evaluation_result["recommendations"],
-                "next_steps": [
-                    "下一步1",
-                    "下一步2"
-                ]
-            }
+            summary_result = self.build_summary(
+                context["decomposition_result"],
+                context["execution_result"],
+                evaluation_result,
+                {
+                    "success_rate": overall_metrics["average_success_rate"],
+                    "performance_score": overall_metrics["average_performance_score"],
+                    "quality_score": overall_metrics["average_quality_score"]
+                }
+            )
             
             self.set_status("completed", "已完成总结生成")
             self.set_result(summary_result)
@@ -0,0 +1,182 @@
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from .env import apply_env_overrides
+from .metrics import Family
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # 未安装 redis 时只使用进程内缓存
+    aioredis = None
+
+
+@dataclass
+class CacheConfig:
+    """两级缓存配置"""
+    enabled: bool = True
+    redis_url: Optional[str] = None
+    key_prefix: str = "creation:"
+    ttl: int = 3600
+    local_max_entries: int = 1024
+    local_max_bytes: int = 64 * 1024 * 1024
+    max_value_bytes: int = 1024 * 1024
+
+    @classmethod
+    def from_env(cls, prefix: str = "CACHE_") -> "CacheConfig":
+        config = apply_env_overrides(cls(), prefix)
+        config.redis_url = config.redis_url or os.getenv("REDIS_URL")
+        return config
+
+
+def make_cache_key(parts: Dict[str, Any]) -> str:
+    """对参与缓存的字段做稳定序列化后取 sha256"""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class LRUCache:
+    """进程内 LRU 缓存，按条目数和总字节数限制大小，每个条目带过期时间"""
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self._data: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            self.delete(key)
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: str, ttl: float):
+        self.delete(key)
+        self._data[key] = (value, time.monotonic() + ttl)
+        self.size_bytes += len(value)
+        while self._data and (len(self._data) > self.max_entries or self.size_bytes > self.max_bytes):
+            _, (evicted, _) = self._data.popitem(last=False)
+            self.size_bytes -= len(evicted)
+
+    def delete(self, key: str):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.size_bytes -= len(entry[0])
+
+    def clear(self):
+        self._data.clear()
+        self.size_bytes = 0
+
+
+class TwoTierCache:
+    """进程内 LRU 在前、Redis 在后的两级缓存，值以 JSON 存储。
+
+    Redis 不可用时自动退化为仅使用进程内缓存，缓存错误不会影响请求本身。
+    """
+
+    def __init__(self, config: CacheConfig, namespace: str):
+        self.config = config
+        self.namespace = namespace
+        self.local = LRUCache(config.local_max_entries, config.local_max_bytes)
+        self._redis = None
+        self.counters: Dict[str, int] = {
+            "local_hits": 0,
+            "redis_hits": 0,
+            "misses": 0,
+            "sets": 0,
+            "errors": 0
+        }
+
+    async def start(self):
+        if not self.config.enabled or not self.config.redis_url:
+            return
+        if aioredis is None:
+            print("Warning: redis package is not installed, falling back to in-process cache")
+            return
+        self._redis = aioredis.from_url(
+            self.config.redis_url,
+            socket_connect_timeout=1,
+            socket_timeout=1
+        )
+
+    async def aclose(self):
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+    def _redis_key(self, key: str) -> str:
+        return f"{self.config.key_prefix}{self.namespace}:{key}"
+
+    async def get(self, key: str) -> Optional[Any]:
+        if not self.config.enabled:
+            return None
+        value = self.local.get(key)
+        if value is not None:
+            self.counters["local_hits"] += 1
+            return json.loads(value)
+        if self._redis is not None:
+            try:
+                raw = await self._redis.get(self._redis_key(key))
+            except Exception:
+                self.counters["errors"] += 1
+                raw = None
+            if raw is not None:
+                self.counters["redis_hits"] += 1
+                value = raw.decode() if isinstance(raw, bytes) else raw
+                self.local.set(key, value, self.config.ttl)
+                return json.loads(value)
+        self.counters["misses"] += 1
+        return None
+
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        if not self.config.enabled:
+            return
+        payload = json.dumps(value, ensure_ascii=False, default=str)
+        if len(payload) > self.config.max_value_bytes:
+            return
+        ttl = ttl or self.config.ttl
+        self.local.set(key, payload, ttl)
+        self.counters["sets"] += 1
+        if self._redis is not None:
+            try:
+                await self._redis.set(self._redis_key(key), payload, ex=ttl)
+            except Exception:
+                self.counters["errors"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.counters["local_hits"] + self.counters["redis_hits"]
+        lookups = hits + self.counters["misses"]
+        return {
+            **self.counters,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+            "local_entries": len(self.local),
+            "local_bytes": self.local.size_bytes,
+            "redis": self._redis is not None
+        }
+
+    def collect(self) -> List[Family]:
+        """供 MetricsRegistry 在抓取时读取命中率等计数"""
+        labels = {"cache": self.namespace}
+        stats = self.stats()
+        return [
+            ("cache_hits_total", "counter", "Cache hits by tier", [
+                ({**labels, "tier": "local"}, stats["local_hits"]),
+                ({**labels, "tier": "redis"}, stats["redis_hits"])
+            ]),
+            ("cache_misses_total", "counter", "Cache misses", [(labels, stats["misses"])]),
+            ("cache_errors_total", "counter", "Cache backend errors", [(labels, stats["errors"])]),
+            ("cache_hit_ratio", "gauge", "Cache hit ratio since start", [(labels, stats["hit_ratio"])]),
+            ("cache_local_bytes", "gauge", "Bytes held by the in-process cache tier", [(labels, stats["local_bytes"])])
+        ]
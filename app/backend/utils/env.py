@@ -0,0 +1,19 @@
+import os
+from typing import TypeVar
+
+T = TypeVar("T")
+
+
+def apply_env_overrides(config: T, prefix: str) -> T:
+    """用环境变量覆盖 dataclass 配置字段，变量名为前缀加大写字段名"""
+    for name, default in vars(config).items():
+        value = os.getenv(f"{prefix}{name.upper()}")
+        if value is None:
+            continue
+        if isinstance(default, bool):
+            setattr(config, name, value.strip().lower() in ("1", "true", "yes", "on"))
+        elif isinstance(default, (int, float)):
+            setattr(config, name, type(default)(value))
+        elif default is None or isinstance(default, str):
+            setattr(config, name, value)
+    return config
@@ -1,11 +1,21 @@
-from dataclasses import dataclass
-from typing import Dict, List
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
 
 @dataclass
 class ModelConfig:
     base_url: str
     model_name: str
     api_key: str
+    # Extra OpenAI-compatible replicas serving the same model
+    replica_urls: List[str] = field(default_factory=list)
+    # Model id to route to when no replica of this model is healthy
+    fallback: Optional[str] = None
+    # Reasoning model that thinks in <think>...</think> before answering
+    reasoning: bool = False
+
+    @property
+    def endpoints(self) -> List[str]:
+        return [self.base_url, *self.replica_urls]
 
 # Available models configuration
 AVAILABLE_MODELS: Dict[str, ModelConfig] = {
@@ -17,7 +27,9 @@ AVAILABLE_MODELS: Dict[str, ModelConfig] = {
     "deepseek-r1": ModelConfig(
         base_url="http://10.4.33.15:80/v1/",
         model_name="inarikami/DeepSeek-R1-Distill-Qwen-32B-AWQ",
-        api_key="123"
+        api_key="123",
+        fallback="qwen-qwq",
+        reasoning=True
     ),
     "llama-33": ModelConfig(
         base_url="http://10.4.33.13:80/v1",
@@ -27,7 +39,8 @@ AVAILABLE_MODELS: Dict[str, ModelConfig] = {
     "qwen-qwq": ModelConfig(
         base_url="http://10.2.3.50:11434/v1",
         model_name="qwq:latest",
-        api_key="123"
+        api_key="123",
+        reasoning=True
     )
 }
 
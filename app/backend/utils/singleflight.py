@@ -0,0 +1,49 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict
+
+
+@dataclass
+class _Call:
+    task: asyncio.Future
+    waiters: int = 0
+
+
+class SingleFlight:
+    """合并并发的相同请求：同一 key 同时只有一个上游调用，所有等待者共享结果或异常。
+
+    上游调用在独立任务中运行，单个等待者（包括发起者）断开不会取消它；
+    只有当所有等待者都取消时，上游调用才会被取消。
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self.counters: Dict[str, int] = {"leaders": 0, "followers": 0}
+
+    def _forget(self, key: str, call: _Call, task: asyncio.Future):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        # 标记异常已被读取，避免无人等待时出现 "exception was never retrieved"
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda task: self._forget(key, call, task))
+            self.counters["leaders"] += 1
+        else:
+            self.counters["followers"] += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+
+    def in_flight(self) -> int:
+        return len(self._calls)
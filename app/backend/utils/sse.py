@@ -0,0 +1,14 @@
+import json
+from typing import Any
+
+
+def sse_event(event: str, data: Any) -> str:
+    """将数据编码为一条 Server-Sent Events 消息"""
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no"
+}
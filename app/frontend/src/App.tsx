@@ -16,7 +16,6 @@ import {
   Tab,
 } from '@mui/material';
 import SendIcon from '@mui/icons-material/Send';
-import axios from 'axios';
 import FlowChart from './components/FlowChart';
 
 interface Message {
@@ -32,8 +31,45 @@ interface ExecutionStep {
   details?: string;
 }
 
+interface ChatResponse {
+  message: string;
+  steps: ExecutionStep[];
+  run_id?: string;
+}
+
 const API_URL = 'http://localhost:8000';
 
+// 读取 Server-Sent Events 响应流，每解析出一条事件调用一次 onEvent
+const readEventStream = async (
+  response: Response,
+  onEvent: (event: string, data: any) => void
+) => {
+  if (!response.body) return;
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary = buffer.indexOf('\n\n');
+    while (boundary !== -1) {
+      const raw = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      let event = 'message';
+      let data = '';
+      raw.split('\n').forEach((line) => {
+        if (line.startsWith('event: ')) event = line.slice(7);
+        else if (line.startsWith('data: ')) data += line.slice(6);
+      });
+      if (data) onEvent(event, JSON.parse(data));
+      boundary = buffer.indexOf('\n\n');
+    }
+  }
+};
+
 function App() {
   const [messages, setMessages] = useState<Message[]>([]);
   const [input, setInput] = useState('');
@@ -54,17 +90,40 @@ function App() {
     setLoading(true);
 
     try {
-      const response = await axios.post(`${API_URL}/api/chat`, {
-        messages: [...messages, userMessage],
+      const response = await fetch(`${API_URL}/api/chat/stream`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ messages: [...messages, userMessage] }),
+      });
+      if (!response.ok) {
+        throw new Error(`HTTP ${response.status}`);
+      }
+
+      // 实时更新各步骤状态，最后一条事件为完整的回复
+      let finalResponse: ChatResponse | null = null;
+      await readEventStream(response, (event, data) => {
+        if (event === 'run') {
+          setSteps(data.steps);
+        } else if (event === 'step') {
+          setSteps((prev) => prev.map((step) => (step.id === data.id ? data : step)));
+        } else if (event === 'done') {
+          finalResponse = data;
+        } else if (event === 'error') {
+          throw new Error(data.detail);
+        }
       });
+      if (!finalResponse) {
+        throw new Error('Stream ended without a response');
+      }
+      const { message, steps: finalSteps } = finalResponse as ChatResponse;
 
       const assistantMessage: Message = {
         role: 'assistant',
-        content: response.data.message,
+        content: message,
       };
 
       setMessages((prev) => [...prev, assistantMessage]);
-      setSteps(response.data.steps);
+      setSteps(finalSteps);
     } catch (error) {
       console.error('Error sending message:', error);
       const errorMessage: Message = {
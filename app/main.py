@@ -1,13 +1,189 @@
+from contextlib import aclosing, asynccontextmanager
+import asyncio
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Any, Dict, Optional, List
+from dataclasses import asdict
 import docker
 import os
-from openai import OpenAI
-from backend.models import AVAILABLE_MODELS, DEFAULT_MODEL
+import time
+from backend.jobs import JobQueueConfig, JobWorker, QueueFull, create_job_queue, sandbox_handler
+from backend.llm import (
+    ClientPoolConfig,
+    CodeExtractor,
+    LLMClientRegistry,
+    ModelRouter,
+    NoHealthyEndpoint,
+    RouterConfig,
+    TokenBudget,
+    TokenBudgetConfig
+)
+from backend.sandbox import (
+    AdmissionConfig,
+    Allocation,
+    BackendPolicyConfig,
+    ContainerPoolConfig,
+    ExecResult,
+    ImageBuilder,
+    ImageBuilderConfig,
+    ProcessSandbox,
+    ProcessSandboxConfig,
+    SandboxBackend,
+    SandboxExecutor,
+    SandboxLimits,
+    ResourceConfig,
+    SandboxPoolManager,
+    SandboxRouter,
+    SandboxSaturated,
+    parse_resources
+)
+from backend.utils.cache import CacheConfig, TwoTierCache, make_cache_key
+from backend.utils.metrics import CONTENT_TYPE, REGISTRY
+from backend.utils.models import AVAILABLE_MODELS, DEFAULT_MODEL
+from backend.utils.singleflight import SingleFlight
+from backend.utils.sse import SSE_HEADERS, sse_event
+
+# Long-lived async LLM clients, one connection pool per model endpoint
+llm_clients = LLMClientRegistry(AVAILABLE_MODELS, ClientPoolConfig.from_env())
+
+# Latency-aware routing across model replicas with circuit breaking and fallback
+model_router = ModelRouter(AVAILABLE_MODELS, llm_clients, RouterConfig.from_env())
+
+# max_tokens per model and language from the lengths of recent outputs
+token_budget = TokenBudget(TokenBudgetConfig.from_env())
+
+# In-process LRU in front of Redis for /generate responses
+generate_cache = TwoTierCache(CacheConfig.from_env("GENERATE_CACHE_"), namespace="generate")
+
+# Opt-in cache of sandbox results, keyed by the code and the exact image and limits it ran with
+execute_cache = TwoTierCache(CacheConfig.from_env("EXECUTE_CACHE_"), namespace="execute")
+
+# Coalesce concurrent identical requests into one upstream call
+generate_flights = SingleFlight()
+execute_flights = SingleFlight()
+
+# Generation metrics by model id; endpoint-level latency is recorded by the router
+LLM_TIME_TO_FIRST_TOKEN = REGISTRY.histogram(
+    "llm_time_to_first_token_seconds",
+    "Time from request to the first streamed content token",
+    ("model",)
+)
+LLM_TOKENS_PER_SECOND = REGISTRY.histogram(
+    "llm_tokens_per_second",
+    "Completion tokens per second of generation time",
+    ("model",),
+    buckets=(1, 5, 10, 20, 40, 80, 160, 320, 640)
+)
+LLM_COMPLETION_TOKENS = REGISTRY.counter(
+    "llm_completion_tokens_total",
+    "Completion tokens generated",
+    ("model",)
+)
+
+def record_generation(model_id: str, completion_tokens: int, seconds: float):
+    if not completion_tokens:
+        return
+    LLM_COMPLETION_TOKENS.labels(model_id).inc(completion_tokens)
+    if seconds > 0:
+        LLM_TOKENS_PER_SECOND.labels(model_id).observe(completion_tokens / seconds)
+
+def coalescing_metrics():
+    samples = [
+        (name, flights)
+        for name, flights in (("generate", generate_flights), ("execute", execute_flights))
+    ]
+    return [
+        ("coalesced_requests_total", "counter", "Requests that shared an in-flight upstream call",
+         [({"endpoint": name}, flights.counters["followers"]) for name, flights in samples]),
+        ("coalescing_in_flight", "gauge", "Distinct upstream calls currently in flight",
+         [({"endpoint": name}, flights.in_flight()) for name, flights in samples])
+    ]
+
+REGISTRY.add_collector(model_router.collect)
+REGISTRY.add_collector(token_budget.collect)
+REGISTRY.add_collector(generate_cache.collect)
+REGISTRY.add_collector(execute_cache.collect)
+REGISTRY.add_collector(coalescing_metrics)
 
-app = FastAPI(title="Code Generation Platform")
+# Limits for /generate/batch
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+BATCH_MAX_CONCURRENCY_PER_MODEL = int(os.getenv("BATCH_MAX_CONCURRENCY_PER_MODEL", "4"))
+batch_limiters: Dict[str, asyncio.Semaphore] = {}
+
+# Asynchronous execution jobs; Redis-backed when REDIS_URL is set so workers can run on other hosts
+job_queue = create_job_queue(JobQueueConfig.from_env())
+# Upper bound for long-polling GET /jobs/{job_id}?wait=
+JOB_MAX_WAIT = float(os.getenv("JOB_MAX_WAIT", "30"))
+
+# Languages whose sandbox pools are pre-started at startup
+SANDBOX_WARM_LANGUAGES = [
+    language.strip()
+    for language in os.getenv("SANDBOX_WARM_LANGUAGES", "python").split(",")
+    if language.strip()
+]
+
+async def prebuild_sandbox_images():
+    try:
+        await asyncio.to_thread(sandbox_pools.prebuild_images, SANDBOX_WARM_LANGUAGES)
+    except Exception as e:
+        print(f"Warning: Could not prebuild sandbox images: {e}")
+
+async def sandbox_health_loop():
+    while True:
+        await asyncio.sleep(sandbox_pools.config.health_check_interval)
+        try:
+            await asyncio.to_thread(sandbox_pools.health_check)
+        except Exception as e:
+            print(f"Warning: sandbox pool health check failed: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await llm_clients.start()
+    await generate_cache.start()
+    await execute_cache.start()
+    await job_queue.start()
+    router_task = asyncio.create_task(model_router.run_health_checks())
+    health_task = None
+    prebuild_task = None
+    if process_sandbox is not None:
+        try:
+            await asyncio.to_thread(process_sandbox.start)
+        except Exception as e:
+            print(f"Warning: Could not start the process sandbox: {e}")
+            sandbox_router.remove(process_sandbox.name)
+    if sandbox_pools is not None:
+        try:
+            await asyncio.to_thread(sandbox_pools.warm_up, SANDBOX_WARM_LANGUAGES)
+        except Exception as e:
+            print(f"Warning: Could not warm up sandbox pools: {e}")
+        health_task = asyncio.create_task(sandbox_health_loop())
+        # Image builds can take minutes; serve requests on the base images meanwhile
+        prebuild_task = asyncio.create_task(prebuild_sandbox_images())
+    if job_worker is not None:
+        job_worker.start()
+    try:
+        yield
+    finally:
+        router_task.cancel()
+        if job_worker is not None:
+            await job_worker.stop()
+        if prebuild_task is not None:
+            prebuild_task.cancel()
+        if health_task is not None:
+            health_task.cancel()
+        await asyncio.to_thread(sandbox_executor.close)
+        if sandbox_pools is not None:
+            await asyncio.to_thread(sandbox_pools.close)
+        if process_sandbox is not None:
+            await asyncio.to_thread(process_sandbox.close)
+        await generate_cache.aclose()
+        await execute_cache.aclose()
+        await job_queue.aclose()
+        await llm_clients.aclose()
+
+app = FastAPI(title="Code Generation Platform", lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -26,21 +202,121 @@ except docker.errors.DockerException as e:
     print("Code execution in sandbox will be disabled")
     docker_client = None
 
+sandbox_limits = SandboxLimits.from_env()
+
+# Pre-started sandbox containers per language image, plus cached images with the
+# third-party packages generated code imports
+sandbox_pools = (
+    SandboxPoolManager(
+        docker_client,
+        ContainerPoolConfig.from_env(),
+        sandbox_limits,
+        images=ImageBuilder(docker_client, ImageBuilderConfig.from_env())
+    )
+    if docker_client is not None else None
+)
+
+# Millisecond-startup subprocess sandbox for trusted Python snippets (namespaces + rlimits), off by default
+process_sandbox_config = ProcessSandboxConfig.from_env()
+process_sandbox = ProcessSandbox(process_sandbox_config, sandbox_limits) if process_sandbox_config.enabled else None
+
+# Picks the backend per request: explicit `backend`, else the SANDBOX_BACKEND_ policy
+sandbox_router = SandboxRouter([sandbox_pools, process_sandbox], BackendPolicyConfig.from_env())
+
+# Blocking Docker calls run on a dedicated, bounded worker pool
+# Runs are admitted by bin-packing their CPU and memory estimates into the host budget
+sandbox_executor = SandboxExecutor(AdmissionConfig.from_env(), ResourceConfig.from_env())
+
+# In-process job workers; set JOB_LOCAL_WORKERS=0 on API-only nodes when remote workers consume the queue
+JOB_LOCAL_WORKERS = int(os.getenv("JOB_LOCAL_WORKERS", str(sandbox_executor.config.max_concurrency)))
+job_worker = (
+    JobWorker(job_queue, sandbox_handler(sandbox_executor, sandbox_router), concurrency=JOB_LOCAL_WORKERS)
+    if sandbox_router.available and JOB_LOCAL_WORKERS > 0 else None
+)
+
+REGISTRY.add_collector(sandbox_executor.collect)
+for backend in sandbox_router.backends.values():
+    REGISTRY.add_collector(backend.collect)
+
+DEFAULT_EXECUTION_TIMEOUT = 30
+
 class CodeRequest(BaseModel):
     prompt: str
     language: str = "python"
-    timeout: Optional[int] = 30
+    timeout: Optional[int] = DEFAULT_EXECUTION_TIMEOUT
     model: str = DEFAULT_MODEL
+    temperature: float = 0.7
+    # /generate: None caches only deterministic (temperature 0) requests; True/False force use/bypass.
+    # /execute: results are cached only when this is True
+    cache: Optional[bool] = None
+    # Share one upstream call with concurrent identical requests
+    coalesce: bool = True
+    # Estimated sandbox resources in the analysis stage's required_resources format,
+    # e.g. {"cpu": "1 core", "memory": "512MB"}; clamped to the SANDBOX_HOST_ policy limits
+    resources: Optional[Dict[str, Any]] = None
+    # Sandbox backend for /execute: "docker", "process" or "auto"; None uses the SANDBOX_BACKEND_ policy
+    backend: Optional[str] = None
+
+class TokenUsage(BaseModel):
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    total_tokens: int = 0
 
 class CodeResponse(BaseModel):
     code: str
     output: str
     error: Optional[str] = None
+    usage: Optional[TokenUsage] = None
+    stderr: Optional[str] = None
+    exit_code: Optional[int] = None
+    # Execution: output was cut to its head and tail; generation: reasoning never finished, so there is no code
+    truncated: bool = False
+    cached: bool = False
+    # Generation only: "stop", "length" (hit max_tokens) or "code_complete" (stopped at the closing code fence)
+    finish_reason: Optional[str] = None
+
+class BatchCodeRequest(BaseModel):
+    requests: List[CodeRequest]
+    stream: bool = False
+
+class BatchItemResult(BaseModel):
+    index: int
+    response: Optional[CodeResponse] = None
+    error: Optional[str] = None
+
+class BatchCodeResponse(BaseModel):
+    results: List[BatchItemResult]
+
+class JobSubmitted(BaseModel):
+    job_id: str
+    status: str
+
+class JobStatus(BaseModel):
+    job_id: str
+    status: str
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    attempts: int = 0
+    result: Optional[CodeResponse] = None
+
+class EndpointInfo(BaseModel):
+    base_url: str
+    healthy: bool
+    circuit: str
+    latency_ms: Optional[float] = None
+    error_rate: float = 0.0
+    in_flight: int = 0
+    requests: int = 0
+    failures: int = 0
+    last_error: Optional[str] = None
 
 class ModelInfo(BaseModel):
     id: str
     name: str
     description: str
+    fallback: Optional[str] = None
+    endpoints: List[EndpointInfo] = []
 
 @app.get("/")
 async def root():
@@ -52,84 +328,425 @@ async def list_models():
         ModelInfo(
             id=model_id,
             name=config.model_name,
-            description=f"Available at {config.base_url}"
+            description=f"Available at {config.base_url}",
+            fallback=config.fallback,
+            endpoints=[EndpointInfo(**endpoint) for endpoint in model_router.snapshot(model_id)]
         )
         for model_id, config in AVAILABLE_MODELS.items()
     ]
 
+def build_completion_kwargs(request: CodeRequest) -> dict:
+    """Build the chat completion arguments shared by /generate and /generate/stream"""
+    model_config = AVAILABLE_MODELS[request.model]
+    
+    # Create the prompt for code generation
+    system_prompt = f"""You are an expert programmer. Generate code in {request.language} based on the user's request.
+        The code should be complete, well-documented, and follow best practices.
+        Only return the code, no explanations or markdown formatting."""
+    
+    user_prompt = f"Generate {request.language} code for: {request.prompt}"
+    
+    completion_kwargs = dict(
+        model=model_config.model_name,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ],
+        temperature=request.temperature,
+        max_tokens=token_budget.limit(request.model, request.language)
+    )
+    return completion_kwargs
+
+def generation_key(request: CodeRequest, completion_kwargs: dict) -> str:
+    """Normalized key identifying a generation, used for caching and coalescing.
+
+    max_tokens is left out: it only changes with the adaptive budget, and
+    responses cut off by it are never cached.
+    """
+    return make_cache_key({
+        "model": request.model,
+        "model_name": completion_kwargs["model"],
+        "language": request.language.strip().lower(),
+        "prompt": request.prompt.strip(),
+        "temperature": completion_kwargs["temperature"]
+    })
+
+def generate_cache_key(request: CodeRequest, completion_kwargs: dict) -> Optional[str]:
+    """Return the response cache key, or None when the request bypasses the cache"""
+    if request.cache is False:
+        return None
+    if request.cache is None and request.temperature != 0:
+        return None
+    return generation_key(request, completion_kwargs)
+
+def execution_allocation(request: CodeRequest) -> Allocation:
+    """Container size the scheduler will give this request"""
+    return sandbox_executor.scheduler.size(parse_resources(request.resources))
+
+def select_backend(request: CodeRequest, timeout: int) -> SandboxBackend:
+    try:
+        return sandbox_router.select(request.language, request.prompt, timeout, request.backend)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def execution_key(request: CodeRequest, timeout: int, backend: SandboxBackend) -> str:
+    return make_cache_key({
+        "backend": backend.name,
+        "language": request.language.strip().lower(),
+        "code": request.prompt,
+        "timeout": timeout,
+        "allocation": asdict(execution_allocation(request))
+    })
+
+async def execution_cache_key(request: CodeRequest, timeout: int, backend: SandboxBackend) -> Optional[str]:
+    """Key of a cacheable execution, or None when the request did not opt in or the
+    image it would run on does not exist yet (nothing can be cached for it then)"""
+    if request.cache is not True:
+        return None
+    image_id = await asyncio.to_thread(backend.image_id, request.language, request.prompt)
+    if image_id is None:
+        return None
+    return make_cache_key({
+        "backend": backend.name,
+        "language": request.language.strip().lower(),
+        "code": request.prompt,
+        "image": image_id,
+        "timeout": timeout,
+        "limits": asdict(backend.limits),
+        "allocation": asdict(execution_allocation(request))
+    })
+
+async def cached_execution(request: CodeRequest, cache_key: Optional[str]) -> Optional[CodeResponse]:
+    if cache_key is None:
+        return None
+    cached = await execute_cache.get(cache_key)
+    if cached is None:
+        return None
+    return CodeResponse(code=request.prompt, **cached, cached=True)
+
+async def store_execution(
+    request: CodeRequest,
+    timeout: int,
+    backend: SandboxBackend,
+    result: ExecResult,
+    response: CodeResponse
+):
+    """Cache a finished run; runs that timed out or hit a resource limit are never cached"""
+    if request.cache is not True or result.timed_out or result.killed:
+        return
+    # The key is computed after the run, so a dependency image built by this run is included
+    cache_key = await execution_cache_key(request, timeout, backend)
+    if cache_key is not None:
+        await execute_cache.set(cache_key, response.model_dump(include={"output", "stderr", "exit_code", "truncated"}))
+
+async def cached_generation(cache_key: Optional[str]) -> Optional[CodeResponse]:
+    if cache_key is None:
+        return None
+    cached = await generate_cache.get(cache_key)
+    if cached is None:
+        return None
+    return CodeResponse(**cached, cached=True)
+
+async def store_generation(cache_key: Optional[str], response: CodeResponse):
+    if cache_key is not None and response.error is None and response.finish_reason != "length" and not response.truncated:
+        await generate_cache.set(cache_key, response.model_dump(exclude={"cached"}))
+
+def to_token_usage(usage) -> Optional[TokenUsage]:
+    if usage is None:
+        return None
+    return TokenUsage(
+        prompt_tokens=usage.prompt_tokens or 0,
+        completion_tokens=usage.completion_tokens or 0,
+        total_tokens=usage.total_tokens or 0
+    )
+
+class CodeGeneration:
+    """One streamed completion, filtered through CodeExtractor.
+
+    `deltas()` yields code with reasoning blocks and markdown fences removed and
+    closes the upstream stream as soon as the closing fence arrives, so the
+    model server stops decoding. `response()` builds the CodeResponse and
+    records the output length for the adaptive token budget.
+    """
+
+    def __init__(self, request: CodeRequest, completion_kwargs: dict):
+        self.request = request
+        self.completion_kwargs = completion_kwargs
+        self.extractor = CodeExtractor(reasoning=AVAILABLE_MODELS[request.model].reasoning)
+        self.chunks: List[str] = []
+        self.usage = None
+        # Streamed chunks, one token each on vLLM and Ollama; stands in for usage
+        # when the stream is closed early and the final usage chunk never arrives
+        self.streamed_chunks = 0
+        self.finish_reason: Optional[str] = None
+        self.started = time.monotonic()
+        self.first_token_at: Optional[float] = None
+
+    async def deltas(self):
+        # Failover only applies until the stream is opened; the replica counts the
+        # request as in flight, and records its latency or failure, until the stream ends
+        async with model_router.stream(
+            self.request.model,
+            lambda client, model_name: client.chat.completions.create(
+                **{**self.completion_kwargs, "model": model_name},
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+        ) as stream:
+            try:
+                async for chunk in stream:
+                    if chunk.usage is not None:
+                        self.usage = chunk.usage
+                    if not chunk.choices:
+                        continue
+                    choice = chunk.choices[0]
+                    self.streamed_chunks += 1
+                    if choice.finish_reason:
+                        self.finish_reason = choice.finish_reason
+                    if not choice.delta.content:
+                        continue
+                    if self.first_token_at is None:
+                        self.first_token_at = time.monotonic()
+                        LLM_TIME_TO_FIRST_TOKEN.labels(self.request.model).observe(self.first_token_at - self.started)
+                    code = self.extractor.feed(choice.delta.content)
+                    if code:
+                        self.chunks.append(code)
+                        yield code
+                    if self.extractor.done:
+                        self.finish_reason = "code_complete"
+                        break
+            finally:
+                # Release the pooled connection even if the consumer went away
+                await stream.close()
+        code = self.extractor.finish()
+        if code:
+            self.chunks.append(code)
+            yield code
+
+    def response(self) -> CodeResponse:
+        usage = to_token_usage(self.usage)
+        completion_tokens = usage.completion_tokens if usage is not None else self.streamed_chunks
+        # Decode rate: tokens over the time spent streaming them
+        record_generation(self.request.model, completion_tokens, time.monotonic() - (self.first_token_at or self.started))
+        token_budget.observe(
+            self.request.model,
+            self.request.language,
+            completion_tokens,
+            truncated=self.finish_reason == "length"
+        )
+        return CodeResponse(
+            code="".join(self.chunks).strip(),
+            output="Code generated successfully",
+            usage=usage,
+            truncated=self.extractor.truncated,
+            finish_reason=self.finish_reason
+        )
+
+async def run_generation(request: CodeRequest) -> CodeResponse:
+    """Generate code for a validated request, going through cache, coalescing and routing"""
+    completion_kwargs = build_completion_kwargs(request)
+    cache_key = generate_cache_key(request, completion_kwargs)
+    cached = await cached_generation(cache_key)
+    if cached is not None:
+        return cached
+    
+    async def generate() -> CodeResponse:
+        # Streamed even here so generation can stop at the end of the code
+        generation = CodeGeneration(request, completion_kwargs)
+        async with aclosing(generation.deltas()) as deltas:
+            async for _ in deltas:
+                pass
+        result = generation.response()
+        await store_generation(cache_key, result)
+        return result
+    
+    if not request.coalesce:
+        return await generate()
+    return await generate_flights.do(generation_key(request, completion_kwargs), generate)
+
 @app.post("/generate", response_model=CodeResponse)
 async def generate_code(request: CodeRequest):
     try:
         if request.model not in AVAILABLE_MODELS:
             raise HTTPException(status_code=400, detail=f"Model {request.model} not found")
         
-        model_config = AVAILABLE_MODELS[request.model]
-        
-        # Initialize OpenAI client with custom base URL
-        client = OpenAI(
-            base_url=model_config.base_url,
-            api_key=model_config.api_key
-        )
-        
-        # Create the prompt for code generation
-        system_prompt = f"""You are an expert programmer. Generate code in {request.language} based on the user's request.
-        The code should be complete, well-documented, and follow best practices.
-        Only return the code, no explanations or markdown formatting."""
-        
-        user_prompt = f"Generate {request.language} code for: {request.prompt}"
-        
-        # Generate code using the selected model
-        response = client.chat.completions.create(
-            model=model_config.model_name,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.7,
-            max_tokens=2000
-        )
-        
-        generated_code = response.choices[0].message.content.strip()
-        
-        return CodeResponse(
-            code=generated_code,
-            output="Code generated successfully"
-        )
+        return await run_generation(request)
+    except NoHealthyEndpoint:
+        raise HTTPException(status_code=503, detail=f"No healthy endpoint available for model {request.model}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def batch_limiter(model_id: str) -> asyncio.Semaphore:
+    """Per-model concurrency cap shared by all batches, so batches cannot saturate one backend"""
+    limiter = batch_limiters.get(model_id)
+    if limiter is None:
+        limiter = batch_limiters[model_id] = asyncio.Semaphore(BATCH_MAX_CONCURRENCY_PER_MODEL)
+    return limiter
+
+async def generate_batch_item(index: int, request: CodeRequest) -> BatchItemResult:
+    try:
+        if request.model not in AVAILABLE_MODELS:
+            raise ValueError(f"Model {request.model} not found")
+        async with batch_limiter(request.model):
+            response = await run_generation(request)
+        return BatchItemResult(index=index, response=response)
+    except Exception as e:
+        return BatchItemResult(index=index, error=str(e) or type(e).__name__)
+
+@app.post("/generate/batch")
+async def generate_batch(batch: BatchCodeRequest):
+    """Generate code for many requests concurrently.
+
+    Returns a BatchCodeResponse in request order, or with `stream` set, one SSE
+    `item` event per request as it completes followed by a `done` event.
+    Failures are reported per item and never fail the whole batch.
+    """
+    if len(batch.requests) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {BATCH_MAX_ITEMS} requests")
+    
+    tasks = [
+        asyncio.create_task(generate_batch_item(index, request))
+        for index, request in enumerate(batch.requests)
+    ]
+    
+    if not batch.stream:
+        try:
+            return BatchCodeResponse(results=await asyncio.gather(*tasks))
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    async def event_stream():
+        failed = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                item = await next_done
+                failed += item.error is not None
+                yield sse_event("item", item.model_dump())
+            yield sse_event("done", {"total": len(tasks), "failed": failed})
+        finally:
+            # Stop outstanding work if the client goes away
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@app.post("/generate/stream")
+async def generate_code_stream(request: CodeRequest):
+    """Stream generated code as Server-Sent Events.
+
+    Emits `delta` events with the code as it is generated (reasoning blocks and
+    markdown fences removed), then a final `done` event carrying the full
+    CodeResponse (or an `error` event if generation fails midway).
+    """
+    if request.model not in AVAILABLE_MODELS:
+        raise HTTPException(status_code=400, detail=f"Model {request.model} not found")
+    
+    completion_kwargs = build_completion_kwargs(request)
+    cache_key = generate_cache_key(request, completion_kwargs)
+    
+    async def event_stream():
+        try:
+            cached = await cached_generation(cache_key)
+            if cached is not None:
+                yield sse_event("delta", {"content": cached.code})
+                yield sse_event("done", cached.model_dump())
+                return
+            
+            generation = CodeGeneration(request, completion_kwargs)
+            async with aclosing(generation.deltas()) as deltas:
+                async for delta in deltas:
+                    yield sse_event("delta", {"content": delta})
+            
+            response = generation.response()
+            await store_generation(cache_key, response)
+            yield sse_event("done", response.model_dump())
+        except Exception as e:
+            yield sse_event("error", {"detail": str(e)})
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return {
+        "generate": generate_cache.stats(),
+        "execute": execute_cache.stats(),
+        "coalescing": {
+            "generate": {**generate_flights.counters, "in_flight": generate_flights.in_flight()},
+            "execute": {**execute_flights.counters, "in_flight": execute_flights.in_flight()}
+        }
+    }
+
+@app.get("/sandbox/scheduler")
+async def sandbox_scheduler():
+    """Host capacity, resources allocated to running sandboxes and the admission queue"""
+    return sandbox_executor.stats()
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text exposition of latency histograms, counters and pool gauges"""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+def saturated_error(e: SandboxSaturated) -> HTTPException:
+    return HTTPException(
+        status_code=e.status_code,
+        detail="Sandbox execution capacity is saturated, retry later",
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+def execution_response(request: CodeRequest, result, timeout: int) -> CodeResponse:
+    error = None
+    if result.timed_out:
+        error = f"Execution timed out after {timeout} seconds"
+    elif result.killed:
+        error = "Execution was killed (resource limit exceeded)"
+    
+    return CodeResponse(
+        code=request.prompt,
+        output=result.stdout,
+        stderr=result.stderr,
+        exit_code=result.exit_code,
+        truncated=result.truncated,
+        error=error
+    )
+
 @app.post("/execute", response_model=CodeResponse)
 async def execute_code(request: CodeRequest):
-    if docker_client is None:
+    if not sandbox_router.available:
         return CodeResponse(
             code=request.prompt,
             output="",
-            error="Docker is not available. Code execution is disabled."
+            error="No sandbox backend is available. Code execution is disabled."
         )
     
+    timeout = request.timeout or DEFAULT_EXECUTION_TIMEOUT
+    backend = select_backend(request, timeout)
     try:
-        # Create a temporary container
-        container = docker_client.containers.run(
-            f"{request.language}:latest",
-            command=f"python -c '{request.prompt}'",
-            detach=True,
-            mem_limit="100m",
-            cpu_period=100000,
-            cpu_quota=50000,
-            network_disabled=True,
-            remove=True
-        )
-        
-        # Wait for the container to finish
-        container.wait(timeout=request.timeout)
+        # Dependency images are built before admission so a build never holds an execution slot
+        await backend.prepare(request.language, request.prompt)
+        # Run the code in a warm container from the pool, or a forked process for small snippets
+        cached = await cached_execution(request, await execution_cache_key(request, timeout, backend))
+        if cached is not None:
+            return cached
         
-        # Get the output
-        output = container.logs().decode()
+        def execute():
+            return sandbox_executor.submit(
+                backend.run,
+                request.language,
+                request.prompt,
+                timeout,
+                resources=parse_resources(request.resources)
+            )
         
-        return CodeResponse(
-            code=request.prompt,
-            output=output
-        )
+        if request.coalesce:
+            result = await execute_flights.do(execution_key(request, timeout, backend), execute)
+        else:
+            result = await execute()
+        response = execution_response(request, result, timeout)
+        await store_execution(request, timeout, backend, result, response)
+        return response
+    except SandboxSaturated as e:
+        raise saturated_error(e)
     except Exception as e:
         return CodeResponse(
             code=request.prompt,
@@ -137,8 +754,138 @@ async def execute_code(request: CodeRequest):
             error=str(e)
         )
 
+@app.post("/execute/stream")
+async def execute_code_stream(request: CodeRequest):
+    """Stream sandbox output as Server-Sent Events.
+
+    Emits `stdout`/`stderr` events as the program writes, a single `truncated`
+    event once the forwarding cap is reached, then a final `done` event with
+    the CodeResponse (or an `error` event).
+    """
+    if not sandbox_router.available:
+        raise HTTPException(status_code=503, detail="No sandbox backend is available. Code execution is disabled.")
+    
+    timeout = request.timeout or DEFAULT_EXECUTION_TIMEOUT
+    backend = select_backend(request, timeout)
+    # Nothing has been streamed yet, so failures here are reported as HTTP errors like admission below
+    try:
+        await backend.prepare(request.language, request.prompt)
+        cached = await cached_execution(request, await execution_cache_key(request, timeout, backend))
+    except SandboxSaturated as e:
+        raise saturated_error(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if cached is not None:
+        async def replay():
+            if cached.output:
+                yield sse_event("stdout", {"data": cached.output})
+            if cached.stderr:
+                yield sse_event("stderr", {"data": cached.stderr})
+            yield sse_event("done", cached.model_dump())
+        return StreamingResponse(replay(), media_type="text/event-stream", headers=SSE_HEADERS)
+    
+    # Admission happens before the stream starts so saturation still maps to 429/503
+    try:
+        allocation = await sandbox_executor.acquire(parse_resources(request.resources))
+    except SandboxSaturated as e:
+        raise saturated_error(e)
+    
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stream_limit = backend.limits.stream_max_bytes
+    forwarded = 0
+    
+    def on_output(stream: str, data: bytes):
+        # Called on the worker thread; stop enqueueing once the cap is hit to bound memory
+        nonlocal forwarded
+        if forwarded >= stream_limit:
+            return
+        forwarded += len(data)
+        loop.call_soon_threadsafe(queue.put_nowait, (stream, data))
+        if forwarded >= stream_limit:
+            loop.call_soon_threadsafe(queue.put_nowait, ("truncated", b""))
+    
+    run = sandbox_executor.start(allocation, backend.run, request.language, request.prompt, timeout, on_output)
+    run.add_done_callback(lambda _: queue.put_nowait(None))
+    
+    async def event_stream():
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            stream, data = item
+            if stream == "truncated":
+                yield sse_event("truncated", {"limit": stream_limit})
+            else:
+                yield sse_event(stream, {"data": data.decode(errors="replace")})
+        try:
+            result = run.result()
+            response = execution_response(request, result, timeout)
+            await store_execution(request, timeout, backend, result, response)
+            yield sse_event("done", response.model_dump())
+        except Exception as e:
+            yield sse_event("error", {"detail": str(e)})
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@app.post("/jobs/execute", response_model=JobSubmitted, status_code=202)
+async def submit_execution_job(request: CodeRequest):
+    """Queue code for sandbox execution and return immediately with a job id"""
+    if not job_queue.shared and job_worker is None:
+        raise HTTPException(status_code=503, detail="No execution workers are available")
+    
+    timeout = request.timeout or DEFAULT_EXECUTION_TIMEOUT
+    if not job_queue.shared:
+        # Only local workers will run the job, so an unusable backend is rejected up front;
+        # remote workers apply their own backends and policy
+        select_backend(request, timeout)
+    try:
+        job = await job_queue.submit({
+            "language": request.language,
+            "code": request.prompt,
+            "timeout": timeout,
+            "resources": request.resources,
+            "backend": request.backend
+        })
+    except QueueFull:
+        raise HTTPException(
+            status_code=429,
+            detail="Execution job queue is full, retry later",
+            headers={"Retry-After": "5"}
+        )
+    return JobSubmitted(job_id=job.id, status=job.status)
+
+def job_status(job) -> JobStatus:
+    result = None
+    if job.finished:
+        request = CodeRequest(prompt=job.payload["code"], language=job.payload["language"], timeout=job.payload["timeout"])
+        if job.result is not None:
+            result = execution_response(request, ExecResult(**job.result), job.payload["timeout"])
+        else:
+            result = CodeResponse(code=request.prompt, output="", error=job.error)
+    return JobStatus(
+        job_id=job.id,
+        status=job.status,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+        attempts=job.attempts,
+        result=result
+    )
+
+@app.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_execution_job(job_id: str, wait: float = 0):
+    """Report job status and, once finished, its CodeResponse.
+
+    With `wait` (seconds, capped at JOB_MAX_WAIT) the request long-polls until
+    the job finishes or the wait elapses.
+    """
+    wait = min(max(wait, 0.0), JOB_MAX_WAIT)
+    job = await job_queue.wait(job_id, wait) if wait else await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job_status(job)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
-
-
@@ -0,0 +1,86 @@
+"""Compare two benchmark reports written by `benchmarks.run`.
+
+Prints throughput and latency percentiles side by side with the relative
+change, and exits with status 1 when any scenario regresses by more than
+`--threshold` percent (lower throughput, or higher p95/p99 latency).
+
+    python -m benchmarks.compare before.json after.json --threshold 10
+"""
+import argparse
+import json
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+# (label, path into the scenario result, higher is better)
+FIELDS: List[Tuple[str, Tuple[str, ...], bool]] = [
+    ("throughput_rps", ("throughput_rps",), True),
+    ("p50_ms", ("latency_ms", "p50"), False),
+    ("p95_ms", ("latency_ms", "p95"), False),
+    ("p99_ms", ("latency_ms", "p99"), False)
+]
+GATED = {"throughput_rps", "p95_ms", "p99_ms"}
+
+
+def lookup(result: Dict[str, Any], path: Tuple[str, ...]) -> Optional[float]:
+    for key in path:
+        if not isinstance(result, dict) or key not in result:
+            return None
+        result = result[key]
+    return result
+
+
+def change(before: float, after: float) -> Optional[float]:
+    if not before:
+        return None
+    return (after - before) / before * 100
+
+
+def compare(before: Dict[str, Any], after: Dict[str, Any], threshold: float) -> List[str]:
+    """Print the comparison and return the regressions beyond threshold"""
+    regressions = []
+    print(f"{'scenario':<16} {'metric':<15} {'before':>12} {'after':>12} {'change':>9}")
+    for scenario, after_result in after["scenarios"].items():
+        before_result = before["scenarios"].get(scenario)
+        if before_result is None:
+            print(f"{scenario:<16} (new scenario)")
+            continue
+        for label, path, higher_is_better in FIELDS:
+            old, new = lookup(before_result, path), lookup(after_result, path)
+            if old is None or new is None:
+                continue
+            delta = change(old, new)
+            shown = f"{delta:+.1f}%" if delta is not None else "n/a"
+            print(f"{scenario:<16} {label:<15} {old:>12.3f} {new:>12.3f} {shown:>9}")
+            if delta is None or label not in GATED:
+                continue
+            worse = -delta if higher_is_better else delta
+            if worse > threshold:
+                regressions.append(f"{scenario} {label} {shown}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=10.0, help="allowed regression in percent")
+    args = parser.parse_args(argv)
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    if before.get("config") != after.get("config"):
+        print("Warning: reports were produced with different benchmark settings", file=sys.stderr)
+
+    print(f"before: {before.get('commit')}  after: {after.get('commit')}")
+    regressions = compare(before, after, args.threshold)
+    if regressions:
+        print(f"\nRegressions beyond {args.threshold}%:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Local OpenAI-compatible server standing in for the remote model endpoints.
+
+Serves `/v1/chat/completions` (plain and streamed) and `/v1/models` with a
+configurable time to first token and decode rate, so benchmarks exercise the
+real client, routing and streaming paths without GPU servers.
+
+    python -m benchmarks.fake_llm --port 9100 --latency 0.2 --tokens-per-second 80
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from dataclasses import dataclass
+from typing import Any, Dict
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+
+@dataclass
+class FakeLLMConfig:
+    # Seconds before the first token (queueing + prefill)
+    latency: float = 0.1
+    # Decode rate; 0 emits all tokens at once
+    tokens_per_second: float = 100.0
+    completion_tokens: int = 64
+    # Tokens per streamed chunk
+    chunk_tokens: int = 4
+
+
+def build_code(tokens: int) -> str:
+    # One "token" per line keeps the token count exact and the output valid Python
+    return "\n".join(f"x{index} = {index}" for index in range(tokens))
+
+
+def create_app(config: FakeLLMConfig) -> FastAPI:
+    app = FastAPI(title="Fake OpenAI-compatible server")
+    ids = itertools.count()
+
+    def usage(prompt: str, completion_tokens: int) -> Dict[str, int]:
+        prompt_tokens = len(prompt.split())
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+
+    def decode_delay(tokens: int) -> float:
+        return tokens / config.tokens_per_second if config.tokens_per_second > 0 else 0.0
+
+    @app.get("/v1/models")
+    async def list_models():
+        return {"object": "list", "data": [{"id": "fake", "object": "model", "created": 0, "owned_by": "benchmark"}]}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body: Dict[str, Any] = await request.json()
+        prompt = " ".join(str(message.get("content", "")) for message in body.get("messages", []))
+        tokens = min(config.completion_tokens, body.get("max_tokens") or config.completion_tokens)
+        completion_id = f"chatcmpl-{next(ids)}"
+        created = int(time.time())
+        model = body.get("model", "fake")
+        lines = build_code(tokens).split("\n")
+
+        if not body.get("stream"):
+            await asyncio.sleep(config.latency + decode_delay(tokens))
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "\n".join(lines)},
+                    "finish_reason": "stop"
+                }],
+                "usage": usage(prompt, tokens)
+            }
+
+        include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+
+        def chunk(delta: Dict[str, Any], finish_reason=None) -> str:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            }
+            return f"data: {json.dumps(payload)}\n\n"
+
+        async def event_stream():
+            await asyncio.sleep(config.latency)
+            yield chunk({"role": "assistant", "content": ""})
+            step = max(1, config.chunk_tokens)
+            for start in range(0, tokens, step):
+                part = lines[start:start + step]
+                await asyncio.sleep(decode_delay(len(part)))
+                prefix = "\n" if start else ""
+                yield chunk({"content": prefix + "\n".join(part)})
+            yield chunk({}, "stop")
+            if include_usage:
+                payload = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [],
+                    "usage": usage(prompt, tokens)
+                }
+                yield f"data: {json.dumps(payload)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=FakeLLMConfig.latency)
+    parser.add_argument("--tokens-per-second", type=float, default=FakeLLMConfig.tokens_per_second)
+    parser.add_argument("--completion-tokens", type=int, default=FakeLLMConfig.completion_tokens)
+    args = parser.parse_args()
+    config = FakeLLMConfig(args.latency, args.tokens_per_second, args.completion_tokens)
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
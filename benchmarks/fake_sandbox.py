@@ -0,0 +1,103 @@
+"""In-process stand-in for SandboxPoolManager that never touches Docker.
+
+Runs are simulated on the sandbox executor's worker threads with a fixed
+execution time, so admission control, streaming and coalescing in
+`app/main.py` behave as they would against real containers.
+"""
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional
+
+from backend.sandbox import Allocation, ContainerPoolConfig, ExecResult, SandboxLimits
+from backend.utils.metrics import Family
+
+
+@dataclass
+class FakeSandboxConfig:
+    # Simulated wall time of one execution
+    exec_seconds: float = 0.05
+    # Bytes written to stdout per execution
+    output_bytes: int = 256
+    # Number of output chunks the stdout is split into
+    output_chunks: int = 4
+
+
+class FakeSandboxPoolManager:
+    """Implements the subset of SandboxPoolManager used by the API"""
+
+    name = "docker"
+
+    def __init__(self, config: Optional[FakeSandboxConfig] = None):
+        self.fake_config = config or FakeSandboxConfig()
+        self.config = ContainerPoolConfig()
+        self.limits = SandboxLimits()
+        self._lock = threading.Lock()
+        self._in_use: Dict[str, int] = {}
+        self.runs = 0
+
+    def supports(self, language: str) -> bool:
+        return True
+
+    def warm_up(self, languages: Iterable[str]):
+        for language in languages:
+            self._in_use.setdefault(language, 0)
+
+    def prebuild_images(self, languages: Iterable[str]):
+        pass
+
+    async def prepare(self, language: str, code: str):
+        pass
+
+    def image_id(self, language: str, code: str) -> Optional[str]:
+        # One fixed image per language, so opted-in executions are cacheable
+        return f"fake-{language}"
+
+    def run(
+        self,
+        language: str,
+        code: str,
+        timeout: int,
+        on_output: Optional[Callable[[str, bytes], None]] = None,
+        allocation: Optional[Allocation] = None
+    ) -> ExecResult:
+        with self._lock:
+            self._in_use[language] = self._in_use.get(language, 0) + 1
+            self.runs += 1
+        start = time.monotonic()
+        try:
+            chunks = max(1, self.fake_config.output_chunks)
+            chunk = b"x" * (self.fake_config.output_bytes // chunks)
+            for _ in range(chunks):
+                time.sleep(self.fake_config.exec_seconds / chunks)
+                if on_output is not None:
+                    on_output("stdout", chunk)
+            return ExecResult(
+                exit_code=0,
+                stdout=(chunk * chunks).decode(),
+                stderr="",
+                duration=time.monotonic() - start
+            )
+        finally:
+            with self._lock:
+                self._in_use[language] -= 1
+
+    def health_check(self):
+        pass
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {
+                language: {"idle": 0, "in_use": in_use, "total": in_use}
+                for language, in_use in self._in_use.items()
+            }
+
+    def collect(self) -> List[Family]:
+        samples = [
+            ({"language": language, "state": "in_use"}, stats["in_use"])
+            for language, stats in self.stats().items()
+        ]
+        return [("sandbox_pool_containers", "gauge", "Pooled sandbox containers by state", samples)]
+
+    def close(self):
+        pass
@@ -0,0 +1,301 @@
+"""Benchmark the code generation API and the chat pipeline against local stand-ins.
+
+Boots `app/main.py` and `app/backend/main.py` in-process on real sockets, with
+every model in AVAILABLE_MODELS pointed at a local fake OpenAI-compatible
+server and the Docker sandbox replaced by FakeSandboxPoolManager. Each scenario
+is driven by a fixed number of concurrent clients. Throughput and p50/p95/p99
+latency are written as JSON, so results can be compared across commits with
+`python -m benchmarks.compare`.
+
+    python -m benchmarks.run --concurrency 16 --requests 200 --output before.json
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import math
+import platform
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+APP_DIR = ROOT / "app"
+BACKEND_DIR = APP_DIR / "backend"
+
+# app/main.py imports `backend.*`, app/backend/main.py imports `services` and `utils.*`
+for path in (APP_DIR, BACKEND_DIR):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+import httpx
+import uvicorn
+
+from benchmarks.fake_llm import FakeLLMConfig, create_app as create_fake_llm
+from benchmarks.fake_sandbox import FakeSandboxConfig, FakeSandboxPoolManager
+
+SCENARIOS = ("generate", "generate_stream", "execute", "execute_stream", "chat")
+
+
+def load_module(name: str, path: Path):
+    """Import a file under a unique module name; both apps live in a file called main.py"""
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    ordered = sorted(values)
+    return {
+        "p50": round(percentile(ordered, 0.50) * 1000, 3),
+        "p95": round(percentile(ordered, 0.95) * 1000, 3),
+        "p99": round(percentile(ordered, 0.99) * 1000, 3),
+        "mean": round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0,
+        "max": round(ordered[-1] * 1000, 3) if ordered else 0.0
+    }
+
+
+class Server:
+    """A uvicorn server running on the current event loop"""
+
+    def __init__(self, app, port: int):
+        self.port = port
+        self.url = f"http://127.0.0.1:{port}"
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        self.task: Optional[asyncio.Task] = None
+
+    async def __aenter__(self) -> "Server":
+        self.task = asyncio.create_task(self.server.serve())
+        while not self.server.started:
+            if self.task.done():
+                self.task.result()
+            await asyncio.sleep(0.01)
+        return self
+
+    async def __aexit__(self, *exc):
+        self.server.should_exit = True
+        await self.task
+
+
+# A request returns (succeeded, time to first token or None)
+Request = Callable[[httpx.AsyncClient, int], Awaitable[tuple]]
+
+
+async def read_events(response: httpx.Response):
+    """Yield (event, data) pairs from a Server-Sent Events response"""
+    event, data = None, []
+    async for line in response.aiter_lines():
+        if line.startswith("event:"):
+            event = line[6:].strip()
+        elif line.startswith("data:"):
+            data.append(line[5:].strip())
+        elif not line and event is not None:
+            yield event, json.loads("\n".join(data)) if data else None
+            event, data = None, []
+
+
+def build_requests(codegen_url: str, pipeline_url: str, model: str) -> Dict[str, Request]:
+    # Unique prompts and code per request so caching and coalescing do not hide backend cost
+    async def generate(client: httpx.AsyncClient, index: int):
+        response = await client.post(f"{codegen_url}/generate", json={"prompt": f"task {index}", "model": model})
+        return response.status_code == 200 and response.json().get("error") is None, None
+
+    async def generate_stream(client: httpx.AsyncClient, index: int):
+        return await stream(client, f"{codegen_url}/generate/stream", {"prompt": f"task {index}", "model": model}, "delta")
+
+    async def execute(client: httpx.AsyncClient, index: int):
+        response = await client.post(f"{codegen_url}/execute", json={"prompt": f"print({index})"})
+        return response.status_code == 200 and response.json().get("error") is None, None
+
+    async def execute_stream(client: httpx.AsyncClient, index: int):
+        return await stream(client, f"{codegen_url}/execute/stream", {"prompt": f"print({index})"}, "stdout")
+
+    async def chat(client: httpx.AsyncClient, index: int):
+        response = await client.post(
+            f"{pipeline_url}/api/chat",
+            json={"messages": [{"role": "user", "content": f"benchmark task {index}"}]}
+        )
+        return response.status_code == 200, None
+
+    async def stream(client: httpx.AsyncClient, url: str, body: Dict[str, Any], first_event: str):
+        started = time.perf_counter()
+        first = None
+        ok = False
+        async with client.stream("POST", url, json=body) as response:
+            if response.status_code != 200:
+                await response.aread()
+                return False, None
+            async for event, _ in read_events(response):
+                if event == first_event and first is None:
+                    first = time.perf_counter() - started
+                elif event == "done":
+                    ok = True
+                elif event == "error":
+                    ok = False
+        return ok, first
+
+    return {
+        "generate": generate,
+        "generate_stream": generate_stream,
+        "execute": execute,
+        "execute_stream": execute_stream,
+        "chat": chat
+    }
+
+
+async def run_scenario(request: Request, total: int, concurrency: int, warmup: int) -> Dict[str, Any]:
+    """Closed-loop load: `concurrency` clients each send their next request as soon as the previous one finishes"""
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=120) as client:
+        for index in range(warmup):
+            await request(client, -1 - index)
+
+        latencies: List[float] = []
+        first_tokens: List[float] = []
+        errors = 0
+        next_index = 0
+
+        async def worker():
+            nonlocal next_index, errors
+            while next_index < total:
+                index = next_index
+                next_index += 1
+                started = time.perf_counter()
+                try:
+                    ok, first = await request(client, index)
+                except httpx.HTTPError:
+                    ok, first = False, None
+                latencies.append(time.perf_counter() - started)
+                if first is not None:
+                    first_tokens.append(first)
+                errors += not ok
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        duration = time.perf_counter() - started
+
+    result = {
+        "requests": total,
+        "errors": errors,
+        "concurrency": concurrency,
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(total / duration, 3) if duration else 0.0,
+        "latency_ms": summarize(latencies)
+    }
+    if first_tokens:
+        result["first_event_ms"] = summarize(first_tokens)
+    return result
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    llm_config = FakeLLMConfig(
+        latency=args.llm_latency,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens
+    )
+    async with Server(create_fake_llm(llm_config), free_port()) as fake_llm:
+        # Must happen before the app is imported: clients and router are built at import time
+        from backend.utils.models import AVAILABLE_MODELS
+        for model_config in AVAILABLE_MODELS.values():
+            model_config.base_url = f"{fake_llm.url}/v1/"
+            model_config.replica_urls = []
+
+        codegen = load_module("benchmark_codegen_main", APP_DIR / "main.py")
+        pipeline = load_module("benchmark_pipeline_main", BACKEND_DIR / "main.py")
+
+        sandbox = FakeSandboxPoolManager(FakeSandboxConfig(exec_seconds=args.exec_seconds))
+        codegen.sandbox_pools = sandbox
+        # Route every execution to the fake; the real process sandbox is not started
+        codegen.process_sandbox = None
+        codegen.sandbox_router = codegen.SandboxRouter([sandbox], codegen.sandbox_router.policy)
+        codegen.REGISTRY.add_collector(sandbox.collect)
+
+        async with Server(codegen.app, free_port()) as codegen_server, \
+                Server(pipeline.app, free_port()) as pipeline_server:
+            requests = build_requests(codegen_server.url, pipeline_server.url, args.model)
+            results = {}
+            for name in args.scenarios:
+                results[name] = await run_scenario(requests[name], args.requests, args.concurrency, args.warmup)
+                print(f"{name}: {results[name]['throughput_rps']} req/s, "
+                      f"p95 {results[name]['latency_ms']['p95']} ms", file=sys.stderr)
+
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "config": {
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "model": args.model,
+            "llm_latency": args.llm_latency,
+            "tokens_per_second": args.tokens_per_second,
+            "completion_tokens": args.completion_tokens,
+            "exec_seconds": args.exec_seconds
+        },
+        "scenarios": results
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"comma-separated subset of {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--warmup", type=int, default=5, help="sequential requests sent before measuring")
+    parser.add_argument("--model", default="deepseek-v3")
+    parser.add_argument("--llm-latency", type=float, default=0.1, help="fake LLM time to first token (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0, help="fake LLM decode rate")
+    parser.add_argument("--completion-tokens", type=int, default=64)
+    parser.add_argument("--exec-seconds", type=float, default=0.05, help="fake sandbox execution time (s)")
+    parser.add_argument("--output", help="write JSON results to this file instead of stdout")
+    args = parser.parse_args(argv)
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+    return args
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    report = json.dumps(asyncio.run(run(args)), indent=2)
+    if args.output:
+        Path(args.output).write_text(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()